@@ -1,6 +1,17 @@
+import asyncio
+
 from fastapi import APIRouter
+from lnbits.tasks import create_permanent_unique_task
+from loguru import logger
 
 from .crud import db
+from .tasks import (
+    wait_for_archive,
+    wait_for_payouts,
+    wait_for_purges,
+    wait_for_rank_rebalance,
+    wait_for_snapshots,
+)
 from .views import scrum_generic_router
 from .views_api import scrum_api_router
 
@@ -16,8 +27,34 @@ scrum_static_files = [
     }
 ]
 
+scheduled_tasks: list[asyncio.Task] = []
+
+
+def scrum_stop():
+    for task in scheduled_tasks:
+        try:
+            task.cancel()
+        except Exception as ex:
+            logger.warning(ex)
+
+
+def scrum_start():
+    task = create_permanent_unique_task("ext_scrum_payouts", wait_for_payouts)
+    scheduled_tasks.append(task)
+    task = create_permanent_unique_task("ext_scrum_purges", wait_for_purges)
+    scheduled_tasks.append(task)
+    task = create_permanent_unique_task("ext_scrum_archive", wait_for_archive)
+    scheduled_tasks.append(task)
+    task = create_permanent_unique_task("ext_scrum_ranks", wait_for_rank_rebalance)
+    scheduled_tasks.append(task)
+    task = create_permanent_unique_task("ext_scrum_snapshots", wait_for_snapshots)
+    scheduled_tasks.append(task)
+
+
 __all__ = [
     "db",
     "scrum_ext",
+    "scrum_start",
     "scrum_static_files",
+    "scrum_stop",
 ]
@@ -0,0 +1,110 @@
+# Description: Small in-process caches for rows that are read far more often than written.
+#
+# The caches live in the lnbits process, writes through `crud.py` invalidate
+# them, the TTL bounds how stale an entry can get if the row is changed some
+# other way (another process, a manual edit of the database).
+
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+from .models import CacheStats, PayLink, PublicBoardSnapshot, Scrum
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Bounded least recently used cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped by every invalidation, see `set`
+        self.generation = 0
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V, generation: int | None = None) -> None:
+        """
+        Pass the `generation` read before loading `value` to drop the value
+        when an invalidation happened while it was loading.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K) -> None:
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            name=self.name,
+            size=len(self._entries),
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+# scrum rows by id, `get_scrum` checks the owner against the cached row
+scrum_cache: LRUCache[str, Scrum] = LRUCache("scrum", maxsize=2048, ttl=300)
+# scrum ids by owner
+scrum_ids_cache: LRUCache[str, list[str]] = LRUCache("scrum_ids_by_user", maxsize=1024, ttl=300)
+# public page data by scrum id, also stale once the board has newer task events
+public_board_cache: LRUCache[str, PublicBoardSnapshot] = LRUCache("public_board", maxsize=512, ttl=300)
+# scrum id of a task, only used to pick the limits of a public write, dropped
+# when an update moves the task to another scrum
+tasks_scrum_cache: LRUCache[str, str] = LRUCache("tasks_scrum_id", maxsize=8192, ttl=300)
+# LNURL-pay links by assignee, `paylinks.py` checks their own expiry, the TTL
+# only keeps the failure count of a link around for its next resolution
+pay_link_cache: LRUCache[str, PayLink] = LRUCache("pay_links", maxsize=4096, ttl=7200)
+
+
+def cache_stats() -> list[CacheStats]:
+    return [
+        scrum_cache.stats(),
+        scrum_ids_cache.stats(),
+        public_board_cache.stats(),
+        tasks_scrum_cache.stats(),
+        pay_link_cache.stats(),
+    ]
+
+
+def clear_caches() -> None:
+    scrum_cache.clear()
+    scrum_ids_cache.clear()
+    public_board_cache.clear()
+    tasks_scrum_cache.clear()
+    pay_link_cache.clear()
@@ -1,25 +1,66 @@
 # Description: This file contains the CRUD operations for talking to the database.
 
+import html
+import json
+import re
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from enum import Enum
+from itertools import product
+from typing import Any, TypeVar
 
-from lnbits.db import Database, Filters, Page
+from lnbits.db import (
+    SQLITE,
+    Connection,
+    Database,
+    Filters,
+    Page,
+    dict_to_model,
+    insert_query,
+    model_to_dict,
+)
 from lnbits.helpers import urlsafe_short_hash
+from sqlalchemy.sql import text
 
+from .cache import public_board_cache, scrum_cache, scrum_ids_cache, tasks_scrum_cache
+from .helpers import decode_cursor, encode_cursor
 from .models import (
     CreateScrum,
     CreateTasks,
+    CursorPage,
+    Payout,
+    PayoutStatus,
     Scrum,
     ScrumFilters,
+    ScrumSnapshot,
+    ScrumStats,
     Tasks,
+    TasksExportFilters,
     TasksFilters,
+    TasksSearchResult,
+    TaskStage,
 )
+from .ranks import rank_between, rank_keys
+from .serialize import row_datetime, task_row
 
 db = Database("ext_scrum")
 
+# a scrum with more tasks is deleted at once, its tasks in batches after
+CASCADE_DELETE_LIMIT = 5000
+PURGE_BATCH_SIZE = 1000
+# tasks moved to the archive per transaction
+ARCHIVE_BATCH_SIZE = 1000
+
+# the models paged by `_fetch_cursor_page`, its cursors end with their `id`
+TPaged = TypeVar("TPaged", Scrum, Tasks)
+
 
 ########################### Scrum ############################
 async def create_scrum(user_id: str, data: CreateScrum) -> Scrum:
     scrum = Scrum(**data.dict(), id=urlsafe_short_hash(), user_id=user_id)
     await db.insert("scrum.scrum", scrum)
+    scrum_ids_cache.pop(user_id)
     return scrum
 
 
@@ -27,20 +68,21 @@ async def get_scrum(
     user_id: str,
     scrum_id: str,
 ) -> Scrum | None:
-    return await db.fetchone(
-        """
-            SELECT * FROM scrum.scrum
-            WHERE id = :id AND user_id = :user_id
-        """,
-        {"id": scrum_id, "user_id": user_id},
-        Scrum,
-    )
+    scrum = await get_scrum_by_id(scrum_id)
+    if not scrum or scrum.user_id != user_id:
+        return None
+    return scrum
 
 
 async def get_scrum_by_id(
     scrum_id: str,
 ) -> Scrum | None:
-    return await db.fetchone(
+    # cached, callers must not modify the returned scrum in place
+    scrum = scrum_cache.get(scrum_id)
+    if scrum:
+        return scrum
+    generation = scrum_cache.generation
+    scrum = await db.fetchone(
         """
             SELECT * FROM scrum.scrum
             WHERE id = :id
@@ -48,11 +90,18 @@ async def get_scrum_by_id(
         {"id": scrum_id},
         Scrum,
     )
+    if scrum:
+        scrum_cache.set(scrum_id, scrum, generation)
+    return scrum
 
 
 async def get_scrum_ids_by_user(
     user_id: str,
 ) -> list[str]:
+    scrum_ids = scrum_ids_cache.get(user_id)
+    if scrum_ids is not None:
+        return list(scrum_ids)
+    generation = scrum_ids_cache.generation
     rows: list[dict] = await db.fetchall(
         """
             SELECT DISTINCT id FROM scrum.scrum
@@ -60,7 +109,13 @@ async def get_scrum_ids_by_user(
         """,
         {"user_id": user_id},
     )
+    scrum_ids = [row["id"] for row in rows]
+    scrum_ids_cache.set(user_id, scrum_ids, generation)
+    return list(scrum_ids)
 
+
+async def get_all_scrum_ids() -> list[str]:
+    rows: list[dict] = await db.fetchall("SELECT id FROM scrum.scrum ORDER BY created_at")
     return [row["id"] for row in rows]
 
 
@@ -83,19 +138,79 @@ async def get_scrum_paginated(
     )
 
 
+# cursor sort fields of `ScrumFilters`, with the value NULL sorts as
+SCRUM_CURSOR_SORT: dict[str, Any] = {
+    "name": None,
+    "description": None,
+    "public_assigning": False,
+    "created_at": None,
+    "updated_at": None,
+}
+
+
+async def get_scrum_cursor_page(
+    user_id: str,
+    filters: Filters[ScrumFilters] | None = None,
+    cursor: str | None = None,
+    with_total: bool = False,
+) -> CursorPage[Scrum]:
+    """
+    Like `get_scrum_paginated`, but the page after `cursor` instead of an offset.
+    """
+    return await _fetch_cursor_page(
+        "scrum.scrum",
+        where=["user_id = :user_id"],
+        values={"user_id": user_id},
+        filters=filters,
+        model=Scrum,
+        sort_fields=SCRUM_CURSOR_SORT,
+        cursor=cursor,
+        with_total=with_total,
+    )
+
+
 async def update_scrum(data: Scrum) -> Scrum:
     await db.update("scrum.scrum", data)
+    scrum_cache.pop(data.id)
+    public_board_cache.pop(data.id)
     return data
 
 
-async def delete_scrum(user_id: str, scrum_id: str) -> None:
-    await db.execute(
-        """
-            DELETE FROM scrum.scrum
-            WHERE id = :id AND user_id = :user_id
-        """,
-        {"id": scrum_id, "user_id": user_id},
-    )
+async def delete_scrum(user_id: str, scrum_id: str) -> bool:
+    """
+    Delete the scrum and its tasks in one transaction. The tasks of a scrum
+    with more than `CASCADE_DELETE_LIMIT` of them are queued for `purge_tasks`
+    instead, without their scrum they are already out of reach.
+    Returns True when the tasks were queued.
+    """
+    values = {"id": scrum_id, "user_id": user_id, "limit": CASCADE_DELETE_LIMIT + 1}
+    purge = False
+    async with _transaction() as conn:
+        result = await _execute(conn, "DELETE FROM scrum.scrum WHERE id = :id AND user_id = :user_id", values)
+        if result.rowcount:
+            result = await _execute(
+                conn,
+                """
+                    SELECT COUNT(*) AS n FROM (
+                        SELECT 1 FROM scrum.tasks WHERE scrum_id = :id
+                        UNION ALL SELECT 1 FROM scrum.tasks_archive WHERE scrum_id = :id
+                        LIMIT :limit
+                    ) t
+                """,
+                values,
+            )
+            purge = result.mappings().one()["n"] > CASCADE_DELETE_LIMIT
+            if purge:
+                await _execute(conn, "INSERT INTO scrum.purges (scrum_id) VALUES (:id) ON CONFLICT DO NOTHING", values)
+            else:
+                await _execute(conn, "DELETE FROM scrum.tasks WHERE scrum_id = :id", values)
+                await _execute(conn, "DELETE FROM scrum.tasks_archive WHERE scrum_id = :id", values)
+                await _execute(conn, "DELETE FROM scrum.stats WHERE scrum_id = :id", values)
+                await _execute(conn, "DELETE FROM scrum.snapshots WHERE scrum_id = :id", values)
+    scrum_cache.pop(scrum_id)
+    scrum_ids_cache.pop(user_id)
+    public_board_cache.pop(scrum_id)
+    return purge
 
 
 ################################# Tasks ###########################
@@ -103,33 +218,69 @@ async def delete_scrum(user_id: str, scrum_id: str) -> None:
 
 async def create_tasks(data: CreateTasks) -> Tasks:
     tasks = Tasks(**data.dict(), id=urlsafe_short_hash())
-    await db.insert("scrum.tasks", tasks)
+    async with _transaction() as conn:
+        await _append_ranks(conn, [tasks])
+        await _insert_rows(conn, "scrum.tasks", [tasks])
     return tasks
 
 
-async def get_tasks(
-    scrum_id: str,
+async def create_tasks_bulk(data: list[CreateTasks]) -> list[Tasks]:
+    """
+    Insert many tasks with multi-row statements in one transaction.
+    """
+    # unset nullable fields take the defaults of `Tasks`
+    tasks = [Tasks(**item.dict(exclude_none=True), id=urlsafe_short_hash()) for item in data]
+    async with _transaction() as conn:
+        await _append_ranks(conn, tasks)
+        for i in range(0, len(tasks), BULK_CHUNK_SIZE):
+            await _insert_rows(conn, "scrum.tasks", tasks[i : i + BULK_CHUNK_SIZE])
+    return tasks
+
+
+async def get_tasks_by_id(
     tasks_id: str,
 ) -> Tasks | None:
     return await db.fetchone(
         """
             SELECT * FROM scrum.tasks
-            WHERE id = :id AND scrum_id = :scrum_id
+            WHERE id = :id
         """,
-        {"id": tasks_id, "scrum_id": scrum_id},
+        {"id": tasks_id},
         Tasks,
     )
 
 
-async def get_tasks_by_id(
-    tasks_id: str,
-) -> Tasks | None:
-    return await db.fetchone(
-        """
+async def get_tasks_scrum_id(tasks_id: str) -> str | None:
+    """
+    The scrum id of the task, cached, see `tasks_scrum_cache`.
+    """
+    scrum_id = tasks_scrum_cache.get(tasks_id)
+    if scrum_id:
+        return scrum_id
+    generation = tasks_scrum_cache.generation
+    row: dict | None = await db.fetchone("SELECT scrum_id FROM scrum.tasks WHERE id = :id", {"id": tasks_id})
+    if not row:
+        return None
+    tasks_scrum_cache.set(tasks_id, row["scrum_id"], generation)
+    return row["scrum_id"]
+
+
+async def get_tasks_by_ids(
+    user_id: str,
+    tasks_ids: list[str],
+) -> list[Tasks]:
+    """
+    The tasks with these ids that belong to scrums of `user_id`.
+    """
+    values: dict = {"user_id": user_id}
+    id_clause = _id_list_clause("id", "tasks_ids", tasks_ids, values)
+    return await db.fetchall(
+        f"""
             SELECT * FROM scrum.tasks
-            WHERE id = :id
+            WHERE {id_clause}
+            AND scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)
         """,
-        {"id": tasks_id},
+        values,
         Tasks,
     )
 
@@ -137,34 +288,411 @@ async def get_tasks_by_id(
 async def get_tasks_paginated(
     scrum_ids: list[str] | None = None,
     filters: Filters[TasksFilters] | None = None,
+    user_id: str | None = None,
+    archived: bool = False,
 ) -> Page[Tasks]:
+    """
+    Tasks of the scrums owned by `user_id` and/or of an explicit list of
+    `scrum_ids`, the archived ones instead of the active ones with `archived`.
+    """
 
-    if not scrum_ids:
+    if scrum_ids is not None and not scrum_ids:
+        return Page(data=[], total=0)
+    if not scrum_ids and not user_id:
         return Page(data=[], total=0)
 
-    where = []
-    values = {}
-    id_clause = []
-    for i, item_id in enumerate(scrum_ids):
-        # scrum_ids are not user input, but DB entries, so this is safe
-        scrum_id = f"scrum_id__{i}"
-        id_clause.append(f"scrum_id = :{scrum_id}")
-        values[scrum_id] = item_id
-    or_clause = " OR ".join(id_clause)
-    where.append(f"({or_clause})")
-
+    values: dict = {}
+    where = _tasks_scrum_clauses(scrum_ids, user_id, values)
     return await db.fetch_page(
-        "SELECT * FROM scrum.tasks",
+        f"SELECT * FROM {_tasks_table(archived)}",
         where=where,
         values=values,
-        filters=filters,
+        filters=filters if archived else _tasks_search_filters(filters, where, values),
         model=Tasks,
     )
 
 
-async def update_tasks(data: Tasks) -> Tasks:
-    await db.update("scrum.tasks", data)
-    return data
+# cursor sort fields of `TasksFilters`, with the value NULL sorts as
+TASKS_CURSOR_SORT: dict[str, Any] = {
+    "scrum_id": None,
+    "task": None,
+    "assignee": "",
+    "stage": None,
+    "reward": 0,
+    "complete": False,
+    "notes": "",
+    "created_at": None,
+    "updated_at": None,
+}
+
+
+async def get_tasks_cursor_page(
+    scrum_ids: list[str] | None = None,
+    filters: Filters[TasksFilters] | None = None,
+    user_id: str | None = None,
+    cursor: str | None = None,
+    with_total: bool = False,
+    archived: bool = False,
+) -> CursorPage[Tasks]:
+    """
+    Like `get_tasks_paginated`, but the page after `cursor` instead of an offset.
+    """
+    if (scrum_ids is not None and not scrum_ids) or (not scrum_ids and not user_id):
+        return CursorPage(data=[], total=0 if with_total else None)
+
+    values: dict = {}
+    where = _tasks_scrum_clauses(scrum_ids, user_id, values)
+    return await _fetch_cursor_page(
+        _tasks_table(archived),
+        where=where,
+        values=values,
+        filters=filters if archived else _tasks_search_filters(filters, where, values),
+        model=Tasks,
+        sort_fields=TASKS_CURSOR_SORT,
+        cursor=cursor,
+        with_total=with_total,
+    )
+
+
+async def search_tasks(
+    user_id: str,
+    search: str,
+    scrum_id: str | None = None,
+    limit: int = 20,
+) -> list[TasksSearchResult]:
+    """
+    Best full-text matches of `search` among the tasks of the scrums of `user_id`.
+    """
+    query = _fts_query(search)
+    if not query:
+        return []
+    values: dict = {"user_id": user_id, "query": query, "mark_start": MARK_START, "mark_end": MARK_END}
+    where = ["t.scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)"]
+    if scrum_id:
+        where.append("t.scrum_id = :scrum_id")
+        values["scrum_id"] = scrum_id
+
+    if db.type == SQLITE:
+        # bm25 is lower for better matches, the weights favour the task text
+        sql = f"""
+            SELECT t.*,
+                -bm25(tasks_fts, 10.0, 5.0, 1.0) AS search_rank,
+                highlight(tasks_fts, 0, :mark_start, :mark_end) AS task_highlight,
+                snippet(tasks_fts, 1, :mark_start, :mark_end, '…', 16) AS notes_highlight
+            FROM scrum.tasks_fts
+            JOIN scrum.tasks t ON t.rowid = tasks_fts.rowid
+            WHERE tasks_fts MATCH :query AND {" AND ".join(where)}
+            ORDER BY bm25(tasks_fts, 10.0, 5.0, 1.0)
+            LIMIT {int(limit)}
+        """
+    else:
+        sql = f"""
+            SELECT t.*,
+                ts_rank_cd(t.search, q) AS search_rank,
+                ts_headline('simple', t.task, q, :task_headline) AS task_highlight,
+                ts_headline('simple', COALESCE(t.notes, ''), q, :notes_headline) AS notes_highlight
+            FROM scrum.tasks t, to_tsquery('simple', :query) q
+            WHERE t.search @@ q AND {" AND ".join(where)}
+            ORDER BY search_rank DESC
+            LIMIT {int(limit)}
+        """
+        marks = f'StartSel="{MARK_START}", StopSel="{MARK_END}"'
+        values["task_headline"] = f"{marks}, HighlightAll=true"
+        values["notes_headline"] = f"{marks}, MaxWords=16"
+    rows: list[dict] = await db.fetchall(sql, values)
+    return [
+        TasksSearchResult(
+            tasks=dict_to_model(row, Tasks),
+            rank=row["search_rank"],
+            task_highlight=_highlight(row["task_highlight"]),
+            notes_highlight=_highlight(row["notes_highlight"]) if row["notes"] else None,
+        )
+        for row in rows
+    ]
+
+
+async def rebuild_tasks_search() -> None:
+    """
+    Rebuild the SQLite full-text index from the tasks, postgres keeps its own.
+    """
+    if db.type == SQLITE:
+        await db.execute("INSERT INTO scrum.tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+async def get_tasks_by_stage(
+    scrum_id: str,
+    stage: TaskStage,
+    limit: int = 20,
+    cursor: str | None = None,
+) -> CursorPage[Tasks]:
+    """
+    One column of a board in rank order, `limit` tasks after `cursor`.
+    """
+    rows, next_cursor = await _get_tasks_rows_by_stage(scrum_id, stage, limit, cursor)
+    return CursorPage(data=[dict_to_model(row, Tasks) for row in rows], next_cursor=next_cursor)
+
+
+async def get_tasks_json_by_stage(
+    scrum_id: str,
+    stage: TaskStage,
+    limit: int = 20,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    Like `get_tasks_by_stage`, the tasks in their JSON shape and the next cursor.
+    """
+    rows, next_cursor = await _get_tasks_rows_by_stage(scrum_id, stage, limit, cursor)
+    return [task_row(row) for row in rows], next_cursor
+
+
+async def _get_tasks_rows_by_stage(
+    scrum_id: str, stage: TaskStage, limit: int, cursor: str | None
+) -> tuple[list[dict], str | None]:
+    where = ["scrum_id = :scrum_id", "stage = :stage"]
+    values: dict = {"scrum_id": scrum_id, "stage": stage.value}
+    if cursor:
+        after = decode_cursor(cursor)
+        if not isinstance(after.get("rank"), str) or not isinstance(after.get("id"), str):
+            raise ValueError("Invalid cursor.")
+        where.append("rank >= :after_rank AND (rank > :after_rank OR id > :after_id)")
+        values["after_rank"] = after["rank"]
+        values["after_id"] = after["id"]
+
+    # a range scan of the (scrum_id, stage, rank, id) index
+    rows: list[dict] = await db.fetchall(
+        f"""
+            SELECT * FROM scrum.tasks
+            WHERE {" AND ".join(where)}
+            ORDER BY rank, id
+            LIMIT {int(limit) + 1}
+        """,
+        values,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"rank": rows[-1]["rank"], "id": rows[-1]["id"]})
+    return rows, next_cursor
+
+
+async def get_tasks_batches(
+    scrum_ids: list[str],
+    filters: TasksExportFilters | None = None,
+    batch_size: int = 500,
+) -> AsyncIterator[list[dict]]:
+    """
+    All tasks of the scrums matching `filters`, board by board in creation order,
+    in their JSON shape: the active ones, then the archived ones. Each batch is
+    one keyset query, so the database is not held between batches.
+    """
+    values: dict = {}
+    where = ["scrum_id = :scrum_id", *_tasks_export_clauses(filters or TasksExportFilters(), values)]
+    created_at = db.timestamp_placeholder("after_created_at")
+    after = f"(created_at > {created_at} OR (created_at = {created_at} AND id > :after_id))"
+
+    for scrum_id, table in product(scrum_ids, (_tasks_table(False), _tasks_table(True))):
+        last: dict | None = None
+        while True:
+            batch_values = {**values, "scrum_id": scrum_id}
+            batch_where = where
+            if last:
+                batch_where = [*where, after]
+                batch_values["after_created_at"] = row_datetime(last["created_at"]).timestamp()
+                batch_values["after_id"] = last["id"]
+            rows: list[dict] = await db.fetchall(
+                f"""
+                    SELECT * FROM {table}
+                    WHERE {" AND ".join(batch_where)}
+                    ORDER BY created_at, id
+                    LIMIT {int(batch_size)}
+                """,
+                batch_values,
+            )
+            if rows:
+                yield [task_row(row) for row in rows]
+            if len(rows) < batch_size:
+                break
+            last = rows[-1]
+
+
+async def update_tasks_fields(
+    tasks_id: str,
+    fields: dict,
+    version: int | None = None,
+    user_id: str | None = None,
+) -> Tasks | None:
+    """
+    Update only `fields` of a task in one statement and bump its version.
+
+    With `user_id` the task, and the scrum it is moved to, must belong to
+    that user. Without it the public rules apply: the assignee can only be
+    set on scrums with `public_assigning`. With `version` the task must
+    still be at that version. Returns None if any of that does not hold.
+    A task moved to another column goes to its end.
+    """
+    async with _transaction() as conn:
+        if ("stage" in fields or "scrum_id" in fields) and "rank" not in fields:
+            fields = await _with_column_end_rank(conn, tasks_id, fields)
+        tasks = await _update_tasks_fields(conn, tasks_id, fields, version, user_id)
+    if tasks and "scrum_id" in fields:
+        tasks_scrum_cache.pop(tasks_id)
+    return tasks
+
+
+async def move_task(
+    tasks_id: str,
+    stage: TaskStage,
+    after_id: str | None = None,
+    before_id: str | None = None,
+    version: int | None = None,
+    user_id: str | None = None,
+) -> Tasks | None:
+    """
+    Put a task in the `stage` column of its scrum right after `after_id` and
+    before `before_id`, at the end of the column without either. Only the
+    task is written, its new rank sorts between its neighbours. Same rules
+    as `update_tasks_fields`, raises ValueError if a neighbour is not in
+    that column.
+    """
+    async with _transaction() as conn:
+        result = await _execute(conn, "SELECT scrum_id FROM scrum.tasks WHERE id = :id", {"id": tasks_id})
+        row = result.mappings().first()
+        if not row:
+            return None
+        rank = await _rank_between_tasks(conn, row["scrum_id"], stage, tasks_id, after_id, before_id)
+        return await _update_tasks_fields(conn, tasks_id, {"stage": stage, "rank": rank}, version, user_id)
+
+
+async def _update_tasks_fields(
+    conn: Connection,
+    tasks_id: str,
+    fields: dict,
+    version: int | None,
+    user_id: str | None,
+) -> Tasks | None:
+    values: dict = {"id": tasks_id, "updated_at": datetime.now(timezone.utc).timestamp()}
+    assignments = [
+        "version = version + 1",
+        f"updated_at = {db.timestamp_placeholder('updated_at')}",
+    ]
+    for key, value in fields.items():
+        if key not in Tasks.__fields__ or key in ("id", "version", "created_at", "updated_at"):
+            raise ValueError(f"Cannot update tasks field '{key}'.")
+        values[key] = value.value if isinstance(value, Enum) else value
+        assignments.append(f"{key} = :{key}")
+
+    where = ["id = :id"]
+    if user_id:
+        values["user_id"] = user_id
+        where.append("scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)")
+        if "scrum_id" in fields:
+            where.append(":scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)")
+    else:
+        where.append("scrum_id IN (SELECT id FROM scrum.scrum)")
+        if fields.get("assignee") is not None:
+            where.append(
+                "(assignee = :assignee OR scrum_id IN (SELECT id FROM scrum.scrum WHERE public_assigning = true))"
+            )
+    if version is not None:
+        values["version"] = version
+        where.append("version = :version")
+
+    result = await _execute(
+        conn,
+        f"""
+            UPDATE scrum.tasks
+            SET {", ".join(assignments)}
+            WHERE {" AND ".join(where)}
+            RETURNING *
+        """,
+        # bound as typed like the inserts, `rewrite_values` would strip `<...>` and `&...;` from the text
+        values,
+        from_models=True,
+    )
+    row = result.mappings().first()
+    return dict_to_model(row, Tasks) if row else None
+
+
+async def update_tasks_bulk(user_id: str, changes: list[tuple[str, dict, int]]) -> list[Tasks]:
+    """
+    Update the fields of many tasks of scrums owned by `user_id` in one
+    transaction, each `(tasks_id, fields, version)` like `update_tasks_fields`.
+    Raises ValueError, and updates none, if a task is not at its version.
+    """
+    updated = []
+    async with _transaction() as conn:
+        for tasks_id, fields, version in changes:
+            if ("stage" in fields or "scrum_id" in fields) and "rank" not in fields:
+                fields = await _with_column_end_rank(conn, tasks_id, fields)
+            tasks = await _update_tasks_fields(conn, tasks_id, fields, version, user_id)
+            if not tasks:
+                raise ValueError(f"Tasks {tasks_id} changed, reload it.")
+            updated.append(tasks)
+    for tasks_id, fields, _ in changes:
+        if "scrum_id" in fields:
+            tasks_scrum_cache.pop(tasks_id)
+    return updated
+
+
+async def move_tasks(user_id: str, tasks_ids: list[str], stage: TaskStage) -> list[Tasks]:
+    """
+    Move the tasks of scrums owned by `user_id` to the end of the `stage`
+    column, on their own scrums, see `tasks_scrum_cache`. Returns the moved
+    tasks.
+    """
+    values: dict = {
+        "user_id": user_id,
+        "stage": stage.value,
+        "updated_at": datetime.now(timezone.utc).timestamp(),
+    }
+    id_clause = _id_list_clause("id", "tasks_ids", tasks_ids, values, write=True)
+    async with _transaction() as conn:
+        result = await _execute(
+            conn,
+            f"""
+                UPDATE scrum.tasks
+                SET stage = :stage, version = version + 1,
+                    updated_at = {db.timestamp_placeholder("updated_at")}
+                WHERE {id_clause}
+                AND scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)
+                RETURNING *
+            """,
+            values,
+        )
+        tasks = [dict_to_model(row, Tasks) for row in result.mappings().all()]
+        # ranked after the whole column, the moved tasks included
+        for item in tasks:
+            item.rank = None
+        if tasks:
+            await _append_ranks(conn, tasks)
+            await _execute(
+                conn,
+                "UPDATE scrum.tasks SET rank = :rank WHERE id = :id",
+                [{"rank": item.rank, "id": item.id} for item in tasks],
+            )
+    return tasks
+
+
+async def delete_tasks_bulk(user_id: str, tasks_ids: list[str]) -> list[Tasks]:
+    """
+    Delete the tasks of scrums owned by `user_id` in one statement.
+    Returns the deleted tasks.
+    """
+    values: dict = {"user_id": user_id}
+    id_clause = _id_list_clause("id", "tasks_ids", tasks_ids, values, write=True)
+    async with _transaction() as conn:
+        result = await _execute(
+            conn,
+            f"""
+                DELETE FROM scrum.tasks
+                WHERE {id_clause}
+                AND scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)
+                RETURNING *
+            """,
+            values,
+        )
+        rows = result.mappings().all()
+    return [dict_to_model(row, Tasks) for row in rows]
 
 
 async def delete_tasks(scrum_id: str, tasks_id: str) -> None:
@@ -177,11 +705,673 @@ async def delete_tasks(scrum_id: str, tasks_id: str) -> None:
     )
 
 
-async def delete_all_tasks(scrum_id: str) -> None:
-    await db.execute(
+############################# Ranks ############################
+
+
+async def get_unbalanced_columns(max_length: int) -> list[tuple[str, TaskStage]]:
+    """
+    The (scrum id, stage) of the columns with a rank longer than `max_length`
+    or a task without one.
+    """
+    rows: list[dict] = await db.fetchall(
         """
-            DELETE FROM scrum.tasks
+            SELECT DISTINCT scrum_id, stage FROM scrum.tasks
+            WHERE rank IS NULL OR LENGTH(rank) > :max_length
+        """,
+        {"max_length": max_length},
+    )
+    return [(row["scrum_id"], TaskStage(row["stage"])) for row in rows]
+
+
+async def rebalance_ranks(scrum_id: str, stage: TaskStage) -> int:
+    """
+    Give the tasks of a column short, evenly spread ranks in their current
+    order. Returns the number of tasks.
+    """
+    async with _transaction() as conn:
+        return await _rebalance_column(conn, scrum_id, stage)
+
+
+############################# Purges ###########################
+
+
+async def get_purges() -> list[str]:
+    """
+    Ids of the deleted scrums whose tasks are still to be removed.
+    """
+    rows: list[dict] = await db.fetchall("SELECT scrum_id FROM scrum.purges ORDER BY created_at")
+    return [row["scrum_id"] for row in rows]
+
+
+async def purge_tasks(scrum_id: str, limit: int = PURGE_BATCH_SIZE) -> int:
+    """
+    Delete up to `limit` tasks of a queued scrum, active ones first, then
+    archived ones. The scrum leaves the queue once it has none left.
+    Returns the number of deleted tasks.
+    """
+    values = {"scrum_id": scrum_id, "limit": limit}
+    async with _transaction() as conn:
+        deleted = 0
+        for table in ("scrum.tasks", "scrum.tasks_archive"):
+            result = await _execute(
+                conn,
+                f"""
+                    DELETE FROM {table}
+                    WHERE id IN (SELECT id FROM {table} WHERE scrum_id = :scrum_id LIMIT :limit)
+                """,
+                values,
+            )
+            deleted = result.rowcount
+            if deleted:
+                break
+        if not deleted:
+            await _execute(conn, "DELETE FROM scrum.stats WHERE scrum_id = :scrum_id", values)
+            await _execute(conn, "DELETE FROM scrum.snapshots WHERE scrum_id = :scrum_id", values)
+            await _execute(conn, "DELETE FROM scrum.purges WHERE scrum_id = :scrum_id", values)
+    return deleted
+
+
+async def queue_orphan_purges() -> int:
+    """
+    Queue the scrums that are gone but still have tasks, returns how many.
+    """
+    async with _transaction() as conn:
+        result = await _execute(
+            conn,
+            """
+                INSERT INTO scrum.purges (scrum_id)
+                SELECT scrum_id FROM scrum.tasks
+                WHERE scrum_id NOT IN (SELECT id FROM scrum.scrum)
+                AND scrum_id NOT IN (SELECT scrum_id FROM scrum.purges)
+                UNION
+                SELECT scrum_id FROM scrum.tasks_archive
+                WHERE scrum_id NOT IN (SELECT id FROM scrum.scrum)
+                AND scrum_id NOT IN (SELECT scrum_id FROM scrum.purges)
+            """,
+            {},
+        )
+    return result.rowcount
+
+
+############################# Archive ##########################
+
+# the columns a task keeps in the archive
+ARCHIVE_COLUMNS = ", ".join(Tasks.__fields__)
+
+
+async def archive_tasks(scrum_id: str, before: datetime, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move up to `limit` done and paid tasks of the scrum, last updated before
+    `before`, to the archive. The stats count the archived tasks too, so they
+    do not change. Returns the number of archived tasks.
+    """
+    values: dict = {"scrum_id": scrum_id, "stage": TaskStage.done.value, "before": before.timestamp(), "limit": limit}
+    async with _transaction() as conn:
+        result = await _execute(
+            conn,
+            f"""
+                SELECT id FROM scrum.tasks
+                WHERE scrum_id = :scrum_id AND stage = :stage AND complete = true AND paid = true
+                AND updated_at < {db.timestamp_placeholder("before")}
+                LIMIT :limit
+            """,
+            values,
+        )
+        ids = [row["id"] for row in result.mappings().all()]
+        if not ids:
+            return 0
+        id_clause = _id_list_clause("id", "tasks_ids", ids, values, write=True)
+        await _execute(
+            conn,
+            f"""
+                INSERT INTO scrum.tasks_archive ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM scrum.tasks WHERE {id_clause}
+            """,
+            values,
+        )
+        await _execute(conn, f"DELETE FROM scrum.tasks WHERE {id_clause}", values)
+    return len(ids)
+
+
+############################# Stats ############################
+# `scrum.stats` is maintained by triggers on `scrum.tasks` and `scrum.tasks_archive`,
+# see `m010_stats` and `m017_tasks_archive_stats`
+
+
+async def get_scrum_stats(scrum_id: str) -> ScrumStats:
+    rows: list[dict] = await db.fetchall(
+        """
+            SELECT * FROM scrum.stats
             WHERE scrum_id = :scrum_id
         """,
         {"scrum_id": scrum_id},
     )
+    stats = ScrumStats(scrum_id=scrum_id, stages=dict.fromkeys(TaskStage, 0))
+    for row in rows:
+        if row["stage"] in stats.stages:
+            stats.stages[TaskStage(row["stage"])] = row["tasks"]
+        stats.tasks += row["tasks"]
+        stats.reward += row["reward"]
+        stats.paid_reward += row["paid_reward"]
+        stats.unpaid_committed_reward += row["committed_reward"]
+    return stats
+
+
+async def rebuild_scrum_stats(scrum_id: str | None = None) -> None:
+    """
+    Recompute the stats of one scrum, or of all of them, from the active and
+    archived tasks.
+    """
+    values = {"scrum_id": scrum_id} if scrum_id else {}
+    where = "WHERE scrum_id = :scrum_id" if scrum_id else ""
+    async with _transaction() as conn:
+        await _execute(conn, f"DELETE FROM scrum.stats {where}", values)
+        await _execute(
+            conn,
+            f"""
+                INSERT INTO scrum.stats
+                    (scrum_id, stage, tasks, reward, paid_reward, committed_reward)
+                SELECT
+                    scrum_id,
+                    stage,
+                    COUNT(*),
+                    SUM(COALESCE(reward, 0)),
+                    SUM(CASE WHEN paid THEN COALESCE(reward, 0) ELSE 0 END),
+                    SUM(
+                        CASE
+                            WHEN paid THEN 0
+                            WHEN COALESCE(assignee, '') <> '' THEN COALESCE(reward, 0)
+                            ELSE 0
+                        END
+                    )
+                FROM (
+                    SELECT scrum_id, stage, reward, paid, assignee FROM scrum.tasks {where}
+                    UNION ALL
+                    SELECT scrum_id, stage, reward, paid, assignee FROM scrum.tasks_archive {where}
+                ) t
+                GROUP BY scrum_id, stage
+            """,
+            values,
+        )
+
+
+async def record_snapshots(day: date) -> int:
+    """
+    Open the snapshots of `day` for every scrum stage with tasks, from the
+    stats. Rows the stats triggers already wrote that day are kept, they
+    are as current. Returns the number of new rows.
+    """
+    result = await db.execute(
+        """
+            INSERT INTO scrum.snapshots (scrum_id, day, stage, tasks, reward)
+            SELECT scrum_id, :day, stage, tasks, reward FROM scrum.stats
+            WHERE tasks <> 0 OR reward <> 0
+            ON CONFLICT (scrum_id, day, stage) DO NOTHING
+        """,
+        {"day": day.isoformat()},
+    )
+    return result.rowcount
+
+
+async def get_scrum_snapshots(scrum_id: str, start: date, end: date) -> list[ScrumSnapshot]:
+    """
+    The snapshots of the scrum from `start` to `end`, and those of the last
+    day before `start` that has any, the levels the range starts from.
+    One range scan of the primary key.
+    """
+    return await db.fetchall(
+        """
+            SELECT * FROM scrum.snapshots
+            WHERE scrum_id = :scrum_id AND day <= :end AND day >= COALESCE(
+                (SELECT MAX(day) FROM scrum.snapshots WHERE scrum_id = :scrum_id AND day <= :start), :start
+            )
+            ORDER BY day, stage
+        """,
+        {"scrum_id": scrum_id, "start": start.isoformat(), "end": end.isoformat()},
+        ScrumSnapshot,
+    )
+
+
+############################ Payouts ###########################
+
+
+async def create_payout(payout: Payout) -> bool:
+    """
+    Queue the reward payout of a task, at most once per task.
+    Returns False if the task already has a payout.
+    """
+    result = await db.execute(
+        insert_query("scrum.payouts", payout) + " ON CONFLICT (task_id) DO NOTHING",
+        model_to_dict(payout),
+    )
+    return result.rowcount > 0
+
+
+async def get_payout(task_id: str) -> Payout | None:
+    return await db.fetchone(
+        """
+            SELECT * FROM scrum.payouts
+            WHERE task_id = :task_id
+        """,
+        {"task_id": task_id},
+        Payout,
+    )
+
+
+async def get_due_payouts(limit: int = 10) -> list[Payout]:
+    return await db.fetchall(
+        f"""
+            SELECT * FROM scrum.payouts
+            WHERE status IN (:pending, :paying) AND next_attempt_at <= {db.timestamp_placeholder("now")}
+            ORDER BY next_attempt_at
+            LIMIT {int(limit)}
+        """,
+        {
+            "pending": PayoutStatus.pending.value,
+            "paying": PayoutStatus.paying.value,
+            "now": datetime.now(timezone.utc).timestamp(),
+        },
+        Payout,
+    )
+
+
+async def claim_payout(payout: Payout, lease_until: datetime) -> bool:
+    """
+    Take a due payout for one attempt, or a paying one to settle it. Only one
+    worker can win the claim, and the payout is not due again before
+    `lease_until`. Only a pending payout counts the claim as an attempt.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        f"""
+            UPDATE scrum.payouts
+            SET attempts = attempts + :attempt, next_attempt_at = {db.timestamp_placeholder("lease_until")}
+            WHERE task_id = :task_id AND status = :status AND attempts = :attempts
+            AND next_attempt_at <= {db.timestamp_placeholder("now")}
+        """,
+        {
+            "task_id": payout.task_id,
+            "status": payout.status.value,
+            "attempts": payout.attempts,
+            "attempt": 1 if payout.status == PayoutStatus.pending else 0,
+            "lease_until": lease_until.timestamp(),
+            "now": now.timestamp(),
+        },
+    )
+    return result.rowcount > 0
+
+
+async def update_payout(data: Payout) -> Payout:
+    data.updated_at = datetime.now(timezone.utc)
+    await db.update("scrum.payouts", data, "WHERE task_id = :task_id")
+    return data
+
+
+async def update_tasks_payout_status(tasks_id: str, status: PayoutStatus) -> Tasks | None:
+    """
+    Set the payout status of a task and bump its version, so an edit based on
+    the task before the payout conflicts instead of reverting it.
+    """
+    async with _transaction() as conn:
+        result = await _execute(
+            conn,
+            f"""
+                UPDATE scrum.tasks
+                SET payout_status = :payout_status, paid = :paid, version = version + 1,
+                    updated_at = {db.timestamp_placeholder("updated_at")}
+                WHERE id = :id
+                RETURNING *
+            """,
+            {
+                "id": tasks_id,
+                "payout_status": status.value,
+                "paid": status == PayoutStatus.paid,
+                "updated_at": datetime.now(timezone.utc).timestamp(),
+            },
+        )
+        row = result.mappings().first()
+    return dict_to_model(row, Tasks) if row else None
+
+
+############################ Helpers ###########################
+
+
+async def _column_end_rank(conn: Connection, scrum_id: str, stage: str) -> str | None:
+    result = await _execute(
+        conn,
+        """
+            SELECT rank FROM scrum.tasks
+            WHERE scrum_id = :scrum_id AND stage = :stage AND rank IS NOT NULL
+            ORDER BY rank DESC
+            LIMIT 1
+        """,
+        {"scrum_id": scrum_id, "stage": stage},
+    )
+    row = result.mappings().first()
+    return row["rank"] if row else None
+
+
+async def _append_ranks(conn: Connection, tasks: list[Tasks]) -> None:
+    """
+    Rank the `tasks` without a rank after the end of their column, in list order.
+    """
+    columns: dict[tuple[str, str], list[Tasks]] = {}
+    for item in tasks:
+        if item.rank is None:
+            columns.setdefault((item.scrum_id, item.stage.value), []).append(item)
+    for (scrum_id, stage), items in columns.items():
+        end = await _column_end_rank(conn, scrum_id, stage)
+        for item, rank in zip(items, rank_keys(len(items), end), strict=True):
+            item.rank = rank
+
+
+async def _with_column_end_rank(conn: Connection, tasks_id: str, fields: dict) -> dict:
+    # a task changing column is ranked at the end of the new one
+    result = await _execute(conn, "SELECT scrum_id, stage FROM scrum.tasks WHERE id = :id", {"id": tasks_id})
+    row = result.mappings().first()
+    if not row:
+        return fields
+    scrum_id = fields.get("scrum_id", row["scrum_id"])
+    stage = TaskStage(fields.get("stage", row["stage"])).value
+    if (scrum_id, stage) == (row["scrum_id"], row["stage"]):
+        return fields
+    return {**fields, "rank": rank_between(await _column_end_rank(conn, scrum_id, stage), None)}
+
+
+async def _rank_between_tasks(
+    conn: Connection,
+    scrum_id: str,
+    stage: TaskStage,
+    tasks_id: str,
+    after_id: str | None,
+    before_id: str | None,
+) -> str:
+    """
+    A rank for `tasks_id` between two tasks of the column. A neighbour left
+    out is the one next to the other in the column, the end without either.
+    """
+    column = "scrum_id = :scrum_id AND stage = :stage AND id != :id AND rank IS NOT NULL"
+    values: dict = {"scrum_id": scrum_id, "stage": stage.value, "id": tasks_id}
+
+    async def first(where: str, order: str = "rank, id", **params) -> dict | None:
+        result = await _execute(
+            conn,
+            f"SELECT id, rank FROM scrum.tasks WHERE {column} AND {where} ORDER BY {order} LIMIT 1",
+            {**values, **params},
+        )
+        return result.mappings().first()
+
+    async def neighbour(neighbour_id: str) -> dict:
+        row = await first("id = :neighbour_id", neighbour_id=neighbour_id)
+        if not row:
+            raise ValueError(f"Tasks {neighbour_id} is not in the {stage.value} column.")
+        return row
+
+    for _ in range(2):
+        lower = await neighbour(after_id) if after_id else None
+        upper = await neighbour(before_id) if before_id else None
+        if lower and not before_id:
+            upper = await first(
+                "rank >= :rank AND (rank > :rank OR id > :next_id)", rank=lower["rank"], next_id=lower["id"]
+            )
+        elif upper and not after_id:
+            lower = await first(
+                "rank <= :rank AND (rank < :rank OR id < :next_id)",
+                "rank DESC, id DESC",
+                rank=upper["rank"],
+                next_id=upper["id"],
+            )
+        elif not after_id and not before_id:
+            lower = await first("TRUE", "rank DESC, id DESC")
+        if not lower or not upper or lower["rank"] < upper["rank"]:
+            return rank_between(lower["rank"] if lower else None, upper["rank"] if upper else None)
+        if after_id and before_id and (lower["rank"], lower["id"]) > (upper["rank"], upper["id"]):
+            raise ValueError(f"Tasks {after_id} is not before {before_id}.")
+        # tied ranks, left by concurrent writes: spread the column out once
+        await _rebalance_column(conn, scrum_id, stage)
+    raise ValueError("Cannot rank the tasks between its neighbours.")
+
+
+async def _rebalance_column(conn: Connection, scrum_id: str, stage: TaskStage) -> int:
+    # tasks without a rank go last, in creation order
+    result = await _execute(
+        conn,
+        """
+            SELECT id FROM scrum.tasks
+            WHERE scrum_id = :scrum_id AND stage = :stage
+            ORDER BY CASE WHEN rank IS NULL THEN 1 ELSE 0 END, rank, created_at, id
+        """,
+        {"scrum_id": scrum_id, "stage": stage.value},
+    )
+    ids = [row["id"] for row in result.mappings().all()]
+    if ids:
+        await _execute(
+            conn,
+            "UPDATE scrum.tasks SET rank = :rank WHERE id = :id",
+            [{"rank": rank, "id": tasks_id} for tasks_id, rank in zip(ids, rank_keys(len(ids)), strict=True)],
+        )
+    return len(ids)
+
+
+# rows per multi-row insert, keeps the bind parameters under the SQLite limit
+BULK_CHUNK_SIZE = 500
+
+
+@asynccontextmanager
+async def _transaction() -> AsyncIterator[Connection]:
+    """
+    A connection whose `_execute` statements are committed together, or not at all.
+    """
+    async with db.connect() as conn:
+        try:
+            yield conn
+            await conn.conn.commit()
+        except Exception:
+            await conn.conn.rollback()
+            raise
+
+
+async def _execute(conn: Connection, query: str, values: dict | list[dict], from_models: bool = False):
+    # unlike `Connection.execute` this does not commit, a list of values runs `executemany`.
+    # values from `model_to_dict` are already in database format, like in `Connection.insert`
+    if from_models:
+        params: dict | list[dict] = values
+    elif isinstance(values, list):
+        params = [conn.rewrite_values(row) for row in values]
+    else:
+        params = conn.rewrite_values(values)
+    return await conn.conn.execute(text(conn.rewrite_query(query)), params)
+
+
+async def _insert_rows(conn: Connection, table_name: str, models: list) -> None:
+    """
+    One multi-row INSERT for all `models`.
+    """
+    if not models:
+        return
+    rows = [model_to_dict(model) for model in models]
+    columns = list(rows[0].keys())
+    values: dict = {}
+    placeholders = []
+    for i, row in enumerate(rows):
+        placeholders.append("(" + ", ".join(f":{column}__{i}" for column in columns) + ")")
+        values.update({f"{column}__{i}": row[column] for column in columns})
+    fields = ", ".join(f'"{column}"' for column in columns)
+    await _execute(
+        conn,
+        f"INSERT INTO {table_name} ({fields}) VALUES {', '.join(placeholders)}",
+        values,
+        from_models=True,
+    )
+
+
+# the database marks matches with these, `_highlight` turns them into tags
+MARK_START = "\x02"
+MARK_END = "\x03"
+
+
+def _highlight(text: str) -> str:
+    # the task text is user input, only the <mark> tags may come out as html
+    return html.escape(text).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def _fts_query(search: str) -> str | None:
+    """
+    A full-text query matching every word of `search` as a prefix,
+    user input never reaches the query syntax.
+    """
+    terms = re.findall(r"\w+", search.lower())
+    if not terms:
+        return None
+    if db.type == SQLITE:
+        return " ".join(f'"{term}"*' for term in terms)
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def _tasks_search_filters(filters: Filters | None, where: list[str], values: dict) -> Filters | None:
+    """
+    Move the text `search` of `filters` to a full-text clause in `where`.
+    """
+    if not filters or not filters.search:
+        return filters
+    query = _fts_query(filters.search)
+    if not query:
+        where.append("1 = 0")
+    elif db.type == SQLITE:
+        where.append("rowid IN (SELECT rowid FROM scrum.tasks_fts WHERE tasks_fts MATCH :search_query)")
+    else:
+        where.append("search @@ to_tsquery('simple', :search_query)")
+    values["search_query"] = query
+    return filters.copy(update={"search": None})
+
+
+def _tasks_table(archived: bool) -> str:
+    # the archive has no full-text index, its `search` is a LIKE over `TasksFilters`
+    return "scrum.tasks_archive" if archived else "scrum.tasks"
+
+
+def _tasks_scrum_clauses(scrum_ids: list[str] | None, user_id: str | None, values: dict) -> list[str]:
+    where = []
+    if user_id:
+        where.append("scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)")
+        values["user_id"] = user_id
+    if scrum_ids:
+        where.append(_id_list_clause("scrum_id", "scrum_ids", scrum_ids, values))
+    return where
+
+
+async def _fetch_cursor_page(
+    table_name: str,
+    where: list[str],
+    values: dict,
+    filters: Filters | None,
+    model: type[TPaged],
+    sort_fields: dict[str, Any],
+    cursor: str | None = None,
+    with_total: bool = False,
+) -> CursorPage[TPaged]:
+    """
+    Keyset pagination on (sort field, id): the page starts right after the
+    row in `cursor`, so it costs the same however deep it is. `sort_fields`
+    maps the sortable fields to the value their NULLs sort as, None for
+    NOT NULL columns.
+    """
+    filters = filters or Filters()
+    sortby = filters.sortby or "created_at"
+    if sortby not in sort_fields:
+        raise ValueError(f"Cannot page by cursor sorted by '{sortby}'.")
+    direction = filters.direction or "asc"
+    # same limits as `Filters.pagination`
+    limit = 1000 if filters.limit == 0 else min(1000, filters.limit or 10)
+
+    sort = sortby
+    if sort_fields[sortby] is not None:
+        sort = f"COALESCE({sortby}, :sort_default)"
+        values["sort_default"] = sort_fields[sortby]
+    is_timestamp = model.__fields__[sortby].type_ is datetime
+
+    clause = filters.where(list(where))
+    values = filters.values(values)
+    page_where = clause
+    if cursor:
+        after = decode_cursor(cursor)
+        if after.get("sort") != [sortby, direction] or not isinstance(after.get("id"), str):
+            raise ValueError("Invalid cursor.")
+        value = db.timestamp_placeholder("after_value") if is_timestamp else ":after_value"
+        op = ">" if direction == "asc" else "<"
+        # the redundant `op=` bound lets an index on the sort field skip the earlier pages
+        page_where = (
+            f"{clause or 'WHERE TRUE'} AND {sort} {op}= {value}"
+            f" AND ({sort} {op} {value} OR ({sort} = {value} AND id {op} :after_id))"
+        )
+        values["after_value"] = after.get("value")
+        values["after_id"] = after["id"]
+
+    rows: list[TPaged] = await db.fetchall(
+        f"""
+            SELECT * FROM {table_name}
+            {page_where}
+            ORDER BY {sort} {direction}, id {direction}
+            LIMIT {limit + 1}
+        """,
+        values,
+        model,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = getattr(rows[-1], sortby)
+        if last is None:
+            last = sort_fields[sortby]
+        elif is_timestamp:
+            last = last.timestamp()
+        elif isinstance(last, Enum):
+            last = last.value
+        next_cursor = encode_cursor({"sort": [sortby, direction], "value": last, "id": rows[-1].id})
+
+    total = None
+    if with_total:
+        row: dict = await db.fetchone(f"SELECT COUNT(*) AS count FROM {table_name} {clause}", values)
+        total = int(row["count"])
+    return CursorPage(data=rows, next_cursor=next_cursor, total=total)
+
+
+def _tasks_export_clauses(filters: TasksExportFilters, values: dict) -> list[str]:
+    where = []
+    if filters.stage:
+        where.append("stage = :stage")
+        values["stage"] = filters.stage.value
+    for column in ("paid", "complete"):
+        value = getattr(filters, column)
+        if value is not None:
+            # both columns are nullable, NULL counts as false
+            where.append(f"{column} = :{column}" if value else f"({column} = :{column} OR {column} IS NULL)")
+            values[column] = value
+    if filters.created_from:
+        where.append(f"created_at >= {db.timestamp_placeholder('created_from')}")
+        values["created_from"] = filters.created_from.timestamp()
+    if filters.created_to:
+        where.append(f"created_at < {db.timestamp_placeholder('created_to')}")
+        values["created_to"] = filters.created_to.timestamp()
+    return where
+
+
+def _id_list_clause(column: str, key: str, ids: list[str], values: dict, write: bool = False) -> str:
+    """
+    Match `column` against a list of ids with a single bind parameter:
+    a JSON array on SQLite, a native array on postgres.
+    """
+    if len(ids) == 1:
+        # lets the planner walk an index on `column` in order
+        values[key] = ids[0]
+        return f"{column} = :{key}"
+    if db.type == SQLITE and write:
+        # SQLite reports the extension database, attached to itself, as locked
+        # when a write statement reads `json_each`; bind every id on its own.
+        values.update({f"{key}__{i}": value for i, value in enumerate(ids)})
+        return f"{column} IN ({', '.join(f':{key}__{i}' for i in range(len(ids)))})"
+    if db.type == SQLITE:
+        values[key] = json.dumps(ids)
+        return f"{column} IN (SELECT value FROM json_each(:{key}))"
+    values[key] = ids
+    return f"{column} = ANY(:{key})"
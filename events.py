@@ -0,0 +1,300 @@
+# Description: Task change events pushed to the viewers of a scrum board.
+#
+# Every message on the board websocket is a versioned `TaskEvents` envelope.
+# Each event carries a per board, monotonically increasing sequence number,
+# so a client that notices a gap (or reconnects) can fetch just the events
+# it missed from `get_task_events` instead of reloading the whole board.
+#
+# The same messages are fanned out to the Server-Sent Events subscribers of
+# the board, each with a bounded queue. A subscriber that falls too far behind
+# is dropped, and resumes from the backlog with `Last-Event-ID` when it
+# reconnects.
+#
+# A board's events live in memory while it is in use. Idle boards are evicted,
+# and a board starts over with a new epoch, so its clients resync.
+#
+# Changes are held for a short broadcast window first. Changes to the same
+# task within the window are merged into one event, and everything pending is
+# sent as one message, so a burst of moves costs one message per viewer.
+
+import asyncio
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+
+from lnbits.core.services import websocket_updater
+from lnbits.helpers import urlsafe_short_hash
+from loguru import logger
+
+from .metrics import record
+from .models import TaskEvent, TaskEventOp, TaskEvents, Tasks
+from .serialize import jsonable, task_dict, task_events
+
+# events kept per board for reconnecting clients
+EVENTS_BACKLOG = 500
+
+# seconds changes wait to be merged and sent together, 0 sends them at once
+BROADCAST_WINDOW = int(os.getenv("SCRUM_BROADCAST_WINDOW_MS", "100")) / 1000
+
+# messages queued per SSE subscriber before it is dropped as too slow
+SUBSCRIBER_QUEUE = 64
+
+# seconds between keep-alive comments on an idle SSE stream
+SSE_PING_INTERVAL = 15
+
+# milliseconds browsers wait before reconnecting a closed SSE stream
+SSE_RETRY = 2000
+
+# seconds a board without subscribers or pending changes is kept after its last use
+BOARD_IDLE_TTL = int(os.getenv("SCRUM_BOARD_IDLE_TTL", "3600"))
+
+# boards kept in memory, the least recently used idle ones are evicted first
+MAX_BOARDS = int(os.getenv("SCRUM_MAX_BOARDS", "10000"))
+
+
+class Subscriber:
+    def __init__(self):
+        # `None` closes the stream
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+
+    def send(self, frame: bytes) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        # nothing queued is worth sending, the client replays what it missed
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class BoardEvents:
+    def __init__(self):
+        # sequence numbers restart with the board, the epoch tells clients apart
+        self.epoch = urlsafe_short_hash()
+        self.seq = 0
+        self.events: deque[TaskEvent] = deque(maxlen=EVENTS_BACKLOG)
+        self.subscribers: set[Subscriber] = set()
+        self.dropped = 0
+        # changes waiting for the broadcast window, by id in arrival order
+        self.pending: dict[str, tuple[TaskEventOp, dict]] = {}
+        self.flusher: asyncio.Task | None = None
+        # keeps the websocket messages in order while one is being sent
+        self.sending = asyncio.Lock()
+        self.used_at = time.monotonic()
+
+    def idle(self) -> bool:
+        return not self.subscribers and not self.pending and not self.flusher
+
+    def add(self, op: TaskEventOp, tasks_id: str, fields: dict):
+        current = self.pending.get(tasks_id)
+        if current and op == TaskEventOp.update:
+            if current[0] == TaskEventOp.delete:
+                # a late write, like a payout status, does not bring a deleted task back
+                return
+            # still a create if the task was created in the window
+            op, fields = current[0], {**current[1], **fields}
+        # a merged or replaced change moves behind the ones queued after it, never before
+        self.pending.pop(tasks_id, None)
+        self.pending[tasks_id] = (op, fields)
+
+    def broadcast(self, frame: bytes):
+        for subscriber in list(self.subscribers):
+            if not subscriber.send(frame):
+                self.subscribers.discard(subscriber)
+                subscriber.close()
+                self.dropped += 1
+
+
+# least recently used first
+_boards: dict[str, BoardEvents] = {}
+
+
+def task_created(tasks: Tasks) -> tuple[TaskEventOp, str, dict]:
+    return TaskEventOp.create, tasks.id, task_dict(tasks)
+
+
+def task_updated(tasks: Tasks, previous: Tasks | None = None) -> tuple[TaskEventOp, str, dict]:
+    fields = task_dict(tasks)
+    if previous:
+        old = task_dict(previous)
+        fields = {key: value for key, value in fields.items() if old.get(key) != value}
+    return TaskEventOp.update, tasks.id, fields
+
+
+def task_changed(tasks_id: str, fields: dict) -> tuple[TaskEventOp, str, dict]:
+    return TaskEventOp.update, tasks_id, jsonable(fields)
+
+
+def task_deleted(tasks_id: str) -> tuple[TaskEventOp, str, dict]:
+    return TaskEventOp.delete, tasks_id, {}
+
+
+def board_reloaded(scrum_id: str, summary: dict) -> tuple[TaskEventOp, str, dict]:
+    return TaskEventOp.reload, scrum_id, jsonable(summary)
+
+
+async def publish_task_events(scrum_id: str, *changes: tuple[TaskEventOp, str, dict]):
+    """
+    Queue the changes for the next message to the board websocket and SSE
+    subscribers, sent when the broadcast window closes.
+    """
+    board = _board(scrum_id)
+    for op, tasks_id, fields in changes:
+        board.add(op, tasks_id, fields)
+    if BROADCAST_WINDOW <= 0:
+        await _flush(scrum_id, board)
+    elif not board.flusher:
+        board.flusher = asyncio.create_task(_flush_later(scrum_id, board))
+
+
+async def _flush_later(scrum_id: str, board: BoardEvents):
+    await asyncio.sleep(BROADCAST_WINDOW)
+    try:
+        await _flush(scrum_id, board)
+    except Exception as exc:
+        logger.warning(f"Sending task events of scrum {scrum_id} failed: {exc!s}")
+
+
+async def _flush(scrum_id: str, board: BoardEvents) -> TaskEvents | None:
+    """
+    Number the pending changes, keep them for `get_task_events` and send them
+    as one message.
+    """
+    board.flusher = None
+    pending, board.pending = board.pending, {}
+    if not pending:
+        return None
+    events = []
+    for tasks_id, (op, fields) in pending.items():
+        board.seq += 1
+        event = TaskEvent(seq=board.seq, op=op, id=tasks_id, fields=fields)
+        board.events.append(event)
+        events.append(event)
+    message = TaskEvents(epoch=board.epoch, seq=board.seq, events=events)
+    with record("broadcast"):
+        data = task_events(message).decode()
+        # before the first await, so subscribers get the messages in order
+        board.broadcast(_sse_frame(board.epoch, message.seq, data))
+        async with board.sending:
+            await websocket_updater(scrum_id, data)
+    return message
+
+
+def board_seq(scrum_id: str) -> int:
+    return board_position(scrum_id)[1]
+
+
+def board_position(scrum_id: str) -> tuple[str, int]:
+    """
+    The epoch and sequence number of the last event of the board.
+    """
+    board = _board(scrum_id)
+    return board.epoch, board.seq
+
+
+def get_task_events(scrum_id: str, since: int = 0, client_epoch: str | None = None) -> TaskEvents:
+    """
+    The events after sequence number `since`. When they are no longer all
+    available, `resync` tells the client to reload the board instead.
+    """
+    board = _board(scrum_id)
+    epoch, seq = board.epoch, board.seq
+    if client_epoch and client_epoch != epoch:
+        return TaskEvents(epoch=epoch, seq=seq, resync=True)
+    if since > seq:
+        return TaskEvents(epoch=epoch, seq=seq, resync=True)
+    if since == seq:
+        return TaskEvents(epoch=epoch, seq=seq)
+    if since < board.events[0].seq - 1:
+        return TaskEvents(epoch=epoch, seq=seq, resync=True)
+    events = [event for event in board.events if event.seq > since]
+    return TaskEvents(epoch=epoch, seq=seq, events=events)
+
+
+def subscriber_count(scrum_id: str) -> int:
+    board = _boards.get(scrum_id)
+    return len(board.subscribers) if board else 0
+
+
+async def stream_task_events(scrum_id: str, last_event_id: str | None = None) -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events of the board. With the `Last-Event-ID` of a previous
+    stream, the events missed since are sent first, or a `resync` message
+    when they are gone.
+    """
+    board = _board(scrum_id)
+    frames = [f"retry: {SSE_RETRY}\n\n".encode()]
+    if last_event_id:
+        client_epoch, _, since = last_event_id.partition(":")
+        # an id we never sent can only be answered with a resync
+        missed = get_task_events(scrum_id, int(since) if since.isdigit() else board.seq + 1, client_epoch)
+        if missed.resync or missed.events:
+            frames.append(_sse_frame(board.epoch, missed.seq, task_events(missed).decode()))
+    # no await since the replay, nothing is missed or sent twice
+    subscriber = Subscriber()
+    board.subscribers.add(subscriber)
+    try:
+        for frame in frames:
+            yield frame
+        while True:
+            item: bytes | None
+            if subscriber.queue.empty():
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), SSE_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+            else:
+                item = subscriber.queue.get_nowait()
+            if item is None:
+                return
+            yield item
+    finally:
+        board.subscribers.discard(subscriber)
+
+
+def forget_board(scrum_id: str) -> None:
+    """
+    Drop the events of a deleted scrum and close its streams.
+    """
+    board = _boards.pop(scrum_id, None)
+    if not board:
+        return
+    if board.flusher:
+        board.flusher.cancel()
+    for subscriber in board.subscribers:
+        subscriber.close()
+
+
+def _board(scrum_id: str) -> BoardEvents:
+    # moved to the end, the most recently used
+    board = _boards.pop(scrum_id, None) or BoardEvents()
+    board.used_at = time.monotonic()
+    _evict_boards()
+    _boards[scrum_id] = board
+    return board
+
+
+def _evict_boards() -> None:
+    # from the least recently used, boards still in use count as used now
+    now = time.monotonic()
+    evicted: list[str] = []
+    in_use: list[str] = []
+    for scrum_id, board in _boards.items():
+        if len(_boards) - len(evicted) < MAX_BOARDS and board.used_at > now - BOARD_IDLE_TTL:
+            break
+        (evicted if board.idle() else in_use).append(scrum_id)
+    for scrum_id in evicted:
+        del _boards[scrum_id]
+    for scrum_id in in_use:
+        _boards[scrum_id] = _boards.pop(scrum_id)
+        _boards[scrum_id].used_at = now
+
+
+def _sse_frame(epoch: str, seq: int, data: str) -> bytes:
+    return f"id: {epoch}:{seq}\nevent: tasks\ndata: {data}\n\n".encode()
@@ -0,0 +1,23 @@
+# Description: Small helpers shared by the crud and api modules.
+
+import base64
+import json
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    Opaque, url safe pagination cursor holding the position of the last row.
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as exc:
+        raise ValueError("Invalid cursor.") from exc
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor.")
+    return values
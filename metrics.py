@@ -0,0 +1,221 @@
+# Description: Opt-in performance metrics of the scrum routes.
+#
+# Set SCRUM_METRICS=1 to record, per route, the latency and the number and
+# time of the database queries, plus the time spent broadcasting task events
+# and calling the payment services. The totals are served in the Prometheus
+# text format, and every instrumented response gets a `Server-Timing` header
+# with the breakdown of that request. When disabled, a route pays for one
+# flag check and nothing is recorded.
+
+import os
+import time
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from lnbits.db import Database
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+
+from . import crud
+
+enabled = os.getenv("SCRUM_METRICS", "").lower() in ("1", "true", "yes")
+
+# upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.broadcast_seconds = 0.0
+        self.payment_seconds = 0.0
+
+
+class RequestMetrics:
+    """
+    What one request spent its time on, see `record`.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.broadcast_seconds = 0.0
+        self.payment_seconds = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join(
+            [
+                f'db;dur={self.query_seconds * 1000:.2f};desc="{self.queries} queries"',
+                f"broadcast;dur={self.broadcast_seconds * 1000:.2f}",
+                f"payment;dur={self.payment_seconds * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+
+_request: ContextVar[RequestMetrics | None] = ContextVar("scrum_request_metrics", default=None)
+_routes: dict[tuple[str, str], RouteMetrics] = {}
+# broadcasts and payments also happen outside of requests, in background tasks
+_broadcasts = Histogram()
+_payments: dict[str, Histogram] = {}
+_watched: set[int] = set()
+
+
+class MetricsRoute(APIRoute):
+    """
+    Route class of the scrum routers, records the metrics of every request.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        key = (",".join(sorted(self.methods or [])), self.path_format)
+
+        async def metrics_handler(request: Request) -> Response:
+            if not enabled:
+                return await handler(request)
+            watch_database(crud.db)
+            request_metrics = RequestMetrics()
+            token = _request.set(request_metrics)
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                total = time.perf_counter() - start
+                _request.reset(token)
+                _add(_routes.setdefault(key, RouteMetrics()), request_metrics, total)
+            response.headers["Server-Timing"] = request_metrics.server_timing(total)
+            return response
+
+        return metrics_handler
+
+
+def watch_database(database: Database) -> None:
+    """
+    Count and time the queries of `database` made during requests.
+    """
+    engine = database.engine.sync_engine
+    if id(engine) in _watched:
+        return
+    _watched.add(id(engine))
+
+    def before(conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        if _request.get() is not None:
+            conn.info["scrum_query_start"] = time.perf_counter()
+
+    def after(conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        request_metrics = _request.get()
+        start = conn.info.pop("scrum_query_start", None)
+        if request_metrics is not None and start is not None:
+            request_metrics.queries += 1
+            request_metrics.query_seconds += time.perf_counter() - start
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+
+
+@contextmanager
+def record(kind: str, name: str | None = None) -> Iterator[None]:
+    """
+    Time a `broadcast` or a `payment` call (`name` tells them apart).
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if kind == "broadcast":
+            _broadcasts.observe(seconds)
+        else:
+            _payments.setdefault(name or kind, Histogram()).observe(seconds)
+        request_metrics = _request.get()
+        if request_metrics is not None:
+            if kind == "broadcast":
+                request_metrics.broadcast_seconds += seconds
+            else:
+                request_metrics.payment_seconds += seconds
+
+
+def prometheus_text() -> str:
+    lines: list[str] = []
+    lines += _histogram_lines(
+        "scrum_request_duration_seconds",
+        "Latency of the scrum routes.",
+        [(_labels(method=method, route=route), metrics.latency) for (method, route), metrics in _routes.items()],
+    )
+    for name, help_text, attribute in (
+        ("scrum_request_db_queries_total", "Database queries made by the scrum routes.", "queries"),
+        ("scrum_request_db_seconds_total", "Time in database queries of the scrum routes.", "query_seconds"),
+        ("scrum_request_broadcast_seconds_total", "Time broadcasting task events in the routes.", "broadcast_seconds"),
+        ("scrum_request_payment_seconds_total", "Time in payment calls of the scrum routes.", "payment_seconds"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route), metrics in _routes.items():
+            lines.append(f"{name}{_labels(method=method, route=route)} {getattr(metrics, attribute)}")
+    lines += _histogram_lines(
+        "scrum_broadcast_duration_seconds", "Time sending one task events message.", [("", _broadcasts)]
+    )
+    lines += _histogram_lines(
+        "scrum_payment_duration_seconds",
+        "Latency of the payment service calls.",
+        [(_labels(call=name), histogram) for name, histogram in _payments.items()],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    global _broadcasts
+    _routes.clear()
+    _payments.clear()
+    _broadcasts = Histogram()
+
+
+def _add(route: RouteMetrics, request_metrics: RequestMetrics, total: float):
+    route.latency.observe(total)
+    route.queries += request_metrics.queries
+    route.query_seconds += request_metrics.query_seconds
+    route.broadcast_seconds += request_metrics.broadcast_seconds
+    route.payment_seconds += request_metrics.payment_seconds
+
+
+def _labels(**labels: str) -> str:
+    values = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + values + "}"
+
+
+def _histogram_lines(name: str, help_text: str, series: list[tuple[str, Histogram]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        # the buckets are cumulative, with the labels of the series plus `le`
+        inner = labels[1:-1] + "," if labels else ""
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts, strict=True):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{inner}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{inner}le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{labels} {histogram.sum}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
@@ -2,9 +2,19 @@
 # If you create a new release for your extension ,
 # remember the migration file is like a blockchain, never edit only add!
 
+from lnbits.db import SQLITE
+
 empty_dict: dict[str, str] = {}
 
 
+async def _create_index(db, name: str, table: str, columns: str):
+    # SQLite wants the schema on the index name, postgres on the table name
+    if db.type == SQLITE:
+        await db.execute(f"CREATE INDEX IF NOT EXISTS scrum.{name} ON {table} ({columns});")
+    else:
+        await db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON scrum.{table} ({columns});")
+
+
 async def m002_scrum(db):
     """
     Initial scrum table.
@@ -70,3 +80,512 @@ async def m005_add_public_delete_tasks(db):
         ALTER TABLE scrum.scrum ADD public_delete_tasks BOOLEAN DEFAULT false;
     """
     )
+
+
+async def m006_add_indexes(db):
+    """
+    Add indexes matching the task and scrum access paths.
+    """
+    await _create_index(db, "tasks_scrum_id_stage_idx", "tasks", "scrum_id, stage")
+    await _create_index(db, "tasks_scrum_id_created_at_idx", "tasks", "scrum_id, created_at")
+    await _create_index(db, "tasks_scrum_id_updated_at_idx", "tasks", "scrum_id, updated_at")
+    await _create_index(db, "scrum_user_id_created_at_idx", "scrum", "user_id, created_at")
+
+
+async def m007_add_tasks_stage_order_index(db):
+    """
+    Add an index serving a board column in display order.
+    """
+    await _create_index(db, "tasks_scrum_id_stage_created_at_idx", "tasks", "scrum_id, stage, created_at, id")
+
+
+async def m008_payouts(db):
+    """
+    Reward payout queue, one row per task, and the payout status of a task.
+    """
+    await db.execute(
+        f"""
+        CREATE TABLE scrum.payouts (
+            task_id TEXT PRIMARY KEY,
+            scrum_id TEXT NOT NULL,
+            wallet TEXT NOT NULL,
+            assignee TEXT NOT NULL,
+            amount INT NOT NULL,
+            description TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            error TEXT,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now},
+            created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now},
+            updated_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+    """
+    )
+    await _create_index(db, "payouts_status_next_attempt_at_idx", "payouts", "status, next_attempt_at")
+    await db.execute(
+        """
+        ALTER TABLE scrum.tasks ADD payout_status TEXT;
+    """
+    )
+
+
+async def m009_add_tasks_version(db):
+    """
+    Add a version to tasks, bumped by every edit, for optimistic concurrency.
+    """
+    await db.execute("ALTER TABLE scrum.tasks ADD version INT NOT NULL DEFAULT 0")
+
+
+def _stats_upsert(table: str, row: str, sign: str) -> str:
+    # add (sign "") or take away (sign "-") the `row` of a tasks trigger to its stats
+    return f"""
+        INSERT INTO {table} (scrum_id, stage, tasks, reward, paid_reward, committed_reward)
+        VALUES (
+            {row}.scrum_id,
+            {row}.stage,
+            {sign}1,
+            {sign}COALESCE({row}.reward, 0),
+            CASE WHEN {row}.paid THEN {sign}COALESCE({row}.reward, 0) ELSE 0 END,
+            CASE
+                WHEN {row}.paid THEN 0
+                WHEN COALESCE({row}.assignee, '') <> '' THEN {sign}COALESCE({row}.reward, 0)
+                ELSE 0
+            END
+        )
+        ON CONFLICT (scrum_id, stage) DO UPDATE SET
+            tasks = stats.tasks + excluded.tasks,
+            reward = stats.reward + excluded.reward,
+            paid_reward = stats.paid_reward + excluded.paid_reward,
+            committed_reward = stats.committed_reward + excluded.committed_reward;
+    """
+
+
+async def m010_stats(db):
+    """
+    Task counts and reward sums per scrum and stage, kept up to date by
+    triggers on the tasks table, so every write path maintains them.
+    """
+    await db.execute(
+        """
+        CREATE TABLE scrum.stats (
+            scrum_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            tasks INT NOT NULL DEFAULT 0,
+            reward INT NOT NULL DEFAULT 0,
+            paid_reward INT NOT NULL DEFAULT 0,
+            committed_reward INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (scrum_id, stage)
+        );
+    """
+    )
+    # only the columns that change the stats fire the update triggers
+    columns = "scrum_id, stage, reward, paid, assignee"
+    if db.type == SQLITE:
+        # trigger bodies can only name tables of the schema the trigger is in
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_stats_insert AFTER INSERT ON tasks
+            BEGIN {_stats_upsert("stats", "NEW", "")} END;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_stats_update AFTER UPDATE OF {columns} ON tasks
+            BEGIN {_stats_upsert("stats", "OLD", "-")} {_stats_upsert("stats", "NEW", "")} END;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_stats_delete AFTER DELETE ON tasks
+            BEGIN {_stats_upsert("stats", "OLD", "-")} END;
+        """
+        )
+    else:
+        await db.execute(
+            f"""
+            CREATE FUNCTION scrum.tasks_stats() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    {_stats_upsert("scrum.stats", "OLD", "-")}
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    {_stats_upsert("scrum.stats", "NEW", "")}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER tasks_stats
+            AFTER INSERT OR DELETE OR UPDATE OF {columns} ON scrum.tasks
+            FOR EACH ROW EXECUTE FUNCTION scrum.tasks_stats();
+        """
+        )
+    await db.execute(
+        """
+        INSERT INTO scrum.stats (scrum_id, stage, tasks, reward, paid_reward, committed_reward)
+        SELECT
+            scrum_id,
+            stage,
+            COUNT(*),
+            SUM(COALESCE(reward, 0)),
+            SUM(CASE WHEN paid THEN COALESCE(reward, 0) ELSE 0 END),
+            SUM(
+                CASE
+                    WHEN paid THEN 0
+                    WHEN COALESCE(assignee, '') <> '' THEN COALESCE(reward, 0)
+                    ELSE 0
+                END
+            )
+        FROM scrum.tasks
+        GROUP BY scrum_id, stage;
+    """
+    )
+
+
+async def m011_tasks_search(db):
+    """
+    Full-text search over the task text, notes and assignee: an external
+    content FTS5 table kept in sync by triggers on SQLite, a generated
+    tsvector column with a GIN index on postgres.
+    """
+    if db.type == SQLITE:
+        await db.execute(
+            """
+            CREATE VIRTUAL TABLE scrum.tasks_fts USING fts5(
+                task, notes, assignee, content='tasks', content_rowid='rowid', prefix='2 3'
+            );
+        """
+        )
+        insert = """
+            INSERT INTO tasks_fts (rowid, task, notes, assignee)
+            VALUES (NEW.rowid, NEW.task, NEW.notes, NEW.assignee);
+        """
+        delete = """
+            INSERT INTO tasks_fts (tasks_fts, rowid, task, notes, assignee)
+            VALUES ('delete', OLD.rowid, OLD.task, OLD.notes, OLD.assignee);
+        """
+        await db.execute(f"CREATE TRIGGER scrum.tasks_fts_insert AFTER INSERT ON tasks BEGIN {insert} END;")
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_fts_update AFTER UPDATE OF task, notes, assignee ON tasks
+            BEGIN {delete} {insert} END;
+        """
+        )
+        await db.execute(f"CREATE TRIGGER scrum.tasks_fts_delete AFTER DELETE ON tasks BEGIN {delete} END;")
+        await db.execute("INSERT INTO scrum.tasks_fts (tasks_fts) VALUES ('rebuild');")
+    else:
+        await db.execute(
+            """
+            ALTER TABLE scrum.tasks ADD search tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', COALESCE(task, '')), 'A')
+                || setweight(to_tsvector('simple', COALESCE(notes, '')), 'B')
+                || setweight(to_tsvector('simple', COALESCE(assignee, '')), 'C')
+            ) STORED;
+        """
+        )
+        await db.execute("CREATE INDEX IF NOT EXISTS tasks_search_idx ON scrum.tasks USING GIN (search);")
+
+
+async def m012_add_public_limits(db):
+    """
+    Add the limits of public writes to scrum.scrum, null uses the defaults.
+    """
+    await db.execute("ALTER TABLE scrum.scrum ADD public_rate_limit INT;")
+    await db.execute("ALTER TABLE scrum.scrum ADD public_board_rate_limit INT;")
+    await db.execute("ALTER TABLE scrum.scrum ADD public_max_pending INT;")
+
+
+async def m013_purges(db):
+    """
+    Queue of deleted scrums whose tasks are still to be removed, seeded with
+    the scrums whose tasks were left behind by earlier deletes.
+    """
+    await db.execute(
+        f"""
+        CREATE TABLE scrum.purges (
+            scrum_id TEXT PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+    """
+    )
+    await db.execute(
+        """
+        INSERT INTO scrum.purges (scrum_id)
+        SELECT DISTINCT scrum_id FROM scrum.tasks
+        WHERE scrum_id NOT IN (SELECT id FROM scrum.scrum);
+    """
+    )
+
+
+async def m014_tasks_archive(db):
+    """
+    Archive of the done and paid tasks, moved out of scrum.tasks so the board
+    queries only go through the active ones. Same columns as the tasks, minus
+    the search column, plus when the task was archived.
+    """
+    await db.execute(
+        f"""
+        CREATE TABLE scrum.tasks_archive (
+            id TEXT PRIMARY KEY,
+            scrum_id TEXT NOT NULL,
+            task TEXT NOT NULL,
+            assignee TEXT,
+            stage TEXT NOT NULL,
+            reward INT,
+            paid BOOLEAN,
+            complete BOOLEAN,
+            notes TEXT,
+            payout_status TEXT,
+            version INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now},
+            updated_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now},
+            archived_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+    """
+    )
+    await _create_index(db, "tasks_archive_scrum_id_created_at_idx", "tasks_archive", "scrum_id, created_at")
+    await _create_index(db, "tasks_archive_scrum_id_updated_at_idx", "tasks_archive", "scrum_id, updated_at")
+
+
+async def m015_tasks_rank(db):
+    """
+    Add the position of a task within its column, ranked in creation order,
+    and an index serving a column in that order in place of the m007 one.
+    Postgres compares the ranks byte-wise like SQLite.
+    """
+    collate = "" if db.type == SQLITE else ' COLLATE "C"'
+    await db.execute(f"ALTER TABLE scrum.tasks ADD rank TEXT{collate};")
+    await db.execute(f"ALTER TABLE scrum.tasks_archive ADD rank TEXT{collate};")
+
+    rows = await db.fetchall("SELECT id, scrum_id, stage FROM scrum.tasks ORDER BY scrum_id, stage, created_at, id")
+    columns: dict[tuple[str, str], list[str]] = {}
+    for row in rows:
+        columns.setdefault((row["scrum_id"], row["stage"]), []).append(row["id"])
+    for ids in columns.values():
+        ranked = list(zip(ids, _m015_rank_keys(len(ids)), strict=True))
+        # one statement per chunk of a column, within the bind parameter limits
+        for start in range(0, len(ranked), 500):
+            chunk = ranked[start : start + 500]
+            values = {f"id{i}": tasks_id for i, (tasks_id, _) in enumerate(chunk)}
+            values.update({f"rank{i}": rank for i, (_, rank) in enumerate(chunk)})
+            cases = " ".join(f"WHEN :id{i} THEN :rank{i}" for i in range(len(chunk)))
+            ids_list = ", ".join(f":id{i}" for i in range(len(chunk)))
+            await db.execute(
+                f"UPDATE scrum.tasks SET rank = CASE id {cases} END WHERE id IN ({ids_list})",
+                values,
+            )
+
+    await _create_index(db, "tasks_scrum_id_stage_rank_idx", "tasks", "scrum_id, stage, rank, id")
+    await db.execute("DROP INDEX IF EXISTS scrum.tasks_scrum_id_stage_created_at_idx;")
+
+
+def _m015_rank_keys(count: int) -> list[str]:
+    # a frozen copy of `ranks.rank_keys(count)` as m015 was written: base62
+    # integers "a0", "a1", ..., "az", "b00", ..., the head letter encoding the length
+    digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    head, integer = "a", [0]
+    keys = []
+    for _ in range(count):
+        keys.append(head + "".join(digits[digit] for digit in integer))
+        i = len(integer) - 1
+        while i >= 0 and integer[i] == len(digits) - 1:
+            integer[i] = 0
+            i -= 1
+        if i >= 0:
+            integer[i] += 1
+        else:
+            head = chr(ord(head) + 1)
+            integer.append(0)
+    return keys
+
+
+def _snapshot_upsert(table: str, today: str, row: str, level: str) -> str:
+    # set today's snapshot of a stage of the scrum to the `level` of its stats
+    return f"""
+        INSERT INTO {table} (scrum_id, day, stage, tasks, reward)
+        VALUES ({row}.scrum_id, {today}, {row}.stage, {level})
+        ON CONFLICT (scrum_id, day, stage) DO UPDATE SET
+            tasks = excluded.tasks,
+            reward = excluded.reward;
+    """
+
+
+def _snapshot_entered(table: str, today: str) -> str:
+    # count a task that entered a stage today
+    return f"""
+        INSERT INTO {table} (scrum_id, day, stage, entered, entered_reward)
+        VALUES (NEW.scrum_id, {today}, NEW.stage, 1, COALESCE(NEW.reward, 0))
+        ON CONFLICT (scrum_id, day, stage) DO UPDATE SET
+            entered = snapshots.entered + 1,
+            entered_reward = snapshots.entered_reward + excluded.entered_reward;
+    """
+
+
+async def m016_snapshots(db):
+    """
+    Daily snapshots of the stats of every scrum stage: the task count and
+    reward sum at the end of the day, and the tasks that entered the stage
+    that day. Today's row follows the stats through triggers, the rows of
+    the other days are only read.
+    """
+    await db.execute(
+        """
+        CREATE TABLE scrum.snapshots (
+            scrum_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            tasks INT NOT NULL DEFAULT 0,
+            reward INT NOT NULL DEFAULT 0,
+            entered INT NOT NULL DEFAULT 0,
+            entered_reward INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (scrum_id, day, stage)
+        );
+    """
+    )
+    if db.type == SQLITE:
+        # the UTC date as YYYY-MM-DD, compared as text
+        today = "date('now')"
+        for op, row, level in (
+            ("INSERT", "NEW", "NEW.tasks, NEW.reward"),
+            ("UPDATE", "NEW", "NEW.tasks, NEW.reward"),
+            ("DELETE", "OLD", "0, 0"),
+        ):
+            await db.execute(
+                f"""
+                CREATE TRIGGER scrum.stats_snapshot_{op.lower()} AFTER {op} ON stats
+                BEGIN {_snapshot_upsert("snapshots", today, row, level)} END;
+            """
+            )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_snapshot_insert AFTER INSERT ON tasks
+            BEGIN {_snapshot_entered("snapshots", today)} END;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_snapshot_update AFTER UPDATE OF scrum_id, stage ON tasks
+            WHEN OLD.stage <> NEW.stage OR OLD.scrum_id <> NEW.scrum_id
+            BEGIN {_snapshot_entered("snapshots", today)} END;
+        """
+        )
+    else:
+        today = "to_char(timezone('UTC', now()), 'YYYY-MM-DD')"
+        await db.execute(
+            f"""
+            CREATE FUNCTION scrum.stats_snapshot() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    {_snapshot_upsert("scrum.snapshots", today, "OLD", "0, 0")}
+                ELSE
+                    {_snapshot_upsert("scrum.snapshots", today, "NEW", "NEW.tasks, NEW.reward")}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """
+        )
+        await db.execute(
+            """
+            CREATE TRIGGER stats_snapshot
+            AFTER INSERT OR UPDATE OR DELETE ON scrum.stats
+            FOR EACH ROW EXECUTE FUNCTION scrum.stats_snapshot();
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE FUNCTION scrum.tasks_snapshot() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' OR OLD.stage <> NEW.stage OR OLD.scrum_id <> NEW.scrum_id THEN
+                    {_snapshot_entered("scrum.snapshots", today)}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """
+        )
+        await db.execute(
+            """
+            CREATE TRIGGER tasks_snapshot
+            AFTER INSERT OR UPDATE OF scrum_id, stage ON scrum.tasks
+            FOR EACH ROW EXECUTE FUNCTION scrum.tasks_snapshot();
+        """
+        )
+    await db.execute(
+        f"""
+        INSERT INTO scrum.snapshots (scrum_id, day, stage, tasks, reward)
+        SELECT scrum_id, {today}, stage, tasks, reward FROM scrum.stats;
+    """
+    )
+
+
+async def m017_tasks_archive_stats(db):
+    """
+    Keep the archived tasks in the stats: the stats triggers also run on the
+    archive, so archiving a task moves it between two tables the stats both
+    count. The tasks archived so far are added back.
+    """
+    columns = "scrum_id, stage, reward, paid, assignee"
+    if db.type == SQLITE:
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_archive_stats_insert AFTER INSERT ON tasks_archive
+            BEGIN {_stats_upsert("stats", "NEW", "")} END;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_archive_stats_update AFTER UPDATE OF {columns} ON tasks_archive
+            BEGIN {_stats_upsert("stats", "OLD", "-")} {_stats_upsert("stats", "NEW", "")} END;
+        """
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER scrum.tasks_archive_stats_delete AFTER DELETE ON tasks_archive
+            BEGIN {_stats_upsert("stats", "OLD", "-")} END;
+        """
+        )
+    else:
+        await db.execute(
+            f"""
+            CREATE TRIGGER tasks_archive_stats
+            AFTER INSERT OR DELETE OR UPDATE OF {columns} ON scrum.tasks_archive
+            FOR EACH ROW EXECUTE FUNCTION scrum.tasks_stats();
+        """
+        )
+    await db.execute(
+        """
+        INSERT INTO scrum.stats (scrum_id, stage, tasks, reward, paid_reward, committed_reward)
+        SELECT
+            scrum_id,
+            stage,
+            COUNT(*),
+            SUM(COALESCE(reward, 0)),
+            SUM(CASE WHEN paid THEN COALESCE(reward, 0) ELSE 0 END),
+            SUM(
+                CASE
+                    WHEN paid THEN 0
+                    WHEN COALESCE(assignee, '') <> '' THEN COALESCE(reward, 0)
+                    ELSE 0
+                END
+            )
+        FROM scrum.tasks_archive
+        GROUP BY scrum_id, stage
+        ON CONFLICT (scrum_id, stage) DO UPDATE SET
+            tasks = stats.tasks + excluded.tasks,
+            reward = stats.reward + excluded.reward,
+            paid_reward = stats.paid_reward + excluded.paid_reward,
+            committed_reward = stats.committed_reward + excluded.committed_reward;
+    """
+    )
+
+
+async def m018_payouts_payment_hash(db):
+    """
+    Keep the payment hash of the invoice a payout pays, so a payout whose
+    worker lost track of it is settled from that wallet payment.
+    """
+    await db.execute("ALTER TABLE scrum.payouts ADD payment_hash TEXT;")
@@ -1,9 +1,20 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from enum import Enum
+from typing import Generic, TypeVar
 
 from lnbits.db import FilterModel
+from lnurl import LnurlPayResponse
 from pydantic import BaseModel, Field
 
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    data: list[T]
+    next_cursor: str | None = None
+    # only counted when asked for
+    total: int | None = None
+
 
 class TaskStage(str, Enum):
     todo = "todo"
@@ -11,6 +22,19 @@ class TaskStage(str, Enum):
     done = "done"
 
 
+class TransferFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class PayoutStatus(str, Enum):
+    pending = "pending"
+    # handed to the wallet, settled from the wallet payment and never paid again
+    paying = "paying"
+    paid = "paid"
+    failed = "failed"
+
+
 ########################### Scrum ############################
 class CreateScrum(BaseModel):
     name: str
@@ -19,6 +43,11 @@ class CreateScrum(BaseModel):
     public_tasks: bool = False
     public_delete_tasks: bool = False
     wallet: str
+    # public writes per minute by one client and to the whole board, and the
+    # public writes in progress at once, null for the defaults, 0 for no limit
+    public_rate_limit: int | None = Field(None, ge=0)
+    public_board_rate_limit: int | None = Field(None, ge=0)
+    public_max_pending: int | None = Field(None, ge=0)
 
 
 class Scrum(BaseModel):
@@ -30,6 +59,9 @@ class Scrum(BaseModel):
     public_tasks: bool = False
     public_delete_tasks: bool = False
     wallet: str
+    public_rate_limit: int | None = None
+    public_board_rate_limit: int | None = None
+    public_max_pending: int | None = None
 
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -68,10 +100,60 @@ class CreateTasks(BaseModel):
     notes: str | None
 
 
+class BulkUpdateTasks(CreateTasks):
+    id: str
+    # the version the update is based on, the update fails with 409 if it is stale
+    version: int | None = None
+
+
+class BulkTasksIds(BaseModel):
+    ids: list[str]
+
+
+class MoveTasks(BulkTasksIds):
+    stage: TaskStage
+
+
+class MoveTask(BaseModel):
+    stage: TaskStage
+    # the tasks it is dropped between, the end of the column without either
+    after_id: str | None = None
+    before_id: str | None = None
+    # the version the move is based on, the move fails with 409 if it is stale
+    version: int | None = None
+
+
 class TasksPublic(BaseModel):
     assignee: str | None
     stage: TaskStage = TaskStage.todo
     notes: str | None
+    # the version the edit is based on, the update fails with 409 if it is stale
+    version: int | None = None
+
+    def changes(self) -> dict:
+        return self.dict(exclude_unset=True, exclude={"version"})
+
+
+class UpdateTasks(BaseModel):
+    task: str | None = None
+    scrum_id: str | None = None
+    assignee: str | None = None
+    stage: TaskStage | None = None
+    reward: int | None = None
+    paid: bool | None = None
+    complete: bool | None = None
+    notes: str | None = None
+    # the version the edit is based on, the update fails with 409 if it is stale
+    version: int | None = None
+
+    def changes(self) -> dict:
+        """
+        The fields sent by the client, `null` only clears the nullable ones.
+        """
+        fields = self.dict(exclude_unset=True, exclude={"version"})
+        return {
+            key: value for key, value in fields.items() if value is not None or key in ("assignee", "reward", "notes")
+        }
 
 
 class Tasks(BaseModel):
@@ -84,14 +166,26 @@ class Tasks(BaseModel):
     paid: bool = False
     complete: bool = False
     notes: str | None
+    payout_status: PayoutStatus | None = None
+    version: int = 0
+    # position within its column, a key of `ranks.py`
+    rank: str | None = None
 
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class TasksExportFilters(BaseModel):
+    stage: TaskStage | None = None
+    paid: bool | None = None
+    complete: bool | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+
 class TasksFilters(FilterModel):
+    # `search` goes through the full-text index, these are for `Filters.where`
     __search_fields__ = [
-        "scrum",
         "task",
         "assignee",
         "stage",
@@ -101,7 +195,7 @@ class TasksFilters(FilterModel):
     ]
 
     __sort_fields__ = [
-        "scrum",
+        "scrum_id",
         "task",
         "assignee",
         "stage",
@@ -114,3 +208,162 @@ class TasksFilters(FilterModel):
 
     created_at: datetime | None
     updated_at: datetime | None
+
+
+class Payout(BaseModel):
+    task_id: str
+    scrum_id: str
+    wallet: str
+    assignee: str
+    amount: int
+    description: str
+    status: PayoutStatus = PayoutStatus.pending
+    attempts: int = 0
+    error: str | None = None
+    # of the invoice handed to the wallet, to find its payment again
+    payment_hash: str | None = None
+
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PayLink(BaseModel):
+    """
+    The resolved LNURL-pay endpoint of an assignee, or why it did not resolve.
+    """
+
+    assignee: str
+    callback: str | None = None
+    # in msat
+    min_sendable: int | None = None
+    max_sendable: int | None = None
+    error: str | None = None
+    # failed resolutions in a row, each doubles the wait before the next one
+    failures: int = 0
+    checked_at: datetime
+    # resolved again after this
+    expires_at: datetime
+    # the pay response the invoices are requested with
+    response: LnurlPayResponse | None = Field(default=None, exclude=True)
+
+
+class TaskEventOp(str, Enum):
+    create = "create"
+    update = "update"
+    delete = "delete"
+    # many tasks changed at once, clients reload the board
+    reload = "reload"
+
+
+class TaskEvent(BaseModel):
+    seq: int
+    op: TaskEventOp
+    id: str
+    # the full task on create, only the changed fields on update,
+    # a summary of the change on reload
+    fields: dict = {}
+
+
+class TaskEvents(BaseModel):
+    version: int = 1
+    epoch: str
+    seq: int
+    resync: bool = False
+    events: list[TaskEvent] = []
+
+
+class ScrumStats(BaseModel):
+    scrum_id: str
+    # number of tasks per stage
+    stages: dict[TaskStage, int] = {}
+    tasks: int = 0
+    reward: int = 0
+    paid_reward: int = 0
+    # rewards of assigned tasks that are not paid yet
+    unpaid_committed_reward: int = 0
+
+
+class SnapshotSeries(str, Enum):
+    # open tasks at the end of each interval
+    burndown = "burndown"
+    # tasks moved to done during each interval
+    velocity = "velocity"
+
+
+class ScrumSnapshot(BaseModel):
+    scrum_id: str
+    day: date
+    stage: TaskStage
+    # tasks in the stage at the end of the day, and their reward
+    tasks: int = 0
+    reward: int = 0
+    # tasks that entered the stage that day, and their reward
+    entered: int = 0
+    entered_reward: int = 0
+
+
+class SeriesPoint(BaseModel):
+    # first day of the interval
+    day: date
+    tasks: int = 0
+    reward: int = 0
+
+
+class ScrumSeries(BaseModel):
+    scrum_id: str
+    series: SnapshotSeries
+    start: date
+    end: date
+    interval: int = 1
+    points: list[SeriesPoint] = []
+
+
+class TasksSearchResult(BaseModel):
+    tasks: Tasks
+    # higher is better
+    rank: float
+    # the matched terms wrapped in <mark>, notes are cut to the matching part
+    task_highlight: str
+    notes_highlight: str | None = None
+
+
+class TasksArchive(BaseModel):
+    # tasks moved to the archive
+    archived: int = 0
+
+
+class TasksImportError(BaseModel):
+    # line of the file, the header of a CSV file is line 1
+    line: int
+    error: str
+
+
+class TasksImport(BaseModel):
+    created: int = 0
+    failed: int = 0
+    # the first errors only, `failed` has the count
+    errors: list[TasksImportError] = []
+    # set when the import stopped early, the rows from this line on were not imported
+    resume_line: int | None = None
+
+
+class PublicBoardSnapshot(BaseModel):
+    scrum: Scrum
+    # the event position the tasks were read at
+    epoch: str
+    seq: int
+    tasks_json: str
+    cursors_json: str
+    events_json: str
+    etag: str
+
+
+class CacheStats(BaseModel):
+    name: str
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
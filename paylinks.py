@@ -0,0 +1,129 @@
+# Description: Cache of the resolved LNURL-pay links of task assignees.
+#
+# Paying a reward takes two requests to the assignee's LNURL service: the pay
+# link (callback, min and max sendable) and then an invoice from its callback.
+# The same few contributors are paid over and over, so the pay link is kept
+# per assignee for PAY_LINK_TTL and only the callback is called per payout.
+# A link that failed to resolve is kept as well, and only resolved again after
+# a back-off that doubles with every failure in a row, so a broken address is
+# not fetched for every payout. Assigning a rewarded task resolves the link in
+# the background, a broken address shows up before the task is completed.
+
+import asyncio
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+
+from lnbits.core.models import CreateLnurlPayment
+from lnbits.core.services.lnurl import fetch_lnurl_pay_request, handle
+from lnbits.settings import settings
+from lnurl import LnurlErrorResponse, LnurlPayResponse, LnurlResponseException
+from loguru import logger
+
+from .cache import pay_link_cache
+from .models import PayLink
+
+# how long a resolved pay link is used before it is resolved again
+PAY_LINK_TTL = timedelta(hours=1)
+# wait after the first failed resolution, doubled for every further one
+PAY_LINK_BACKOFF = timedelta(seconds=30)
+PAY_LINK_MAX_BACKOFF = timedelta(minutes=10)
+# seconds to wait for the LNURL service
+PAY_LINK_TIMEOUT = 5
+# pay links resolved at the same time by a prefetch
+PREFETCH_CONCURRENCY = 8
+
+# resolutions in flight by assignee, concurrent callers share them
+_resolving: dict[str, asyncio.Task] = {}
+# prefetches running in the background, referenced until they are done
+_prefetches: set[asyncio.Task] = set()
+
+
+async def get_pay_link(assignee: str) -> PayLink:
+    """
+    The pay link of the assignee, resolved when there is none or it expired.
+    """
+    key = assignee.strip()
+    link = pay_link_cache.get(key)
+    if link and link.expires_at > datetime.now(timezone.utc):
+        return link
+    task = _resolving.get(key)
+    if not task:
+        task = asyncio.create_task(_resolve(key, link))
+        _resolving[key] = task
+        task.add_done_callback(lambda _: _resolving.pop(key, None))
+    # a cancelled caller does not cancel the resolution of the others
+    return await asyncio.shield(task)
+
+
+async def get_pay_request(assignee: str, amount_msat: int) -> str:
+    """
+    An invoice of `amount_msat` from the assignee's LNURL-pay callback.
+    """
+    link = await get_pay_link(assignee)
+    if link.error or not link.response:
+        raise LnurlResponseException(link.error or "LNURL-pay link did not resolve.")
+    if not (link.min_sendable or 0) <= amount_msat <= (link.max_sendable or 0):
+        raise LnurlResponseException(
+            f"Amount {amount_msat} msat not in range {link.min_sendable} - {link.max_sendable}."
+        )
+    try:
+        _, res = await fetch_lnurl_pay_request(CreateLnurlPayment(res=link.response, amount=amount_msat))
+    except Exception:
+        # the service may have moved its callback, resolve the link again next time
+        forget_pay_link(assignee)
+        raise
+    return res.pr
+
+
+def forget_pay_link(assignee: str) -> None:
+    pay_link_cache.pop(assignee.strip())
+
+
+def prefetch_pay_links(assignees: Iterable[str | None]) -> None:
+    """
+    Resolve the pay links of the assignees in the background, in parallel.
+    """
+    keys = {assignee.strip() for assignee in assignees if assignee and assignee.strip()}
+    if not keys:
+        return
+    task = asyncio.create_task(_prefetch(keys))
+    _prefetches.add(task)
+    task.add_done_callback(_prefetches.discard)
+
+
+async def _prefetch(keys: set[str]) -> None:
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def _get(key: str) -> None:
+        async with semaphore:
+            await get_pay_link(key)
+
+    await asyncio.gather(*(_get(key) for key in keys))
+
+
+async def _resolve(key: str, previous: PayLink | None) -> PayLink:
+    now = datetime.now(timezone.utc)
+    try:
+        res = await handle(key, user_agent=settings.user_agent, timeout=PAY_LINK_TIMEOUT)
+        if isinstance(res, LnurlErrorResponse):
+            raise LnurlResponseException(res.reason)
+        if not isinstance(res, LnurlPayResponse):
+            raise LnurlResponseException("Invalid LNURL response. Expected LnurlPayResponse.")
+    except Exception as exc:
+        failures = previous.failures + 1 if previous and previous.error else 1
+        backoff = min(PAY_LINK_BACKOFF * 2 ** (failures - 1), PAY_LINK_MAX_BACKOFF)
+        error = str(exc) or type(exc).__name__
+        logger.warning(f"Scrum pay link of {key} did not resolve, {failures} times in a row: {error}")
+        link = PayLink(assignee=key, error=error, failures=failures, checked_at=now, expires_at=now + backoff)
+    else:
+        link = PayLink(
+            assignee=key,
+            callback=str(res.callback),
+            min_sendable=int(res.minSendable),
+            max_sendable=int(res.maxSendable),
+            checked_at=now,
+            expires_at=now + PAY_LINK_TTL,
+            response=res,
+        )
+    pay_link_cache.set(key, link)
+    return link
@@ -0,0 +1,147 @@
+# Description: Fractional rank keys ordering the tasks within a board column.
+#
+# A rank is a string that sorts byte-wise: there is always a key between two
+# others, so moving a task writes only that task. A key is an integer part,
+# whose first character encodes its length, and an optional fraction:
+# appending to a column increments the integer and stays short, inserting
+# between two tasks grows the fraction. Columns whose keys get too long are
+# rewritten by `rebalance_ranks`.
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+ZERO = DIGITS[0]
+# the smallest integer part, nothing sorts before it without a fraction
+SMALLEST_INTEGER = "A" + ZERO * 26
+# keys longer than this are rewritten by the rebalance job
+RANK_MAX_LENGTH = 24
+
+
+def rank_between(lower: str | None, upper: str | None) -> str:
+    """
+    A key sorting after `lower` and before `upper`, None is the start or the
+    end of the column.
+    """
+    if lower is not None:
+        _validate(lower)
+    if upper is not None:
+        _validate(upper)
+    if lower is not None and upper is not None and lower >= upper:
+        raise ValueError(f"Rank {lower!r} is not before {upper!r}.")
+
+    if lower is None:
+        return _rank_before(upper) if upper is not None else "a" + ZERO
+
+    integer = _integer_part(lower)
+    fraction = lower[len(integer) :]
+    if upper is None:
+        incremented = _increment(integer)
+        return integer + _midpoint(fraction, None) if incremented is None else incremented
+    if integer == _integer_part(upper):
+        return integer + _midpoint(fraction, upper[len(integer) :])
+    incremented = _increment(integer)
+    if incremented is not None and incremented < upper:
+        return incremented
+    return integer + _midpoint(fraction, None)
+
+
+def rank_keys(count: int, lower: str | None = None) -> list[str]:
+    """
+    `count` increasing keys after `lower`, as short as appending them one by one.
+    """
+    keys = []
+    for _ in range(count):
+        lower = rank_between(lower, None)
+        keys.append(lower)
+    return keys
+
+
+def _rank_before(upper: str) -> str:
+    integer = _integer_part(upper)
+    if integer == SMALLEST_INTEGER:
+        return integer + _midpoint("", upper[len(integer) :])
+    if integer < upper:
+        return integer
+    decremented = _decrement(integer)
+    if decremented is None:
+        raise ValueError("No rank before the smallest one.")
+    return decremented
+
+
+def _midpoint(lower: str, upper: str | None) -> str:
+    # a fraction between two fractions, "" is zero and None is one
+    if upper is not None:
+        common = 0
+        while common < len(upper) and (lower[common] if common < len(lower) else ZERO) == upper[common]:
+            common += 1
+        if common:
+            return upper[:common] + _midpoint(lower[common:], upper[common:])
+    digit_lower = DIGITS.index(lower[0]) if lower else 0
+    digit_upper = DIGITS.index(upper[0]) if upper is not None else len(DIGITS)
+    if digit_upper - digit_lower > 1:
+        return DIGITS[round((digit_lower + digit_upper) / 2)]
+    if upper is not None and len(upper) > 1:
+        return upper[:1]
+    return DIGITS[digit_lower] + _midpoint(lower[1:], None)
+
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid rank head {head!r}.")
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid rank {key!r}.")
+    return key[:length]
+
+
+def _validate(key: str) -> None:
+    if not key or key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid rank {key!r}.")
+    integer = _integer_part(key)
+    if any(char not in DIGITS for char in key) or key[len(integer) :].endswith(ZERO):
+        raise ValueError(f"Invalid rank {key!r}.")
+
+
+def _increment(integer: str) -> str | None:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        position = DIGITS.index(digits[i]) + 1
+        if position < len(DIGITS):
+            digits[i] = DIGITS[position]
+            return head + "".join(digits)
+        digits[i] = ZERO
+    # carried out of the integer, the next head has another length
+    if head == "Z":
+        return "a" + ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(ZERO)
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement(integer: str) -> str | None:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        position = DIGITS.index(digits[i]) - 1
+        if position >= 0:
+            digits[i] = DIGITS[position]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
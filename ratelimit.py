@@ -0,0 +1,131 @@
+# Description: Admission control for the unauthenticated public task endpoints.
+#
+# Token buckets per client and per board limit the rate of public writes, and
+# a cap on the public writes in progress per board keeps a flood of them from
+# queueing up for the database in front of the owner's own requests.
+
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import Request
+
+from .models import Scrum
+
+# defaults for the limits a scrum leaves empty, writes per minute
+PUBLIC_RATE_LIMIT = 30
+PUBLIC_BOARD_RATE_LIMIT = 300
+PUBLIC_MAX_PENDING = 8
+# header the reverse proxy in front of lnbits sets to the client address, like
+# X-Real-IP or X-Forwarded-For. Only set it when every request passes that proxy,
+# a client could send the header itself otherwise.
+CLIENT_IP_HEADER = os.getenv("SCRUM_CLIENT_IP_HEADER", "")
+
+
+class RateLimitBackend(ABC):
+    """
+    Where the token buckets live. The default keeps them in the process,
+    install another with `set_rate_limit_backend` to share them between
+    processes.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Take a token from the bucket `key`, refilled with `rate` tokens a
+        second up to `burst`. Returns 0 when a token was taken, else the
+        seconds until there is one.
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, maxsize: int = 50_000):
+        # the least recently used bucket is forgotten first, it was the fullest
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+_backend: RateLimitBackend = MemoryRateLimitBackend()
+
+# public writes in progress by scrum id
+_pending: dict[str, int] = {}
+
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def client_address(request: Request) -> str:
+    """
+    The address the per-client limit is kept for. Without
+    `SCRUM_CLIENT_IP_HEADER` it is the peer of the connection, which uvicorn
+    already takes from X-Forwarded-For for the proxies lnbits trusts with
+    FORWARDED_ALLOW_IPS.
+    """
+    if CLIENT_IP_HEADER:
+        # the proxy appends the address it saw, anything before it came from the client
+        forwarded = request.headers.get(CLIENT_IP_HEADER, "").split(",")[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.client.host if request.client else "unknown"
+
+
+async def public_write_wait(scrum: Scrum, client: str) -> float:
+    """
+    Seconds the `client` has to wait before its next public write to the
+    board, 0 when it may write now.
+    """
+    limits = [
+        (f"client:{scrum.id}:{client}", _limit(scrum.public_rate_limit, PUBLIC_RATE_LIMIT)),
+        (f"board:{scrum.id}", _limit(scrum.public_board_rate_limit, PUBLIC_BOARD_RATE_LIMIT)),
+    ]
+    for key, per_minute in limits:
+        if not per_minute:
+            continue
+        # up to ten seconds worth of writes at once
+        wait = await _backend.take(key, per_minute / 60, max(1, math.ceil(per_minute / 6)))
+        if wait:
+            return wait
+    return 0
+
+
+def start_public_write(scrum: Scrum) -> bool:
+    """
+    Count a public write to the board as in progress, unless the board is
+    at its limit. Every started write must be ended with `end_public_write`.
+    """
+    limit = _limit(scrum.public_max_pending, PUBLIC_MAX_PENDING)
+    pending = _pending.get(scrum.id, 0)
+    if limit and pending >= limit:
+        return False
+    _pending[scrum.id] = pending + 1
+    return True
+
+
+def end_public_write(scrum: Scrum) -> None:
+    pending = _pending.get(scrum.id, 0) - 1
+    if pending > 0:
+        _pending[scrum.id] = pending
+    else:
+        _pending.pop(scrum.id, None)
+
+
+def _limit(value: int | None, default: int) -> int:
+    return default if value is None else value
@@ -0,0 +1,107 @@
+# Description: JSON encoding of tasks straight from database rows.
+#
+# The read-only paths (public board, board columns, export) do not need a
+# validated `Tasks` per row just to encode it again: `task_row` turns a row
+# into the same JSON shape `jsonable_encoder(Tasks)` has, and `dumps` encodes
+# it with orjson when it is installed, with the standard library otherwise.
+
+import json
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any
+
+from .models import TaskEvents, Tasks
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used without it
+    orjson = None  # type: ignore[assignment]
+
+# characters escaped in JSON embedded in a html page, like jinja's `tojson`
+_HTML_ESCAPES = ((b"<", b"\\u003c"), (b">", b"\\u003e"), (b"&", b"\\u0026"), (b"'", b"\\u0027"))
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def dumps_html(value: Any) -> str:
+    """
+    JSON for a `<script>` of a page, a task text cannot close the script.
+    """
+    data = dumps(value)
+    for char, escape in _HTML_ESCAPES:
+        data = data.replace(char, escape)
+    return data.decode()
+
+
+def row_datetime(value: Any) -> datetime:
+    # SQLite returns timestamps as epoch seconds, postgres as naive UTC datetimes
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+def task_row(row: Mapping[str, Any]) -> dict:
+    """
+    A `scrum.tasks` row in the JSON shape of `Tasks`.
+    """
+    return {
+        "id": row["id"],
+        "task": row["task"],
+        "scrum_id": row["scrum_id"],
+        "assignee": row["assignee"],
+        "stage": row["stage"],
+        "reward": row["reward"],
+        "paid": bool(row["paid"]),
+        "complete": bool(row["complete"]),
+        "notes": row["notes"],
+        "payout_status": row["payout_status"],
+        "version": row["version"],
+        "rank": row["rank"],
+        "created_at": row_datetime(row["created_at"]).isoformat(),
+        "updated_at": row_datetime(row["updated_at"]).isoformat(),
+    }
+
+
+def task_dict(tasks: Tasks) -> dict:
+    """
+    The JSON shape of a `Tasks` the API already has, without `jsonable_encoder`.
+    """
+    return jsonable(tasks.__dict__)
+
+
+def jsonable(fields: Mapping[str, Any]) -> dict:
+    return {key: _jsonable(value) for key, value in fields.items()}
+
+
+def task_events(message: TaskEvents) -> bytes:
+    return dumps(
+        {
+            "version": message.version,
+            "epoch": message.epoch,
+            "seq": message.seq,
+            "resync": message.resync,
+            "events": [
+                {"seq": event.seq, "op": event.op.value, "id": event.id, "fields": event.fields}
+                for event in message.events
+            ],
+        }
+    )
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime | Enum):
+        return _jsonable(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
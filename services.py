@@ -0,0 +1,341 @@
+# Description: Reward payouts of completed tasks.
+#
+# Completing a task only queues its payout, the payout worker in `tasks.py`
+# resolves the assignee LNURL (cached, see `paylinks.py`) and pays the invoice
+# outside of the request.
+
+import asyncio
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta, timezone
+from typing import BinaryIO
+
+from bolt11 import decode as bolt11_decode
+from fastapi.concurrency import run_in_threadpool
+from lnbits.core.crud import get_wallet_payment
+from lnbits.core.services import pay_invoice
+from loguru import logger
+from pydantic import ValidationError
+
+from .crud import (
+    ARCHIVE_BATCH_SIZE,
+    archive_tasks,
+    claim_payout,
+    create_payout,
+    create_tasks_bulk,
+    get_payout,
+    get_scrum_snapshots,
+    get_unbalanced_columns,
+    rebalance_ranks,
+    update_payout,
+    update_tasks_payout_status,
+)
+from .events import board_reloaded, publish_task_events, task_changed
+from .metrics import record
+from .models import (
+    CreateTasks,
+    Payout,
+    PayoutStatus,
+    Scrum,
+    ScrumSeries,
+    ScrumSnapshot,
+    SeriesPoint,
+    SnapshotSeries,
+    Tasks,
+    TasksArchive,
+    TasksImport,
+    TasksImportError,
+    TaskStage,
+    TransferFormat,
+)
+from .paylinks import forget_pay_link, get_pay_request, prefetch_pay_links
+from .ranks import RANK_MAX_LENGTH
+from .transfer import read_rows
+
+PAYOUT_MAX_ATTEMPTS = 5
+# delay before the first retry, doubled for every further one
+PAYOUT_BACKOFF = timedelta(seconds=30)
+# a claimed payout is not due again before this, in case its worker dies
+PAYOUT_LEASE = timedelta(minutes=10)
+
+# set whenever a payout is queued, wakes up the payout worker
+payouts_queued = asyncio.Event()
+# set whenever the tasks of a deleted scrum are queued, wakes up the purge worker
+purges_queued = asyncio.Event()
+
+# rows validated and inserted together during an import
+IMPORT_CHUNK_SIZE = 1000
+# errors reported back for one import, the rest are only counted
+IMPORT_MAX_ERRORS = 100
+
+
+def needs_payout(tasks: Tasks) -> bool:
+    return bool(
+        tasks.complete
+        and not tasks.paid
+        and not tasks.payout_status
+        and tasks.reward
+        and tasks.reward > 0
+        and tasks.assignee
+    )
+
+
+def prefetch_task_pay_links(*tasks: Tasks) -> None:
+    """
+    Resolve the pay links of the assignees of rewarded tasks ahead of the payout.
+    """
+    prefetch_pay_links(item.assignee for item in tasks if item.reward and item.reward > 0 and not item.paid)
+
+
+async def queue_task_payout(scrum: Scrum, tasks: Tasks) -> None:
+    if not tasks.assignee or not tasks.reward:
+        return
+    payout = Payout(
+        task_id=tasks.id,
+        scrum_id=scrum.id,
+        wallet=scrum.wallet,
+        assignee=tasks.assignee,
+        amount=tasks.reward,
+        description=f"Scrum task reward: {tasks.assignee} - {tasks.task}",
+    )
+    if await create_payout(payout):
+        payouts_queued.set()
+
+
+async def retry_task_payout(tasks_id: str) -> Payout | None:
+    payout = await get_payout(tasks_id)
+    if not payout or payout.status != PayoutStatus.failed:
+        return None
+    # the assignee may have fixed their address since
+    forget_pay_link(payout.assignee)
+    payout.status = PayoutStatus.pending
+    payout.attempts = 0
+    payout.next_attempt_at = datetime.now(timezone.utc)
+    await update_payout(payout)
+    await _set_tasks_payout_status(payout)
+    payouts_queued.set()
+    return payout
+
+
+async def pay_task_reward(payout: Payout) -> None:
+    now = datetime.now(timezone.utc)
+    # the lease also holds the payout back when this attempt fails unexpectedly
+    if not await claim_payout(payout, now + PAYOUT_LEASE):
+        return
+    payout.next_attempt_at = now + PAYOUT_LEASE
+    if payout.status == PayoutStatus.paying:
+        # a worker died or lost track of the payment, never pay it twice
+        await settle_task_payout(payout)
+        return
+    payout.attempts += 1
+    try:
+        with record("payment", "get_pay_request"):
+            pr = await get_pay_request(payout.assignee, payout.amount * 1000)
+        if not pr:
+            raise ValueError("Error generating payment request.")
+        payment_hash = bolt11_decode(pr).payment_hash
+    except Exception as exc:
+        _payout_failed(payout, str(exc), now)
+        await update_payout(payout)
+        if payout.status == PayoutStatus.failed:
+            await _set_tasks_payout_status(payout)
+        return
+
+    payout.status = PayoutStatus.paying
+    payout.payment_hash = payment_hash
+    await update_payout(payout)
+    try:
+        with record("payment", "pay_invoice"):
+            await pay_invoice(
+                wallet_id=payout.wallet,
+                payment_request=pr,
+                max_sat=payout.amount,
+                description=payout.description,
+                extra={"tag": "scrum", "task_id": payout.task_id, "scrum_id": payout.scrum_id},
+            )
+    except Exception as exc:
+        # the payment may have gone out anyway, the wallet knows
+        logger.warning(f"Scrum payout for task {payout.task_id} raised, settling it from the wallet: {exc!s}")
+        payout.error = str(exc)
+        await settle_task_payout(payout)
+        return
+    payout.status = PayoutStatus.paid
+    payout.error = None
+    await update_payout(payout)
+    await _set_tasks_payout_status(payout)
+
+
+async def settle_task_payout(payout: Payout) -> None:
+    """
+    Settle a payout handed to the wallet from the wallet payment of its
+    invoice: paid if it succeeded, checked again later while it is in flight,
+    and only retried with a new invoice if there is no payment or it failed.
+    """
+    now = datetime.now(timezone.utc)
+    payment = None
+    if payout.payment_hash:
+        with record("payment", "get_wallet_payment"):
+            payment = await get_wallet_payment(payout.wallet, payout.payment_hash)
+    if payment and payment.success:
+        payout.status = PayoutStatus.paid
+        payout.error = None
+    elif payment and payment.pending:
+        payout.next_attempt_at = now + PAYOUT_LEASE
+    else:
+        _payout_failed(payout, payout.error or "Payment failed.", now)
+    await update_payout(payout)
+    if payout.status in (PayoutStatus.paid, PayoutStatus.failed):
+        await _set_tasks_payout_status(payout)
+
+
+def _payout_failed(payout: Payout, error: str, now: datetime) -> None:
+    logger.warning(f"Scrum payout for task {payout.task_id} failed, attempt {payout.attempts}: {error}")
+    payout.error = error
+    if payout.attempts >= PAYOUT_MAX_ATTEMPTS:
+        payout.status = PayoutStatus.failed
+    else:
+        payout.status = PayoutStatus.pending
+        payout.next_attempt_at = now + PAYOUT_BACKOFF * 2 ** (payout.attempts - 1)
+
+
+async def _set_tasks_payout_status(payout: Payout) -> None:
+    tasks = await update_tasks_payout_status(payout.task_id, payout.status)
+    if not tasks:
+        return
+    fields = {
+        "payout_status": tasks.payout_status,
+        "paid": tasks.paid,
+        "version": tasks.version,
+        "updated_at": tasks.updated_at,
+    }
+    await publish_task_events(payout.scrum_id, task_changed(tasks.id, fields))
+
+
+async def import_tasks(scrum: Scrum, file: BinaryIO, file_format: TransferFormat) -> TasksImport:
+    """
+    Create a task on `scrum` for every valid row of the file. Invalid rows
+    are reported and skipped, the board gets one reload event at the end.
+
+    The file is read and validated in a worker thread, a chunk at a time,
+    and every chunk is committed on its own so the database is not locked
+    for the whole upload. When a chunk cannot be inserted the import stops:
+    the tasks created so far stay, and `resume_line` is the first line of
+    the failed chunk, to upload the rest of the file from.
+    """
+    result = TasksImport()
+    rows = read_rows(file, file_format)
+    while True:
+        chunk, failures = await run_in_threadpool(_read_tasks_chunk, rows, scrum.id)
+        for line, error in failures:
+            result.failed += 1
+            if len(result.errors) < IMPORT_MAX_ERRORS:
+                result.errors.append(TasksImportError(line=line, error=error))
+        if not chunk:
+            break
+        try:
+            result.created += len(await create_tasks_bulk([data for _, data in chunk]))
+        except Exception as exc:
+            logger.warning(f"Scrum import into {scrum.id} stopped at line {chunk[0][0]}: {exc!s}")
+            result.resume_line = chunk[0][0]
+            break
+
+    if result.created:
+        summary = {"created": result.created, "failed": result.failed}
+        await publish_task_events(scrum.id, board_reloaded(scrum.id, summary))
+    return result
+
+
+def _read_tasks_chunk(
+    rows: Iterator[tuple[int, dict | None, str | None]], scrum_id: str
+) -> tuple[list[tuple[int, CreateTasks]], list[tuple[int, str]]]:
+    """
+    The next `IMPORT_CHUNK_SIZE` valid rows as `(line, task)`, and the lines
+    that failed on the way. Blocking, run it in a thread.
+    """
+    chunk: list[tuple[int, CreateTasks]] = []
+    failures: list[tuple[int, str]] = []
+    for line, row, error in rows:
+        if row is None:
+            failures.append((line, error or "Invalid row."))
+            continue
+        try:
+            chunk.append((line, CreateTasks(**{**row, "scrum_id": scrum_id})))
+        except ValidationError as exc:
+            failures.append((line, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())))
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            break
+    return chunk, failures
+
+
+async def archive_scrum_tasks(scrum_id: str, before: datetime, pause: float = 0) -> TasksArchive:
+    """
+    Move the done and paid tasks of the scrum last updated before `before` to
+    the archive, in batches `pause` seconds apart. The board gets one reload
+    event at the end.
+    """
+    result = TasksArchive()
+    while True:
+        archived = await archive_tasks(scrum_id, before)
+        result.archived += archived
+        if archived < ARCHIVE_BATCH_SIZE:
+            break
+        await asyncio.sleep(pause)
+    if result.archived:
+        await publish_task_events(scrum_id, board_reloaded(scrum_id, {"archived": result.archived}))
+    return result
+
+
+async def rebalance_task_ranks(max_length: int = RANK_MAX_LENGTH, pause: float = 0) -> int:
+    """
+    Rewrite the ranks of the columns with keys longer than `max_length`, one
+    column per transaction `pause` seconds apart. Their boards get a reload
+    event, the ranks the viewers have are stale. Returns the number of columns.
+    """
+    columns = await get_unbalanced_columns(max_length)
+    for scrum_id, stage in columns:
+        await rebalance_ranks(scrum_id, stage)
+        await publish_task_events(scrum_id, board_reloaded(scrum_id, {"rebalanced": stage}))
+        await asyncio.sleep(pause)
+    return len(columns)
+
+
+# stages whose tasks are still to do in a burndown
+OPEN_STAGES = (TaskStage.todo, TaskStage.doing)
+
+
+async def get_scrum_series(
+    scrum_id: str, series: SnapshotSeries, start: date, end: date, interval: int = 1
+) -> ScrumSeries:
+    """
+    A burndown or velocity series of the scrum from its daily snapshots, one
+    point per `interval` days from `start` to `end`.
+    """
+    snapshots = await get_scrum_snapshots(scrum_id, start, end)
+    days: dict[date, dict[TaskStage, ScrumSnapshot]] = {}
+    for snapshot in snapshots:
+        days.setdefault(snapshot.day, {})[snapshot.stage] = snapshot
+
+    # a stage without a row that day did not change, it keeps its last level
+    levels: dict[TaskStage, ScrumSnapshot] = {}
+    for day in sorted(day for day in days if day < start):
+        levels.update(days[day])
+    points = []
+    first = start
+    while first <= end:
+        point = SeriesPoint(day=first)
+        last = min(first + timedelta(days=interval - 1), end)
+        day = first
+        while day <= last:
+            stages = days.get(day, {})
+            levels.update(stages)
+            done = stages.get(TaskStage.done)
+            if series == SnapshotSeries.velocity and done:
+                point.tasks += done.entered
+                point.reward += done.entered_reward
+            day += timedelta(days=1)
+        if series == SnapshotSeries.burndown:
+            point.tasks = sum(levels[stage].tasks for stage in OPEN_STAGES if stage in levels)
+            point.reward = sum(levels[stage].reward for stage in OPEN_STAGES if stage in levels)
+        points.append(point)
+        first = last + timedelta(days=1)
+    return ScrumSeries(scrum_id=scrum_id, series=series, start=start, end=end, interval=interval, points=points)
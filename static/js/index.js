@@ -110,6 +110,13 @@ window.app = Vue.createApp({
             field: 'paid',
             sortable: true
           },
+          {
+            name: 'payout_status',
+            align: 'left',
+            label: 'Payout',
+            field: 'payout_status',
+            sortable: false
+          },
           {
             name: 'notes',
             align: 'left',
@@ -185,6 +192,14 @@ window.app = Vue.createApp({
     async saveScrum() {
       try {
         const data = {extra: {}, ...this.scrumFormDialog.data}
+        // an emptied number input is the default limit
+        for (const key of [
+          'public_rate_limit',
+          'public_board_rate_limit',
+          'public_max_pending'
+        ]) {
+          if (data[key] === '') data[key] = null
+        }
         const method = data.id ? 'PUT' : 'POST'
         const entry = data.id ? `/${data.id}` : ''
         await LNbits.api.request(
@@ -224,7 +239,7 @@ window.app = Vue.createApp({
           try {
             await LNbits.api.request(
               'DELETE',
-              '/scrum/api/v1/scrum/' + scrumId + '?clear_tasks=true',
+              '/scrum/api/v1/scrum/' + scrumId,
               null
             )
             await this.getScrum()
@@ -233,6 +248,26 @@ window.app = Vue.createApp({
           }
         })
     },
+    async closeSprint(scrumId) {
+      await LNbits.utils
+        .confirmDialog('Move the done and paid tasks of this Scrum to the archive?')
+        .onOk(async () => {
+          try {
+            const {data} = await LNbits.api.request(
+              'POST',
+              `/scrum/api/v1/scrum/${scrumId}/close-sprint`,
+              null
+            )
+            this.$q.notify({
+              type: 'positive',
+              message: `${data.archived} tasks archived`
+            })
+            this.getTasks()
+          } catch (error) {
+            LNbits.utils.notifyApiError(error)
+          }
+        })
+    },
     async exportScrumCSV() {
       await LNbits.utils.exportCSV(
         this.scrumTable.columns,
@@ -253,7 +288,7 @@ window.app = Vue.createApp({
         const data = {extra: {}, ...this.tasksFormDialog.data}
         const method = data.id ? 'PUT' : 'POST'
         const entry = data.id ? `/${data.id}` : ''
-        await LNbits.api.request(
+        const {data: tasks} = await LNbits.api.request(
           method,
           '/scrum/api/v1/tasks' + entry,
           null,
@@ -262,6 +297,25 @@ window.app = Vue.createApp({
         this.getTasks()
         this.tasksFormDialog.show = false
         this.tasksFormDialog.data = {}
+        if (tasks.assignee && tasks.reward > 0 && !tasks.paid) {
+          this.checkPayLink(tasks)
+        }
+      } catch (error) {
+        LNbits.utils.notifyApiError(error)
+      }
+    },
+    async checkPayLink(tasks) {
+      try {
+        const {data} = await LNbits.api.request(
+          'GET',
+          `/scrum/api/v1/tasks/${tasks.id}/paylink`
+        )
+        if (data.error) {
+          this.$q.notify({
+            type: 'warning',
+            message: `The reward of "${tasks.task}" cannot be paid to ${tasks.assignee}: ${data.error}`
+          })
+        }
       } catch (error) {
         LNbits.utils.notifyApiError(error)
       }
@@ -311,11 +365,13 @@ window.app = Vue.createApp({
     },
 
     async exportTasksCSV() {
-      await LNbits.utils.exportCSV(
-        this.tasksTable.columns,
-        this.tasksList,
-        'tasks_' + new Date().toISOString().slice(0, 10) + '.csv'
-      )
+      // streamed by the server, all tasks and not just the loaded page
+      const scrumId = this.tasksFormDialog.scrum.value
+      const params = new URLSearchParams({format: 'csv'})
+      if (scrumId) {
+        params.set('scrum_id', scrumId)
+      }
+      window.open(`/scrum/api/v1/tasks/export?${params}`, '_blank')
     },
 
     //////////////// Utils ////////////////////////
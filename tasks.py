@@ -0,0 +1,99 @@
+# Description: Background tasks started with the extension.
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+
+from .crud import get_all_scrum_ids, get_due_payouts, get_purges, purge_tasks, record_snapshots
+from .services import archive_scrum_tasks, pay_task_reward, payouts_queued, purges_queued, rebalance_task_ranks
+
+# payouts in flight at the same time
+PAYOUT_CONCURRENCY = 4
+# seconds between checks for payouts due for a retry
+PAYOUT_POLL_INTERVAL = 15
+# seconds between checks for purges queued by another process
+PURGE_POLL_INTERVAL = 60
+# seconds between two purge batches, requests get the database in between
+PURGE_PAUSE = 0.05
+# done and paid tasks not updated for this many days are archived, 0 never archives them
+ARCHIVE_AFTER_DAYS = int(os.getenv("SCRUM_ARCHIVE_AFTER_DAYS", "30"))
+# seconds between two runs of the archive job
+ARCHIVE_INTERVAL = 3600
+# seconds between two archive batches
+ARCHIVE_PAUSE = 0.05
+# seconds between two runs of the rank rebalance job
+RANK_REBALANCE_INTERVAL = 3600
+# seconds between two rebalanced columns
+RANK_REBALANCE_PAUSE = 0.05
+# seconds between two checks that today's snapshots are recorded
+SNAPSHOT_INTERVAL = 3600
+
+
+async def wait_for_payouts():
+    semaphore = asyncio.Semaphore(PAYOUT_CONCURRENCY)
+
+    async def _pay(payout):
+        async with semaphore:
+            await pay_task_reward(payout)
+
+    while True:
+        payouts_queued.clear()
+        payouts = await get_due_payouts(limit=PAYOUT_CONCURRENCY * 4)
+        if payouts:
+            results = await asyncio.gather(*(_pay(payout) for payout in payouts), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            for error in errors:
+                logger.error(f"Scrum payout worker: {error!s}")
+            # a payout that failed before its claim is due again at once, do not spin on it
+            if errors:
+                await asyncio.sleep(PAYOUT_POLL_INTERVAL)
+            continue
+        try:
+            await asyncio.wait_for(payouts_queued.wait(), PAYOUT_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_for_purges():
+    while True:
+        purges_queued.clear()
+        for scrum_id in await get_purges():
+            while await purge_tasks(scrum_id):
+                await asyncio.sleep(PURGE_PAUSE)
+        try:
+            await asyncio.wait_for(purges_queued.wait(), PURGE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_for_archive():
+    while True:
+        if ARCHIVE_AFTER_DAYS > 0:
+            before = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+            for scrum_id in await get_all_scrum_ids():
+                try:
+                    await archive_scrum_tasks(scrum_id, before, pause=ARCHIVE_PAUSE)
+                except Exception as exc:
+                    logger.error(f"Scrum archive job, scrum {scrum_id}: {exc!s}")
+                await asyncio.sleep(ARCHIVE_PAUSE)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+async def wait_for_rank_rebalance():
+    while True:
+        try:
+            await rebalance_task_ranks(pause=RANK_REBALANCE_PAUSE)
+        except Exception as exc:
+            logger.error(f"Scrum rank rebalance job: {exc!s}")
+        await asyncio.sleep(RANK_REBALANCE_INTERVAL)
+
+
+async def wait_for_snapshots():
+    while True:
+        try:
+            await record_snapshots(datetime.now(timezone.utc).date())
+        except Exception as exc:
+            logger.error(f"Scrum snapshot job: {exc!s}")
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
@@ -0,0 +1,51 @@
+"""
+Bulk task endpoints against one request per task, at 100 and 1,000 tasks.
+
+    uv run pytest tests/benchmarks/bench_bulk.py -s
+"""
+
+import time
+
+import pytest
+
+from .helpers import api_client, seed
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", [100, 1000])
+async def test_bulk_endpoints(scrum_db, count):
+    boards = await seed(scrum_db, users=1, boards_per_user=2, tasks_per_board=0)
+    user_id, (single_id, bulk_id) = next(iter(boards.items()))
+
+    def new_tasks(scrum_id):
+        return [{"task": f"task {i}", "scrum_id": scrum_id, "complete": False} for i in range(count)]
+
+    async with api_client(user_id) as client:
+        start = time.perf_counter()
+        single_ids = []
+        for item in new_tasks(single_id):
+            response = await client.post("/scrum/api/v1/tasks", json=item)
+            single_ids.append(response.json()["id"])
+        single_create = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.post("/scrum/api/v1/tasks/bulk", json=new_tasks(bulk_id))
+        bulk_ids = [item["id"] for item in response.json()]
+        bulk_create = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for tasks_id in single_ids:
+            item = (await client.get(f"/scrum/api/v1/tasks/{tasks_id}")).json()
+            await client.put(f"/scrum/api/v1/tasks/{tasks_id}", json={**item, "stage": "done"})
+        single_move = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.put("/scrum/api/v1/tasks/bulk/move", json={"ids": bulk_ids, "stage": "done"})
+        bulk_move = time.perf_counter() - start
+        assert len(response.json()["ids"]) == count
+
+    print()
+    print(f"{count:>5} tasks  create: {single_create:7.3f}s single, {bulk_create:7.3f}s bulk")
+    print(f"{count:>5} tasks  move:   {single_move:7.3f}s single, {bulk_move:7.3f}s bulk")
+    assert bulk_create < single_create
+    assert bulk_move < single_move
@@ -0,0 +1,41 @@
+"""
+Deleting a large board: the request, and the background purge of its tasks.
+
+    uv run pytest tests/benchmarks/bench_delete.py -s
+
+The board size is configurable with SCRUM_BENCH_TASKS.
+"""
+
+import time
+
+import pytest
+
+from ...crud import PURGE_BATCH_SIZE, delete_scrum, get_purges, purge_tasks
+from .helpers import Timer, env_int, seed
+
+
+@pytest.mark.asyncio
+async def test_delete_large_board(scrum_db):
+    count = env_int("SCRUM_BENCH_TASKS", 50_000)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=count)
+    user_id, (scrum_id,) = next(iter(boards.items()))
+
+    request = Timer()
+    with request.time():
+        queued = await delete_scrum(user_id, scrum_id)
+    batches = Timer()
+    start = time.perf_counter()
+    while True:
+        with batches.time():
+            deleted = await purge_tasks(scrum_id)
+        if not deleted:
+            break
+    elapsed = time.perf_counter() - start
+    assert not await get_purges()
+
+    print()
+    print(f"delete request {request.mean_ms:.2f} ms, tasks queued for purging: {queued}")
+    print(
+        f"purged {count} tasks in {elapsed:.2f} s, {len(batches.samples)} batches of {PURGE_BATCH_SIZE},"
+        f" longest {max(batches.samples) * 1000:.2f} ms"
+    )
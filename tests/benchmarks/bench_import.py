@@ -0,0 +1,64 @@
+"""
+Import of a 10k task CSV and NDJSON file through the API.
+
+    uv run pytest tests/benchmarks/bench_import.py -s
+
+The size is configurable with SCRUM_BENCH_IMPORT.
+"""
+
+import csv
+import io
+import json
+import time
+
+import pytest
+
+from ...models import TransferFormat
+from .helpers import api_client, env_int, seed
+
+
+def _rows(count: int) -> list[dict]:
+    stages = ["todo", "doing", "done"]
+    return [
+        {
+            "task": f"imported task {i}",
+            "assignee": f"user{i % 12}@example.com" if i % 3 else "",
+            "stage": stages[i % 3],
+            "reward": (i % 5) * 100,
+            "complete": i % 3 == 2,
+            "notes": f"notes for task {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def _encode(rows: list[dict], file_format: TransferFormat) -> bytes:
+    if file_format == TransferFormat.ndjson:
+        return "".join(json.dumps(row) + "\n" for row in rows).encode()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("file_format", list(TransferFormat))
+async def test_import(scrum_db, file_format):
+    count = env_int("SCRUM_BENCH_IMPORT", 10_000)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=0)
+    user_id, (scrum_id,) = next(iter(boards.items()))
+    content = _encode(_rows(count), file_format)
+
+    async with api_client(user_id) as client:
+        start = time.perf_counter()
+        response = await client.post(
+            f"/scrum/api/v1/scrum/{scrum_id}/import",
+            params={"format": file_format.value},
+            files={"file": (f"tasks.{file_format.value}", content)},
+        )
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200, response.text
+    assert response.json()["created"] == count
+    print(f"\n{file_format.value:>6}: {count} tasks in {elapsed:.2f}s, {count / elapsed:,.0f} tasks/s")
@@ -0,0 +1,82 @@
+"""
+Query plan benchmark for the scrum and tasks indexes.
+
+Seeds a synthetic dataset, runs every read/delete query in `crud.py` and
+asserts, via EXPLAIN, that none of them falls back to a full table scan
+and that a board column is read in index order.
+
+    uv run pytest tests/benchmarks/bench_indexes.py -s
+
+Sizes are configurable with SCRUM_BENCH_USERS, SCRUM_BENCH_BOARDS (per user)
+and SCRUM_BENCH_TASKS (per board).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from lnbits.db import Filters
+
+from ... import crud
+from ...models import ScrumFilters, TasksFilters, TaskStage
+from .helpers import Timer, capture_queries, env_int, explain, full_scans, seed
+
+ROUNDS = 20
+# queries whose rows must come in index order, without a sort step
+ORDERED = {"get_tasks_by_stage"}
+
+
+@pytest.mark.asyncio
+async def test_crud_queries_use_indexes(scrum_db):
+    boards = await seed(
+        scrum_db,
+        users=env_int("SCRUM_BENCH_USERS", 5),
+        boards_per_user=env_int("SCRUM_BENCH_BOARDS", 20),
+        tasks_per_board=env_int("SCRUM_BENCH_TASKS", 200),
+    )
+    user_id, scrum_ids = next(iter(boards.items()))
+    today = datetime.now(timezone.utc).date()
+
+    queries = {
+        "get_scrum_ids_by_user": lambda: crud.get_scrum_ids_by_user(user_id),
+        "get_scrum_paginated": lambda: crud.get_scrum_paginated(
+            user_id=user_id,
+            filters=Filters(model=ScrumFilters, sortby="created_at", direction="desc", limit=10),
+        ),
+        "get_tasks_paginated (one board)": lambda: crud.get_tasks_paginated(
+            scrum_ids=scrum_ids[:1],
+            filters=Filters(model=TasksFilters, sortby="updated_at", direction="desc", limit=50),
+        ),
+        "get_tasks_paginated (scrum ids)": lambda: crud.get_tasks_paginated(
+            scrum_ids=scrum_ids,
+            filters=Filters(model=TasksFilters, sortby="created_at", limit=50),
+        ),
+        "get_tasks_paginated (owner)": lambda: crud.get_tasks_paginated(
+            user_id=user_id,
+            filters=Filters(model=TasksFilters, sortby="created_at", limit=50),
+        ),
+        "get_tasks_by_stage": lambda: crud.get_tasks_by_stage(scrum_ids[0], TaskStage.doing, limit=20),
+        "get_scrum_snapshots": lambda: crud.get_scrum_snapshots(scrum_ids[0], today - timedelta(days=30), today),
+        # runs last, it empties the board it is timed against
+        "purge_tasks": lambda: crud.purge_tasks(scrum_ids[-1]),
+    }
+
+    print()
+    failures = []
+    for name, query in queries.items():
+        timer = Timer()
+        with capture_queries(scrum_db) as captured:
+            for _ in range(ROUNDS):
+                with timer.time():
+                    await query()
+        statements = dict.fromkeys(captured)
+        for statement, parameters in statements:
+            plan = await explain(scrum_db, statement, parameters)
+            scans = full_scans(plan, ("tasks", "scrum", "snapshots"))
+            if scans:
+                failures.append(f"{name}: {scans}")
+            sorts = [line for line in plan if "TEMP B-TREE" in line or line.strip().startswith("Sort")]
+            if name in ORDERED and sorts:
+                failures.append(f"{name}: {sorts}")
+            print(f"{name:<36} {timer.mean_ms:8.2f} ms  {' | '.join(plan)}")
+
+    assert not failures, "full table scans or sorts:\n" + "\n".join(failures)
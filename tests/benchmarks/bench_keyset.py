@@ -0,0 +1,47 @@
+"""
+Offset against cursor pagination of a large board, first page and deep pages.
+
+    uv run pytest tests/benchmarks/bench_keyset.py -s
+
+The board size is configurable with SCRUM_BENCH_TASKS.
+"""
+
+import pytest
+from lnbits.db import Filters
+
+from ... import crud
+from ...models import TasksFilters
+from .helpers import Timer, env_int, seed
+
+PAGE = 50
+ROUNDS = 10
+
+
+@pytest.mark.asyncio
+async def test_deep_pages(scrum_db):
+    count = env_int("SCRUM_BENCH_TASKS", 20_000)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=count)
+    user_id, scrum_ids = next(iter(boards.items()))
+
+    def filters(offset: int = 0) -> Filters:
+        return Filters(model=TasksFilters, sortby="updated_at", direction="desc", limit=PAGE, offset=offset)
+
+    # walk the board once to collect the cursor at every depth
+    cursors: dict[int, str | None] = {0: None}
+    cursor = None
+    for offset in range(PAGE, count, PAGE):
+        page = await crud.get_tasks_cursor_page(scrum_ids, filters(), user_id, cursor)
+        cursor = page.next_cursor
+        cursors[offset] = cursor
+
+    print()
+    depths = [0, count // 2, count - PAGE]
+    for depth in depths:
+        offset_timer, cursor_timer = Timer(), Timer()
+        for _ in range(ROUNDS):
+            with offset_timer.time():
+                offset_page = await crud.get_tasks_paginated(scrum_ids, filters(depth), user_id)
+            with cursor_timer.time():
+                cursor_page = await crud.get_tasks_cursor_page(scrum_ids, filters(), user_id, cursors[depth])
+        assert [t.id for t in cursor_page.data] == [t.id for t in offset_page.data]
+        print(f"page at {depth:>6}: offset {offset_timer.mean_ms:8.2f} ms, cursor {cursor_timer.mean_ms:8.2f} ms")
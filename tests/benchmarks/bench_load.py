@@ -0,0 +1,271 @@
+"""
+Load test of the extension with a realistic mix of admin paging, public page
+loads, public edits and task completions, with the payout worker running
+against stubbed payments.
+
+    uv run pytest tests/benchmarks/bench_load.py -s
+
+Reports p50/p95/p99 latency and throughput per endpoint and the change of
+p95 and throughput against the baseline in SCRUM_BENCH_BASELINE
+(`baseline.json` next to this file). The first run, or one with
+SCRUM_BENCH_UPDATE_BASELINE=1, saves the baseline.
+
+Every number here is machine-specific: latency and req/s depend on the
+CPU, the database and whatever else the machine runs, and the worker's
+payout latency swings by seconds between runs. That is why the baseline
+is not committed and a slower run only prints its deltas. Set
+SCRUM_BENCH_STRICT=1 on a quiet machine with its own baseline to fail
+when an endpoint is slower than the baseline by more than
+SCRUM_BENCH_THRESHOLD (a fraction).
+
+The data size and load are configurable with SCRUM_BENCH_USERS,
+SCRUM_BENCH_BOARDS (per user), SCRUM_BENCH_TASKS (per board),
+SCRUM_BENCH_REQUESTS, SCRUM_BENCH_CONCURRENCY and SCRUM_BENCH_SEED. Runs
+against postgres when LNBITS_DATABASE_URL points at one, see `conftest.py`.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from hashlib import sha256
+from http import HTTPStatus
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from bolt11 import Bolt11, TagChar, Tags, encode
+from httpx import AsyncClient
+from lnbits.utils.crypto import fake_privkey
+from lnurl import CallbackUrl, LnurlPayMetadata, LnurlPayResponse, MilliSatoshi
+from pydantic import parse_obj_as
+
+from ... import events, paylinks, services
+from ... import tasks as tasks_module
+from ...cache import clear_caches
+from ...models import TaskStage
+from .helpers import (
+    Timer,
+    api_client,
+    deltas,
+    env_float,
+    env_int,
+    load_baseline,
+    regressions,
+    save_baseline,
+    seed,
+    use_templates,
+)
+
+# relative weights of the requests in the mix
+MIX = {
+    "admin tasks page": 25,
+    "admin scrum list": 5,
+    "public page": 25,
+    "public column": 15,
+    "public edit": 20,
+    "complete task": 10,
+}
+
+
+class Load:
+    def __init__(self, boards: dict[str, list[str]], tasks_ids: dict[str, list[str]], rng: random.Random):
+        self.boards = boards
+        self.tasks_ids = tasks_ids
+        self.rng = rng
+        self.timers: dict[str, Timer] = defaultdict(Timer)
+        self.errors: list[str] = []
+        self.cursors: dict[str, str | None] = {}
+        self.etags: dict[str, str] = {}
+
+    async def request(self, name: str, client: AsyncClient, method: str, url: str, **kwargs):
+        with self.timers[name].time():
+            response = await client.request(method, url, **kwargs)
+        if response.status_code >= HTTPStatus.BAD_REQUEST:
+            self.errors.append(f"{name} {method} {url}: {response.status_code} {response.text[:200]}")
+        return response
+
+    async def run(self, name: str, admins: dict[str, AsyncClient], public: AsyncClient):
+        user_id = self.rng.choice(list(self.boards))
+        scrum_id = self.rng.choice(self.boards[user_id])
+        tasks_id = self.rng.choice(self.tasks_ids[scrum_id])
+        if name == "admin tasks page":
+            params: dict = {"keyset": True, "limit": 50, "sortby": "updated_at", "direction": "desc"}
+            if self.cursors.get(user_id):
+                params["cursor"] = self.cursors[user_id]
+            response = await self.request(name, admins[user_id], "GET", "/scrum/api/v1/tasks/paginated", params=params)
+            self.cursors[user_id] = response.json().get("next_cursor")
+        elif name == "admin scrum list":
+            await self.request(name, admins[user_id], "GET", "/scrum/api/v1/scrum/paginated", params={"limit": 20})
+        elif name == "public page":
+            # half of the visitors have the page cached
+            headers = (
+                {"If-None-Match": self.etags[scrum_id]} if scrum_id in self.etags and self.rng.random() < 0.5 else {}
+            )
+            response = await self.request(name, public, "GET", f"/scrum/{scrum_id}", headers=headers)
+            self.etags[scrum_id] = response.headers.get("etag", "")
+        elif name == "public column":
+            stage = self.rng.choice(list(TaskStage)).value
+            await self.request(
+                name, public, "GET", f"/scrum/api/v1/scrum/{scrum_id}/public/tasks", params={"stage": stage}
+            )
+        elif name == "public edit":
+            notes = {"notes": f"edited {self.rng.random()}"}
+            await self.request(name, public, "PUT", f"/scrum/api/v1/tasks/public/{tasks_id}", json=notes)
+        else:
+            data = {"complete": True, "stage": "done", "reward": 100, "assignee": "bench@example.com"}
+            await self.request(name, admins[user_id], "PUT", f"/scrum/api/v1/tasks/{tasks_id}", json=data)
+
+
+@pytest.mark.asyncio
+async def test_load(scrum_db, monkeypatch, tmp_path):
+    config = {
+        "database": scrum_db.type,
+        "users": env_int("SCRUM_BENCH_USERS", 3),
+        "boards": env_int("SCRUM_BENCH_BOARDS", 5),
+        "tasks": env_int("SCRUM_BENCH_TASKS", 200),
+        "requests": env_int("SCRUM_BENCH_REQUESTS", 1_000),
+        "concurrency": env_int("SCRUM_BENCH_CONCURRENCY", 20),
+        "seed": env_int("SCRUM_BENCH_SEED", 1),
+    }
+    baseline_path = Path(os.getenv("SCRUM_BENCH_BASELINE", Path(__file__).with_name("baseline.json")))
+    payment_delay = env_float("SCRUM_BENCH_PAYMENT_MS", 20) / 1000
+
+    use_templates(monkeypatch, tmp_path)
+    boards = await seed(scrum_db, config["users"], config["boards"], config["tasks"])
+    # every request comes from one address, the public limits would reject most
+    await scrum_db.execute("UPDATE scrum.scrum SET public_rate_limit = 0, public_max_pending = 0")
+    clear_caches()
+    tasks_ids: dict[str, list[str]] = defaultdict(list)
+    for row in await scrum_db.fetchall("SELECT id, scrum_id FROM scrum.tasks"):
+        tasks_ids[row["scrum_id"]].append(row["id"])
+
+    load = Load(boards, tasks_ids, random.Random(config["seed"]))
+    await _stub_services(monkeypatch, load, payment_delay)
+    names = load.rng.choices(list(MIX), weights=list(MIX.values()), k=config["requests"])
+
+    async with _clients(list(boards)) as (admins, public):
+        worker = asyncio.create_task(tasks_module.wait_for_payouts())
+        queue = iter(names)
+
+        async def user():
+            for name in queue:
+                await load.run(name, admins, public)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(config["concurrency"])))
+        elapsed = time.perf_counter() - start
+        # let the worker pay what was completed
+        for _ in range(100):
+            pending = await scrum_db.fetchone(
+                "SELECT COUNT(*) AS n FROM scrum.payouts WHERE status IN ('pending', 'paying')"
+            )
+            if not pending or not pending["n"]:
+                break
+            await asyncio.sleep(0.1)
+        worker.cancel()
+
+    assert not load.errors, "\n".join(load.errors[:10])
+    run = {
+        "config": config,
+        "endpoints": {name: _summary(timer, elapsed) for name, timer in sorted(load.timers.items())},
+    }
+    total = sum(len(timer.samples) for name, timer in load.timers.items() if name in MIX)
+    print()
+    print(f"{config}: {total} requests in {elapsed:.2f} s, {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for name, result in run["endpoints"].items():
+        print(
+            f"{name:<18} {result['count']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}"
+            f" {result['p99_ms']:>9.2f} {result['rps']:>8.1f}"
+        )
+
+    _compare(run, baseline_path)
+
+
+def _compare(run: dict, baseline_path: Path):
+    """Print the deltas against the baseline, fail on regressions only when strict."""
+    baseline = load_baseline(baseline_path)
+    if baseline is None or os.getenv("SCRUM_BENCH_UPDATE_BASELINE"):
+        save_baseline(baseline_path, run)
+        print(f"saved the baseline to {baseline_path}")
+        return
+    if baseline["config"] != run["config"]:
+        print(f"not compared, the baseline in {baseline_path} is for {baseline['config']}")
+        return
+    print("against the baseline:")
+    print("\n".join(deltas(run, baseline)))
+    if not os.getenv("SCRUM_BENCH_STRICT"):
+        return
+    found = regressions(run, baseline, env_float("SCRUM_BENCH_THRESHOLD", 0.25), env_float("SCRUM_BENCH_SLACK_MS", 2))
+    if found:
+        pytest.fail("slower than the baseline:\n" + "\n".join(found))
+
+
+async def _stub_services(monkeypatch: pytest.MonkeyPatch, load: Load, payment_delay: float):
+    async def websocket_updater(item_id, data):
+        pass
+
+    pay_link = LnurlPayResponse(
+        callback=parse_obj_as(CallbackUrl, "https://example.com/lnurlp/bench/callback"),
+        minSendable=MilliSatoshi(1_000),
+        maxSendable=MilliSatoshi(1_000_000_000),
+        metadata=LnurlPayMetadata(json.dumps([["text/plain", "bench"]])),
+    )
+
+    # one invoice for every payout, the stubbed wallet does not look at it
+    tags = Tags()
+    tags.add(TagChar.description, "bench")
+    tags.add(TagChar.payment_secret, sha256(b"secret").hexdigest())
+    tags.add(TagChar.payment_hash, sha256(b"bench").hexdigest())
+    invoice = encode(
+        Bolt11(currency="bc", amount_msat=MilliSatoshi(1_000), date=int(time.time()), tags=tags),
+        fake_privkey("scrum bench"),
+    )
+
+    async def handle(lnurl, **kwargs):
+        await asyncio.sleep(payment_delay / 2)
+        return pay_link
+
+    async def fetch_lnurl_pay_request(data):
+        await asyncio.sleep(payment_delay / 2)
+        return data.res, SimpleNamespace(pr=invoice)
+
+    async def pay_invoice(**kwargs):
+        await asyncio.sleep(payment_delay)
+
+    pay_task_reward = tasks_module.pay_task_reward
+
+    async def timed_pay_task_reward(payout):
+        with load.timers["payout"].time():
+            await pay_task_reward(payout)
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(paylinks, "handle", handle)
+    monkeypatch.setattr(paylinks, "fetch_lnurl_pay_request", fetch_lnurl_pay_request)
+    monkeypatch.setattr(services, "pay_invoice", pay_invoice)
+    monkeypatch.setattr(tasks_module, "pay_task_reward", timed_pay_task_reward)
+
+
+@asynccontextmanager
+async def _clients(user_ids: list[str]) -> AsyncIterator[tuple[dict[str, AsyncClient], AsyncClient]]:
+    """
+    A logged in client per user and one anonymous client.
+    """
+    async with AsyncExitStack() as stack:
+        admins = {user_id: await stack.enter_async_context(api_client(user_id)) for user_id in user_ids}
+        yield admins, await stack.enter_async_context(api_client())
+
+
+def _summary(timer: Timer, elapsed: float) -> dict:
+    return {
+        "count": len(timer.samples),
+        "p50_ms": round(timer.percentile_ms(50), 3),
+        "p95_ms": round(timer.percentile_ms(95), 3),
+        "p99_ms": round(timer.percentile_ms(99), 3),
+        "rps": round(len(timer.samples) / elapsed, 2),
+    }
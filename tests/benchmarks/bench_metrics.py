@@ -0,0 +1,30 @@
+"""
+Overhead of the route metrics, disabled and enabled, on a cheap public route.
+
+    uv run pytest tests/benchmarks/bench_metrics.py -s
+"""
+
+import pytest
+
+from ... import metrics
+from .helpers import Timer, api_client, seed
+
+ROUNDS = 500
+
+
+@pytest.mark.asyncio
+async def test_metrics_overhead(scrum_db, monkeypatch):
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=20)
+    scrum_id = next(iter(boards.values()))[0]
+    url = f"/scrum/api/v1/scrum/{scrum_id}/public/tasks"
+
+    timers = {False: Timer(), True: Timer()}
+    async with api_client() as client:
+        for _ in range(ROUNDS):
+            for enabled, timer in timers.items():
+                monkeypatch.setattr(metrics, "enabled", enabled)
+                with timer.time():
+                    await client.get(url, params={"stage": "todo"})
+
+    print()
+    print(f"disabled {timers[False].mean_ms:.3f} ms, enabled {timers[True].mean_ms:.3f} ms")
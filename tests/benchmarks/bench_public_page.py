@@ -0,0 +1,42 @@
+"""
+The public page data of an unchanged board: rebuilt, from the snapshot, and
+a request revalidated with If-None-Match.
+
+    uv run pytest tests/benchmarks/bench_public_page.py -s
+
+The board size is configurable with SCRUM_BENCH_TASKS.
+"""
+
+from http import HTTPStatus
+
+import pytest
+
+from ...cache import public_board_cache
+from ...crud import get_scrum_by_id
+from ...views import get_public_board
+from .helpers import Timer, api_client, env_int, seed
+
+ROUNDS = 50
+
+
+@pytest.mark.asyncio
+async def test_public_page(scrum_db):
+    count = env_int("SCRUM_BENCH_TASKS", 5_000)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=count)
+    scrum = await get_scrum_by_id(next(iter(boards.values()))[0])
+    assert scrum
+
+    rebuilt, snapshot, revalidated = Timer(), Timer(), Timer()
+    async with api_client() as client:
+        for _ in range(ROUNDS):
+            public_board_cache.clear()
+            with rebuilt.time():
+                await get_public_board(scrum)
+            with snapshot.time():
+                etag = (await get_public_board(scrum)).etag
+            with revalidated.time():
+                response = await client.get(f"/scrum/{scrum.id}", headers={"If-None-Match": etag})
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    print()
+    print(f"rebuilt {rebuilt.mean_ms:8.2f} ms, snapshot {snapshot.mean_ms:8.2f} ms, 304 {revalidated.mean_ms:8.2f} ms")
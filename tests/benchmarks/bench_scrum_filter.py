@@ -0,0 +1,71 @@
+"""
+Latency of the multi-board task query at 10, 100 and 1,000 boards per user.
+
+Compares the former path (scrum id lookup + one OR-ed bind parameter per
+board) with the owner subquery and the single-parameter id list.
+
+    uv run pytest tests/benchmarks/bench_scrum_filter.py -s
+"""
+
+import pytest
+from lnbits.db import Filters, Page
+
+from ... import crud
+from ...models import Tasks, TasksFilters
+from .helpers import Timer, env_int, seed
+
+ROUNDS = 20
+
+
+async def _or_chained(user_id: str, filters: Filters) -> Page[Tasks]:
+    scrum_ids = await crud.get_scrum_ids_by_user(user_id)
+    values = {}
+    id_clause = []
+    for i, item_id in enumerate(scrum_ids):
+        values[f"scrum_id__{i}"] = item_id
+        id_clause.append(f"scrum_id = :scrum_id__{i}")
+    return await crud.db.fetch_page(
+        "SELECT * FROM scrum.tasks",
+        where=[f"({' OR '.join(id_clause)})"],
+        values=values,
+        filters=filters,
+        model=Tasks,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("boards", [10, 100, 1000])
+async def test_multi_board_task_query(scrum_db, boards):
+    seeded = await seed(
+        scrum_db,
+        users=2,
+        boards_per_user=boards,
+        tasks_per_board=env_int("SCRUM_BENCH_TASKS", 20),
+    )
+    user_id, scrum_ids = next(iter(seeded.items()))
+
+    def filters():
+        return Filters(model=TasksFilters, sortby="updated_at", direction="desc", limit=50)
+
+    paths = {
+        "or-chained": lambda: _or_chained(user_id, filters()),
+        "owner subquery": lambda: crud.get_tasks_paginated(user_id=user_id, filters=filters()),
+        "id list": lambda: crud.get_tasks_paginated(scrum_ids=scrum_ids, filters=filters()),
+    }
+
+    print()
+    totals = set()
+    for name, path in paths.items():
+        timer = Timer()
+        try:
+            for _ in range(ROUNDS):
+                with timer.time():
+                    page = await path()
+        except Exception as exc:
+            # the OR chain outgrows SQLite's expression depth at 1,000 boards
+            print(f"{boards:>5} boards  {name:<16} failed: {str(exc).splitlines()[0][:80]}")
+            continue
+        totals.add(page.total)
+        print(f"{boards:>5} boards  {name:<16} {timer.mean_ms:8.2f} ms")
+
+    assert len(totals) == 1, "all paths must return the same tasks"
@@ -0,0 +1,50 @@
+"""
+LIKE scans against the full-text index when searching a user's tasks.
+
+    uv run pytest tests/benchmarks/bench_search.py -s
+
+The number of tasks is configurable with SCRUM_BENCH_TASKS.
+"""
+
+import pytest
+from lnbits.db import Filters
+
+from ... import crud
+from ...models import Tasks, TasksFilters
+from .helpers import Timer, env_int, seed
+
+ROUNDS = 10
+TERMS = ["board", "task 123", "notes", "user7"]
+
+
+@pytest.mark.asyncio
+async def test_search(scrum_db):
+    count = env_int("SCRUM_BENCH_TASKS", 20_000)
+    boards = await seed(scrum_db, users=1, boards_per_user=10, tasks_per_board=count // 10)
+    user_id, scrum_ids = next(iter(boards.items()))
+
+    def filters(term: str) -> Filters:
+        return Filters(model=TasksFilters, search=term, limit=20)
+
+    async def like(term: str):
+        # what the paginated endpoint ran before the index
+        where = ["scrum_id IN (SELECT id FROM scrum.scrum WHERE user_id = :user_id)"]
+        return await scrum_db.fetch_page(
+            "SELECT * FROM scrum.tasks", where, {"user_id": user_id}, filters(term), model=Tasks
+        )
+
+    print()
+    for term in TERMS:
+        like_timer, page_timer, search_timer = Timer(), Timer(), Timer()
+        for _ in range(ROUNDS):
+            with like_timer.time():
+                await like(term)
+            with page_timer.time():
+                await crud.get_tasks_paginated(scrum_ids, filters(term), user_id)
+            with search_timer.time():
+                results = await crud.search_tasks(user_id, term)
+        assert results
+        print(
+            f"{term!r:>12}: like {like_timer.mean_ms:8.2f} ms, "
+            f"indexed page {page_timer.mean_ms:8.2f} ms, ranked {search_timer.mean_ms:8.2f} ms"
+        )
@@ -0,0 +1,76 @@
+"""
+Encoding task rows to JSON: through `Tasks` models and `jsonable_encoder` as
+before, and straight from the rows with the standard library and orjson.
+
+    uv run pytest tests/benchmarks/bench_serialize.py -s
+
+The row counts are configurable with SCRUM_BENCH_SIZES (comma separated).
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from lnbits.db import dict_to_model, model_to_dict
+
+from ... import serialize
+from ...models import Tasks, TaskStage
+from .helpers import Timer
+
+ROUNDS = 3
+
+
+def _rows(count: int) -> list[dict]:
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    stages = list(TaskStage)
+    return [
+        model_to_dict(
+            Tasks(
+                id=f"task{t:08d}",
+                scrum_id="board",
+                task=f"task {t} of the board",
+                assignee=f"user{t % 12}@example.com" if t % 3 else None,
+                stage=stages[t % len(stages)],
+                reward=(t % 5) * 100,
+                paid=t % 7 == 0,
+                complete=t % 3 == 2,
+                notes=f"notes for task {t}",
+                created_at=start + timedelta(seconds=t),
+                updated_at=start + timedelta(seconds=t, hours=t % 48),
+            )
+        )
+        for t in range(count)
+    ]
+
+
+def _models(rows: list[dict]) -> bytes:
+    return json.dumps(jsonable_encoder([dict_to_model(row, Tasks) for row in rows])).encode()
+
+
+def _task_rows(rows: list[dict]) -> bytes:
+    return serialize.dumps([serialize.task_row(row) for row in rows])
+
+
+def test_serialize(monkeypatch):
+    sizes = [int(size) for size in os.getenv("SCRUM_BENCH_SIZES", "1000,10000,100000").split(",")]
+    orjson = serialize.orjson
+
+    print()
+    print(f"{'rows':>8} {'models ms':>10} {'rows+json ms':>13} {'rows+orjson ms':>15}")
+    for size in sizes:
+        rows = _rows(size)
+        models, stdlib, fast = Timer(), Timer(), Timer()
+        for _ in range(ROUNDS):
+            with models.time():
+                expected = _models(rows)
+            monkeypatch.setattr(serialize, "orjson", None)
+            with stdlib.time():
+                encoded = _task_rows(rows)
+            monkeypatch.setattr(serialize, "orjson", orjson)
+            if orjson is not None:
+                with fast.time():
+                    _task_rows(rows)
+        assert json.loads(encoded) == json.loads(expected)
+        fast_ms = f"{fast.mean_ms:15.2f}" if fast.samples else f"{'-':>15}"
+        print(f"{size:>8} {models.mean_ms:>10.2f} {stdlib.mean_ms:>13.2f} {fast_ms}")
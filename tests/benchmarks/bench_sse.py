@@ -0,0 +1,75 @@
+"""
+Fan-out of task events to many SSE subscribers of one board.
+
+    uv run pytest tests/benchmarks/bench_sse.py -s
+
+The number of subscribers and messages are configurable with
+SCRUM_BENCH_SUBSCRIBERS and SCRUM_BENCH_MESSAGES. Every tenth subscriber
+stops reading and must be dropped without holding up the others.
+"""
+
+import asyncio
+import time
+
+import pytest
+from lnbits.helpers import urlsafe_short_hash
+
+from ... import events
+from ...events import publish_task_events, stream_task_events, subscriber_count, task_changed
+from .helpers import Timer, env_int
+
+
+@pytest.mark.asyncio
+async def test_fan_out(monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    subscribers = env_int("SCRUM_BENCH_SUBSCRIBERS", 5_000)
+    messages = env_int("SCRUM_BENCH_MESSAGES", 200)
+    scrum_id = urlsafe_short_hash()
+    received = [0] * subscribers
+    stalled = set(range(0, subscribers, 10))
+    readers = [i for i in range(subscribers) if i not in stalled]
+    caught_up = asyncio.Event()
+    delivered = 0
+    expected = 0
+
+    async def subscriber(i: int):
+        nonlocal delivered
+        stream = stream_task_events(scrum_id)
+        await anext(stream)
+        async for _ in stream:
+            received[i] += 1
+            if i in stalled:
+                # a viewer on a stalled connection
+                await asyncio.sleep(3600)
+            delivered += 1
+            if delivered == expected:
+                caught_up.set()
+
+    tasks = [asyncio.create_task(subscriber(i)) for i in range(subscribers)]
+    while subscriber_count(scrum_id) < subscribers:
+        await asyncio.sleep(0.01)
+
+    publish, deliver = Timer(), Timer()
+    start = time.perf_counter()
+    for seq in range(1, messages + 1):
+        expected = len(readers) * seq
+        caught_up.clear()
+        with deliver.time():
+            with publish.time():
+                await publish_task_events(scrum_id, task_changed("task", {"stage": "doing", "n": seq}))
+            await asyncio.wait_for(caught_up.wait(), 30)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert subscriber_count(scrum_id) == 0
+    assert all(received[i] == messages for i in readers)
+    print()
+    print(f"{subscribers} subscribers, {len(stalled)} stalled and dropped, {messages} messages")
+    print(f"publish {publish.mean_ms:.2f} ms, delivered to every reader {deliver.mean_ms:.2f} ms")
+    print(f"{delivered / elapsed:,.0f} frames/s")
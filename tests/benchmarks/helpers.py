@@ -0,0 +1,246 @@
+import json
+import math
+import os
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import lnbits
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from lnbits.db import SQLITE, Database, model_to_dict
+from lnbits.decorators import check_user_exists
+from lnbits.helpers import urlsafe_short_hash
+from lnbits.settings import settings
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import text
+
+from ... import scrum_ext
+from ...models import Scrum, Tasks, TaskStage
+from ...ranks import rank_keys
+
+
+@asynccontextmanager
+async def api_client(user_id: str | None = None) -> AsyncIterator[AsyncClient]:
+    """
+    HTTP client for the extension routers, logged in as `user_id`.
+    """
+    app = FastAPI()
+    app.include_router(scrum_ext)
+    if user_id:
+        app.dependency_overrides[check_user_exists] = lambda: SimpleNamespace(id=user_id)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://scrum.test") as client:
+        yield client
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def use_templates(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """
+    Lay out the extension the way lnbits serves it, so the pages render.
+    """
+    extensions = tmp_path / "extensions"
+    extensions.mkdir(exist_ok=True)
+    (extensions / "scrum").symlink_to(Path(__file__).parents[2], target_is_directory=True)
+    monkeypatch.setattr(settings, "lnbits_extensions_path", str(tmp_path))
+    # the core templates are looked up relative to the working directory
+    monkeypatch.chdir(Path(lnbits.__file__).parents[1])
+
+
+async def seed(
+    database: Database,
+    users: int = 5,
+    boards_per_user: int = 20,
+    tasks_per_board: int = 100,
+) -> dict[str, list[str]]:
+    """
+    Seed a synthetic dataset and return the scrum ids of every user.
+    """
+    stages = list(TaskStage)
+    # the tasks of a column are ranked in creation order
+    ranks = rank_keys(tasks_per_board // len(stages) + 1)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    boards: dict[str, list[str]] = {}
+    scrum_rows: list[dict] = []
+    tasks_rows: list[dict] = []
+    for u in range(users):
+        user_id = urlsafe_short_hash()
+        boards[user_id] = []
+        for b in range(boards_per_user):
+            created_at = start + timedelta(minutes=u * boards_per_user + b)
+            scrum = Scrum(
+                id=urlsafe_short_hash(),
+                user_id=user_id,
+                name=f"board {u}-{b}",
+                description="benchmark board",
+                public_assigning=b % 2 == 0,
+                wallet=urlsafe_short_hash(),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            boards[user_id].append(scrum.id)
+            scrum_rows.append(model_to_dict(scrum))
+            for t in range(tasks_per_board):
+                task_created_at = created_at + timedelta(seconds=t)
+                tasks = Tasks(
+                    id=urlsafe_short_hash(),
+                    scrum_id=scrum.id,
+                    task=f"task {t} of board {u}-{b}",
+                    assignee=f"user{t % 12}@example.com" if t % 3 else None,
+                    stage=stages[t % len(stages)],
+                    reward=(t % 5) * 100,
+                    paid=t % 7 == 0,
+                    complete=t % 3 == 2,
+                    notes=f"notes for task {t}",
+                    rank=ranks[t // len(stages)],
+                    created_at=task_created_at,
+                    updated_at=task_created_at + timedelta(hours=t % 48),
+                )
+                tasks_rows.append(model_to_dict(tasks))
+
+    await insert_many(database, "scrum.scrum", scrum_rows)
+    await insert_many(database, "scrum.tasks", tasks_rows)
+    if database.type != SQLITE:
+        await database.execute("ANALYZE")
+    return boards
+
+
+async def insert_many(database: Database, table_name: str, rows: list[dict], chunk: int = 5000) -> None:
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    placeholders = ", ".join(f":{column}" for column in columns)
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+    async with database.connect() as conn:
+        for i in range(0, len(rows), chunk):
+            await conn.conn.execute(text(query), rows[i : i + chunk])
+        await conn.conn.commit()
+
+
+@contextmanager
+def capture_queries(database: Database) -> Iterator[list[tuple[str, Any]]]:
+    """
+    Record every statement sent to the database while the context is open.
+    """
+    captured: list[tuple[str, Any]] = []
+
+    def _listener(
+        conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(database.engine.sync_engine, "before_cursor_execute", _listener)
+    try:
+        yield captured
+    finally:
+        event.remove(database.engine.sync_engine, "before_cursor_execute", _listener)
+
+
+async def explain(database: Database, statement: str, parameters: Any) -> list[str]:
+    async with database.connect() as conn:
+        if database.type == SQLITE:
+            result = await conn.conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [row[-1] for row in result.fetchall()]
+        else:
+            # assert the index is usable, whatever the planner picks for a small seed
+            await conn.conn.exec_driver_sql("SET enable_seqscan = off")
+            result = await conn.conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            plan = [row[0] for row in result.fetchall()]
+        await conn.conn.rollback()
+    return plan
+
+
+def full_scans(plan: list[str], tables: tuple[str, ...] = ("tasks", "scrum")) -> list[str]:
+    scans = []
+    for line in plan:
+        words = line.strip().replace("scrum.", "").split()
+        if line.strip().startswith("SCAN ") and len(words) > 1 and words[1] in tables:
+            scans.append(line)
+        elif "Seq Scan on" in line and any(f"Seq Scan on {table}" in line for table in tables):
+            scans.append(line)
+    return scans
+
+
+class Timer:
+    def __init__(self):
+        self.samples: list[float] = []
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    @property
+    def mean_ms(self) -> float:
+        return 1000 * sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def percentile_ms(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        # nearest rank
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return 1000 * ordered[rank - 1]
+
+
+def load_baseline(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, run: dict) -> None:
+    path.write_text(json.dumps(run, indent=2, sort_keys=True) + "\n")
+
+
+def deltas(run: dict, baseline: dict) -> list[str]:
+    """
+    The change of p95 latency and throughput per endpoint against the
+    baseline, one line each.
+    """
+    lines = []
+    for name, result in run["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0
+        rps = (result["rps"] / before["rps"] - 1) * 100 if before["rps"] else 0
+        lines.append(
+            f"{name:<18} p95 {result['p95_ms']:>9.2f} ms ({p95:+.0f}%)" f" {result['rps']:>8.1f} req/s ({rps:+.0f}%)"
+        )
+    return lines
+
+
+def regressions(run: dict, baseline: dict, threshold: float, slack_ms: float) -> list[str]:
+    """
+    Endpoints whose p95 latency grew, or throughput shrank, by more than
+    `threshold` (a fraction) against the baseline. Latency changes below
+    `slack_ms` are noise and never count.
+    """
+    found = []
+    for name, result in run["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        p95, p95_before = result["p95_ms"], before["p95_ms"]
+        if p95 > p95_before * (1 + threshold) and p95 - p95_before > slack_ms:
+            found.append(f"{name}: p95 {p95:.2f} ms, baseline {p95_before:.2f} ms")
+        if result["rps"] < before["rps"] * (1 - threshold):
+            found.append(f"{name}: {result['rps']:.1f} req/s, baseline {before['rps']:.1f} req/s")
+    return found
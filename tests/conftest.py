@@ -0,0 +1,29 @@
+import re
+
+import pytest_asyncio
+from lnbits.db import SQLITE, Database
+from lnbits.settings import settings
+
+from .. import crud, migrations
+from ..cache import clear_caches
+
+
+# fresh extension database with all migrations applied, swapped in for `crud.db`
+# NOTE: on postgres (LNBITS_DATABASE_URL) the `scrum` schema is dropped first,
+# so only ever point the tests at a throwaway database.
+@pytest_asyncio.fixture
+async def scrum_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "lnbits_data_folder", str(tmp_path))
+    database = Database("ext_scrum")
+    matcher = re.compile(r"^m(\d\d\d)_")
+    async with database.connect() as conn:
+        if database.type != SQLITE:
+            await conn.execute("DROP SCHEMA IF EXISTS scrum CASCADE")
+            await conn.execute("CREATE SCHEMA scrum")
+        for key, migrate in list(migrations.__dict__.items()):
+            if matcher.match(key):
+                await migrate(conn)
+    monkeypatch.setattr(crud, "db", database)
+    clear_caches()
+    yield database
+    await database.engine.dispose()
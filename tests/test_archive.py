@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from .. import events
+from ..crud import archive_tasks, delete_scrum, get_scrum_stats, rebuild_scrum_stats
+from ..models import Tasks
+from .benchmarks.helpers import api_client, seed
+
+# the seeded tasks that are done and paid, every 21st from the 15th
+TASKS = 210
+ARCHIVABLE = 10
+
+
+async def count_rows(scrum_db, table: str, scrum_id: str) -> int:
+    row = await scrum_db.fetchone(f"SELECT COUNT(*) AS n FROM {table} WHERE scrum_id = :id", {"id": scrum_id})
+    return row["n"]
+
+
+@pytest.mark.asyncio
+async def test_archive_in_batches(scrum_db):
+    boards = await seed(scrum_db, users=1, boards_per_user=2, tasks_per_board=TASKS)
+    scrum_id, other = next(iter(boards.values()))
+    before = datetime.now(timezone.utc)
+    stats = await get_scrum_stats(scrum_id)
+
+    assert not await archive_tasks(scrum_id, before - timedelta(days=400))
+    assert [await archive_tasks(scrum_id, before, limit=4) for _ in range(4)] == [4, 4, 2, 0]
+    assert await count_rows(scrum_db, "scrum.tasks", scrum_id) == TASKS - ARCHIVABLE
+    assert await count_rows(scrum_db, "scrum.tasks_archive", scrum_id) == ARCHIVABLE
+    assert await count_rows(scrum_db, "scrum.tasks", other) == TASKS
+    # the stats count the archive too
+    assert await get_scrum_stats(scrum_id) == stats
+    await rebuild_scrum_stats(scrum_id)
+    assert await get_scrum_stats(scrum_id) == stats
+
+    archived = await scrum_db.fetchall("SELECT * FROM scrum.tasks_archive", model=Tasks)
+    assert all(item.paid and item.complete and item.stage == "done" for item in archived)
+
+    assert not await delete_scrum(next(iter(boards)), scrum_id)
+    assert await count_rows(scrum_db, "scrum.tasks_archive", scrum_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_close_sprint_and_list_the_archive(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=TASKS)
+    user_id, (scrum_id,) = next(iter(boards.items()))
+
+    async with api_client(user_id) as client:
+        response = await client.post(f"/scrum/api/v1/scrum/{scrum_id}/close-sprint", params={"older_than_days": 400})
+        assert response.json() == {"archived": 0}
+        response = await client.post(f"/scrum/api/v1/scrum/{scrum_id}/close-sprint")
+        assert response.json() == {"archived": ARCHIVABLE}
+
+        params: dict = {"scrum_id": scrum_id, "limit": 1000}
+        active = (await client.get("/scrum/api/v1/tasks/paginated", params=params)).json()
+        assert active["total"] == TASKS - ARCHIVABLE
+        archived = (await client.get("/scrum/api/v1/tasks/paginated", params={**params, "archived": True})).json()
+        assert archived["total"] == ARCHIVABLE
+        assert not {item["id"] for item in active["data"]} & {item["id"] for item in archived["data"]}
+
+        response = await client.get(
+            "/scrum/api/v1/tasks/paginated", params={**params, "archived": True, "keyset": True, "limit": 6}
+        )
+        page = response.json()
+        assert len(page["data"]) == 6
+        assert page["next_cursor"]
+
+        search = {**params, "archived": True, "search": "task 14 of"}
+        response = await client.get("/scrum/api/v1/tasks/paginated", params=search)
+        assert [item["task"] for item in response.json()["data"]] == ["task 14 of board 0-0"]
+
+        # the export still has the paid tasks, archived ones included
+        response = await client.get("/scrum/api/v1/tasks/export", params={"scrum_id": scrum_id})
+        exported = [json.loads(line)["id"] for line in response.text.splitlines()]
+        assert sorted(exported) == sorted(item["id"] for item in active["data"] + archived["data"])
+
+    # another user's board is refused, not an empty page
+    async with api_client("someone else") as client:
+        for page_params in (params, {**params, "keyset": True}):
+            response = await client.get("/scrum/api/v1/tasks/paginated", params=page_params)
+            assert response.status_code == 403
+
+    assert events.get_task_events(scrum_id, 0).events[-1].fields == {"archived": ARCHIVABLE}
@@ -0,0 +1,47 @@
+import pytest
+
+from .. import crud
+from ..crud import delete_scrum, get_purges, get_scrum_stats, purge_tasks, queue_orphan_purges
+from .benchmarks.helpers import seed
+
+
+async def count_tasks(scrum_db, scrum_id: str) -> int:
+    row = await scrum_db.fetchone("SELECT COUNT(*) AS n FROM scrum.tasks WHERE scrum_id = :id", {"id": scrum_id})
+    return row["n"]
+
+
+@pytest.mark.asyncio
+async def test_delete_cascades(scrum_db, monkeypatch):
+    boards = await seed(scrum_db, users=1, boards_per_user=3, tasks_per_board=30)
+    user_id, (small, large, other) = next(iter(boards.items()))
+
+    assert not await delete_scrum("someone else", small)
+    assert await count_tasks(scrum_db, small) == 30
+
+    assert not await delete_scrum(user_id, small)
+    assert await count_tasks(scrum_db, small) == 0
+    assert (await get_scrum_stats(small)).tasks == 0
+
+    monkeypatch.setattr(crud, "CASCADE_DELETE_LIMIT", 10)
+    assert await delete_scrum(user_id, large)
+    assert not await crud.get_scrum_by_id(large)
+    assert await get_purges() == [large]
+    assert [await purge_tasks(large, limit=20) for _ in range(3)] == [20, 10, 0]
+    assert await count_tasks(scrum_db, large) == 0
+    assert not await get_purges()
+    assert await count_tasks(scrum_db, other) == 30
+
+
+@pytest.mark.asyncio
+async def test_orphans_purged(scrum_db):
+    boards = await seed(scrum_db, users=1, boards_per_user=2, tasks_per_board=5)
+    orphaned, kept = next(iter(boards.values()))
+    # deleted the way it was done before, leaving the tasks behind
+    await scrum_db.execute("DELETE FROM scrum.scrum WHERE id = :id", {"id": orphaned})
+
+    assert await queue_orphan_purges() == 1
+    assert await queue_orphan_purges() == 0
+    while await purge_tasks(orphaned):
+        pass
+    assert await count_tasks(scrum_db, orphaned) == 0
+    assert await count_tasks(scrum_db, kept) == 5
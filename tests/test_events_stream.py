@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+from lnbits.helpers import urlsafe_short_hash
+
+from .. import events
+from ..events import (
+    board_reloaded,
+    get_task_events,
+    publish_task_events,
+    stream_task_events,
+    subscriber_count,
+    task_changed,
+    task_created,
+    task_deleted,
+)
+from ..models import Tasks, TaskStage
+
+sent: list[dict] = []
+
+
+@pytest.fixture(autouse=True)
+def no_websocket(monkeypatch):
+    async def websocket_updater(item_id, data):
+        sent.append(json.loads(data))
+
+    sent.clear()
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+
+
+def parse(frame: bytes) -> tuple[str, dict]:
+    lines = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return lines["id"], json.loads(lines["data"])
+
+
+@pytest.mark.asyncio
+async def test_resume_with_last_event_id():
+    scrum_id = urlsafe_short_hash()
+    stream = stream_task_events(scrum_id)
+    assert (await anext(stream)).startswith(b"retry:")
+    await publish_task_events(scrum_id, task_deleted("a"))
+    last_event_id, message = parse(await anext(stream))
+    epoch, _ = events.board_position(scrum_id)
+    assert last_event_id == f"{epoch}:1"
+    assert [event["id"] for event in message["events"]] == ["a"]
+    await stream.aclose()
+    assert subscriber_count(scrum_id) == 0
+
+    # missed while disconnected
+    await publish_task_events(scrum_id, task_deleted("b"), task_deleted("c"))
+    stream = stream_task_events(scrum_id, last_event_id)
+    await anext(stream)
+    _, message = parse(await anext(stream))
+    assert [event["seq"] for event in message["events"]] == [2, 3]
+    await publish_task_events(scrum_id, task_deleted("d"))
+    _, message = parse(await anext(stream))
+    assert [event["seq"] for event in message["events"]] == [4]
+    await stream.aclose()
+
+    # from another process run
+    stream = stream_task_events(scrum_id, "stale:2")
+    await anext(stream)
+    _, message = parse(await anext(stream))
+    assert message["resync"] and message["seq"] == 4
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_dropped():
+    scrum_id = urlsafe_short_hash()
+    slow, fast = stream_task_events(scrum_id), stream_task_events(scrum_id)
+    await anext(slow)
+    await anext(fast)
+    for i in range(events.SUBSCRIBER_QUEUE + 1):
+        await publish_task_events(scrum_id, task_deleted(str(i)))
+        await anext(fast)
+    assert subscriber_count(scrum_id) == 1
+    # the dropped stream ends, so the client reconnects and resumes
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(anext(slow), 1)
+    await fast.aclose()
+
+
+@pytest.mark.asyncio
+async def test_changes_coalesced(monkeypatch):
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0.05)
+    scrum_id = urlsafe_short_hash()
+    tasks = Tasks(id="a", task="new", scrum_id=scrum_id, assignee=None, stage=TaskStage.todo, reward=None, notes=None)
+    await publish_task_events(scrum_id, task_changed("b", {"stage": "doing"}))
+    await publish_task_events(scrum_id, task_created(tasks))
+    for stage in ("doing", "done", "todo"):
+        await publish_task_events(scrum_id, task_changed("b", {"stage": stage}))
+    await publish_task_events(scrum_id, task_changed("a", {"notes": "merged"}))
+    await publish_task_events(scrum_id, task_changed("c", {"stage": "done"}), task_deleted("c"))
+    await publish_task_events(scrum_id, task_changed("c", {"paid": True}))
+    assert not sent
+    await events._boards[scrum_id].flusher
+
+    assert len(sent) == 1
+    changes = [(event["op"], event["id"], event["fields"]) for event in sent[0]["events"]]
+    assert [change[:2] for change in changes] == [("update", "b"), ("create", "a"), ("delete", "c")]
+    assert changes[0][2] == {"stage": "todo"}
+    assert changes[1][2]["task"] == "new" and changes[1][2]["notes"] == "merged"
+    assert changes[2][2] == {}
+    assert [event.seq for event in get_task_events(scrum_id).events] == [1, 2, 3]
+
+    # a change after the window is the next message
+    await publish_task_events(scrum_id, task_changed("b", {"stage": "doing"}))
+    await events._boards[scrum_id].flusher
+    assert len(sent) == 2 and sent[1]["events"][0]["seq"] == 4
+
+
+@pytest.mark.asyncio
+async def test_merged_changes_keep_their_order(monkeypatch):
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0.05)
+    scrum_id = urlsafe_short_hash()
+    await publish_task_events(scrum_id, task_changed("a", {"stage": "doing"}))
+    await publish_task_events(scrum_id, board_reloaded(scrum_id, {"created": 1}))
+    await publish_task_events(scrum_id, task_changed("b", {"stage": "done"}))
+    await publish_task_events(scrum_id, task_changed("a", {"notes": "after the reload"}))
+    await publish_task_events(scrum_id, board_reloaded(scrum_id, {"archived": 2}))
+    await events._boards[scrum_id].flusher
+
+    changes = [(event["op"], event["id"], event["fields"]) for event in sent[0]["events"]]
+    assert [change[:2] for change in changes] == [("update", "b"), ("update", "a"), ("reload", scrum_id)]
+    assert changes[1][2] == {"stage": "doing", "notes": "after the reload"}
+    assert changes[2][2] == {"archived": 2}
+
+
+@pytest.mark.asyncio
+async def test_idle_and_deleted_boards_are_evicted(monkeypatch):
+    monkeypatch.setattr(events, "_boards", {})
+    monkeypatch.setattr(events, "MAX_BOARDS", 3)
+    kept, *idle = [urlsafe_short_hash() for _ in range(4)]
+    stream = stream_task_events(kept)
+    await anext(stream)
+    for scrum_id in idle:
+        await publish_task_events(scrum_id, task_deleted("a"))
+    # the oldest idle board went, the one with a subscriber stays
+    assert set(events._boards) == {kept, *idle[1:]}
+    # it starts over, clients of its events catch up with a resync
+    assert get_task_events(idle[0], 1).resync
+
+    monkeypatch.setattr(events, "BOARD_IDLE_TTL", 0)
+    events.forget_board(kept)
+    with pytest.raises(StopAsyncIteration):
+        await anext(stream)
+    await publish_task_events(idle[0], task_deleted("b"))
+    assert set(events._boards) == {idle[0]}
@@ -0,0 +1,48 @@
+import io
+import json
+
+import pytest
+
+from .. import crud, events, services
+from ..models import TransferFormat
+from .benchmarks.helpers import seed
+
+
+@pytest.mark.asyncio
+async def test_stopped_import_keeps_its_chunks_and_says_where_to_resume(scrum_db, monkeypatch):
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=0)
+    (scrum_id,) = next(iter(boards.values()))
+    scrum = await crud.get_scrum_by_id(scrum_id)
+    assert scrum
+    sent: list = []
+
+    async def websocket_updater(item_id, data):
+        sent.append(data)
+
+    create_tasks_bulk = crud.create_tasks_bulk
+    calls: list[int] = []
+
+    async def flaky_create_tasks_bulk(data):
+        calls.append(len(data))
+        if len(calls) == 3:
+            raise RuntimeError("database is locked")
+        return await create_tasks_bulk(data)
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    monkeypatch.setattr(services, "IMPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(services, "create_tasks_bulk", flaky_create_tasks_bulk)
+    lines = [json.dumps({"task": f"task {i}"}) for i in range(4)]
+    lines[1:1] = ["not json"]
+    lines += [json.dumps({"task": f"task {i}"}) for i in range(4, 8)]
+    file = io.BytesIO("\n".join(lines).encode())
+
+    result = await services.import_tasks(scrum, file, TransferFormat.ndjson)
+
+    # lines 1, 3 | 4, 5 | 6, 7 fails, 8 and 9 are never read
+    assert calls == [2, 2, 2]
+    assert result.created == 4 and result.failed == 1 and result.resume_line == 6
+    assert [error.line for error in result.errors] == [2]
+    row = await scrum_db.fetchone("SELECT COUNT(*) AS n FROM scrum.tasks WHERE scrum_id = :id", {"id": scrum_id})
+    assert row["n"] == 4
+    assert sent
@@ -0,0 +1,32 @@
+import re
+
+import pytest
+
+from .. import metrics
+from ..metrics import prometheus_text, record, reset_metrics
+from .benchmarks.helpers import api_client, seed
+
+
+@pytest.mark.asyncio
+async def test_route_metrics(scrum_db, monkeypatch):
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=10)
+    scrum_id = next(iter(boards.values()))[0]
+    async with api_client() as client:
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/public/tasks", params={"stage": "todo"})
+        assert "Server-Timing" not in response.headers
+
+        monkeypatch.setattr(metrics, "enabled", True)
+        reset_metrics()
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/public/tasks", params={"stage": "todo"})
+        match = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response.headers["Server-Timing"])
+        assert match
+        queries = int(match.group(1))
+        assert queries >= 1
+    with record("payment", "pay_invoice"):
+        pass
+
+    text = prometheus_text()
+    labels = 'method="GET",route="/scrum/api/v1/scrum/{scrum_id}/public/tasks"'
+    assert f"scrum_request_db_queries_total{{{labels}}} {queries}" in text
+    assert f'scrum_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert 'scrum_payment_duration_seconds_count{call="pay_invoice"} 1' in text
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from datetime import datetime
+from hashlib import sha256
+from os import urandom
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import pytest_asyncio
+from bolt11 import Bolt11, MilliSatoshi, TagChar, Tags, encode
+from lnbits.settings import settings
+from lnbits.utils.crypto import fake_privkey
+from lnurl import LnurlResponseException
+from lnurl import encode as lnurl_encode
+
+from .. import paylinks
+from ..cache import pay_link_cache
+
+
+class StubLnurlServer:
+    """
+    A local LNURL-pay service, counts the requests to its pay link and callback.
+    """
+
+    def __init__(self):
+        self.port = 0
+        self.link_requests = 0
+        self.callback_requests = 0
+        self.failing = False
+        self._server: asyncio.Server | None = None
+
+    @property
+    def lnurl(self) -> str:
+        return str(lnurl_encode(f"http://127.0.0.1:{self.port}/lnurlp/alice").bech32)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        request_line = (await reader.readline()).decode()
+        while (await reader.readline()).strip():
+            pass
+        url = urlsplit(request_line.split()[1])
+        status, body = 200, {}
+        if self.failing:
+            status = 500
+        elif url.path == "/lnurlp/alice":
+            self.link_requests += 1
+            body = {
+                "tag": "payRequest",
+                "callback": f"http://127.0.0.1:{self.port}/callback/alice",
+                "minSendable": 1_000,
+                "maxSendable": 1_000_000,
+                "metadata": json.dumps([["text/plain", "alice"]]),
+            }
+        else:
+            self.callback_requests += 1
+            body = {"pr": _invoice(int(parse_qs(url.query)["amount"][0])), "routes": []}
+        data = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+        writer.close()
+
+
+def _invoice(amount_msat: int) -> str:
+    tags = Tags()
+    tags.add(TagChar.description, "alice")
+    tags.add(TagChar.payment_secret, urandom(32).hex())
+    tags.add(TagChar.payment_hash, sha256(urandom(32)).hexdigest())
+    invoice = Bolt11(
+        currency="bc", amount_msat=MilliSatoshi(amount_msat), date=int(datetime.now().timestamp()), tags=tags
+    )
+    return encode(invoice, fake_privkey("scrum tests"))
+
+
+@pytest_asyncio.fixture
+async def lnurl_server(monkeypatch):
+    monkeypatch.setattr(settings, "lnbits_lnurl_allow_private_ips", True)
+    pay_link_cache.clear()
+    server = StubLnurlServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_pay_link_is_resolved_once(lnurl_server):
+    prs = await asyncio.gather(*(paylinks.get_pay_request(lnurl_server.lnurl, 21_000) for _ in range(5)))
+    prs.append(await paylinks.get_pay_request(lnurl_server.lnurl, 42_000))
+
+    assert len(set(prs)) == 6
+    assert lnurl_server.link_requests == 1
+    assert lnurl_server.callback_requests == 6
+
+
+@pytest.mark.asyncio
+async def test_amount_out_of_range_is_rejected_without_a_callback(lnurl_server):
+    with pytest.raises(LnurlResponseException):
+        await paylinks.get_pay_request(lnurl_server.lnurl, 2_000_000)
+    assert lnurl_server.callback_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_resolution_backs_off(lnurl_server):
+    lnurl_server.failing = True
+    first = await paylinks.get_pay_link(lnurl_server.lnurl)
+    second = await paylinks.get_pay_link(lnurl_server.lnurl)
+    assert first.error
+    assert second.failures == 1
+
+    # due again after the back-off, which doubles
+    pay_link_cache.set(lnurl_server.lnurl, first.copy(update={"expires_at": first.checked_at}))
+    third = await paylinks.get_pay_link(lnurl_server.lnurl)
+    assert third.failures == 2
+    assert third.expires_at - third.checked_at == paylinks.PAY_LINK_BACKOFF * 2
+
+    lnurl_server.failing = False
+    paylinks.forget_pay_link(lnurl_server.lnurl)
+    assert (await paylinks.get_pay_link(lnurl_server.lnurl)).callback
+
+
+@pytest.mark.asyncio
+async def test_prefetch_resolves_in_the_background(lnurl_server):
+    paylinks.prefetch_pay_links([lnurl_server.lnurl, f" {lnurl_server.lnurl} ", None, ""])
+    await asyncio.gather(*paylinks._prefetches)
+
+    assert lnurl_server.link_requests == 1
+    await paylinks.get_pay_request(lnurl_server.lnurl, 21_000)
+    assert lnurl_server.link_requests == 1
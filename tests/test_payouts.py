@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from os import urandom
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from bolt11 import Bolt11, MilliSatoshi, TagChar, Tags, encode
+from lnbits.utils.crypto import fake_privkey
+
+from .. import crud, events, services
+from ..models import CreateTasks, Payout, PayoutStatus
+from .benchmarks.helpers import seed
+
+# the payment hashes of the invoices handed out, in order
+invoices: list[str] = []
+
+
+@pytest_asyncio.fixture
+async def payout(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    async def get_pay_request(assignee, amount_msat):
+        tags = Tags()
+        tags.add(TagChar.description, "bob")
+        tags.add(TagChar.payment_secret, urandom(32).hex())
+        tags.add(TagChar.payment_hash, sha256(urandom(32)).hexdigest())
+        invoice = Bolt11(
+            currency="bc", amount_msat=MilliSatoshi(amount_msat), date=int(datetime.now().timestamp()), tags=tags
+        )
+        invoices.append(invoice.payment_hash)
+        return encode(invoice, fake_privkey("scrum tests"))
+
+    invoices.clear()
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    monkeypatch.setattr(services, "get_pay_request", get_pay_request)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=0)
+    (scrum_id,) = next(iter(boards.values()))
+    tasks = await crud.create_tasks(
+        CreateTasks(task="task", scrum_id=scrum_id, assignee="bob@example.com", reward=10, complete=True, notes=None)
+    )
+    payout = Payout(
+        task_id=tasks.id, scrum_id=scrum_id, wallet="wallet", assignee="bob@example.com", amount=10, description="pay"
+    )
+    assert await crud.create_payout(payout)
+    return payout
+
+
+def wallet(monkeypatch, status: str | None) -> list[int]:
+    """
+    Stub the wallet: the payment of the last invoice has `status`, or there
+    is none. Returns the pay calls.
+    """
+    calls: list[int] = []
+
+    async def pay_invoice(**kwargs):
+        calls.append(1)
+        raise RuntimeError("Payment still in flight.")
+
+    async def get_wallet_payment(wallet_id, payment_hash):
+        if status is None or payment_hash != invoices[-1]:
+            return None
+        return SimpleNamespace(success=status == "success", pending=status == "pending")
+
+    monkeypatch.setattr(services, "pay_invoice", pay_invoice)
+    monkeypatch.setattr(services, "get_wallet_payment", get_wallet_payment)
+    return calls
+
+
+async def make_due(task_id: str) -> Payout:
+    stored = await crud.get_payout(task_id)
+    assert stored
+    stored.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await crud.update_payout(stored)
+    (due,) = await crud.get_due_payouts()
+    return due
+
+
+@pytest.mark.asyncio
+async def test_payout_raising_after_the_payment_is_not_paid_again(payout, monkeypatch):
+    calls = wallet(monkeypatch, "success")
+    await services.pay_task_reward(payout)
+
+    assert calls == [1]
+    stored = await crud.get_payout(payout.task_id)
+    assert stored and stored.status == PayoutStatus.paid and stored.payment_hash == invoices[-1]
+    tasks = await crud.get_tasks_by_id(payout.task_id)
+    assert tasks and tasks.paid and tasks.payout_status == PayoutStatus.paid
+
+
+@pytest.mark.asyncio
+async def test_payout_in_flight_is_settled_before_any_retry(payout, monkeypatch):
+    calls = wallet(monkeypatch, "pending")
+    await services.pay_task_reward(payout)
+    stored = await crud.get_payout(payout.task_id)
+    assert stored and stored.status == PayoutStatus.paying
+
+    # the lease ran out: one worker claims it, still in flight, so it is checked again later
+    due = await make_due(payout.task_id)
+    await services.pay_task_reward(due)
+    await services.pay_task_reward(due)
+    assert calls == [1]
+    stored = await crud.get_payout(payout.task_id)
+    assert stored and stored.status == PayoutStatus.paying and stored.attempts == 1
+    assert stored.next_attempt_at > datetime.now(timezone.utc)
+    assert not await crud.get_due_payouts()
+
+    # the payment failed in the end, only then a new invoice is paid
+    calls = wallet(monkeypatch, "failed")
+    await services.pay_task_reward(await make_due(payout.task_id))
+    stored = await crud.get_payout(payout.task_id)
+    assert stored and stored.status == PayoutStatus.pending
+    await services.pay_task_reward(await make_due(payout.task_id))
+    assert calls == [1] and len(invoices) == 2
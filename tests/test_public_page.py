@@ -0,0 +1,68 @@
+from http import HTTPStatus
+
+import pytest
+
+from .. import events
+from ..crud import create_scrum, create_tasks, update_scrum
+from ..events import publish_task_events, task_created
+from ..models import CreateScrum, CreateTasks
+from ..views import get_public_board
+from .benchmarks.helpers import api_client, seed
+
+
+@pytest.mark.asyncio
+async def test_unchanged_board_not_modified(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    scrum = await create_scrum(
+        "user", CreateScrum(name="board", description="shared", public_assigning=False, wallet="wallet")
+    )
+    snapshot = await get_public_board(scrum)
+    assert await get_public_board(scrum) is snapshot
+    async with api_client() as client:
+        response = await client.get(f"/scrum/{scrum.id}", headers={"If-None-Match": snapshot.etag})
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert response.headers["etag"] == snapshot.etag
+
+        manifest = await client.get(f"/scrum/manifest/{scrum.id}.webmanifest")
+        assert manifest.json()["short_name"] == "Scrum board"
+        manifest_etag = manifest.headers["etag"]
+        response = await client.get(
+            f"/scrum/manifest/{scrum.id}.webmanifest", headers={"If-None-Match": f"W/{manifest_etag}"}
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        tasks = await create_tasks(CreateTasks(task="new", scrum_id=scrum.id, complete=False))
+        await publish_task_events(scrum.id, task_created(tasks))
+        changed = await get_public_board(scrum)
+        assert changed.etag != snapshot.etag
+        assert tasks.id in changed.tasks_json
+
+        scrum.name = "renamed"
+        await update_scrum(scrum)
+        assert (await get_public_board(scrum)).etag != changed.etag
+        response = await client.get(f"/scrum/manifest/{scrum.id}.webmanifest", headers={"If-None-Match": manifest_etag})
+        assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_column_pages_visit_every_task_once(scrum_db):
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=95)
+    (scrum_id,) = next(iter(boards.values()))
+    url = f"/scrum/api/v1/scrum/{scrum_id}/public/tasks"
+    seen: list[str] = []
+    async with api_client() as client:
+        params = {"stage": "todo", "limit": 7}
+        while True:
+            page = (await client.get(url, params=params)).json()
+            seen += [item["id"] for item in page["data"]]
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+        assert len(seen) == len(set(seen)) == 32
+
+        response = await client.get(url, params={"stage": "todo", "cursor": "zz"})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from .. import events
+from ..crud import get_tasks_by_stage
+from ..models import TaskStage
+from ..ranks import RANK_MAX_LENGTH, rank_between, rank_keys
+from ..services import rebalance_task_ranks
+from .benchmarks.helpers import api_client, seed
+
+
+def test_rank_between_keeps_the_order():
+    rng = random.Random(24)
+    keys = rank_keys(3)
+    for _ in range(2000):
+        i = rng.randint(0, len(keys))
+        key = rank_between(keys[i - 1] if i else None, keys[i] if i < len(keys) else None)
+        keys.insert(i, key)
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+    # appending stays short, inserting at one spot grows the fraction
+    assert len(rank_keys(100_000)[-1]) <= 4
+    with pytest.raises(ValueError):
+        rank_between("a1", "a0")
+
+
+async def column(scrum_id: str, stage: TaskStage) -> list[str]:
+    page = await get_tasks_by_stage(scrum_id, stage, limit=100)
+    return [item.task for item in page.data]
+
+
+@pytest.mark.asyncio
+async def test_move_writes_one_task_and_sends_one_event(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=9)
+    (scrum_id,) = next(iter(boards.values()))
+    todo = await get_tasks_by_stage(scrum_id, TaskStage.todo)
+    first, second, third = todo.data
+    versions = {row["id"]: row["version"] for row in await scrum_db.fetchall("SELECT id, version FROM scrum.tasks")}
+    seq = events.board_seq(scrum_id)
+
+    async with api_client() as client:
+        response = await client.put(
+            f"/scrum/api/v1/tasks/public/{third.id}/move",
+            json={"stage": "todo", "after_id": first.id, "before_id": second.id, "version": third.version},
+        )
+        assert response.status_code == 200
+        assert await column(scrum_id, TaskStage.todo) == [first.task, third.task, second.task]
+        changed = {
+            row["id"]
+            for row in await scrum_db.fetchall("SELECT id, version FROM scrum.tasks")
+            if row["version"] != versions[row["id"]]
+        }
+        assert changed == {third.id}
+        (event,) = events.get_task_events(scrum_id, seq).events
+        assert set(event.fields) == {"stage", "rank", "version", "updated_at"}
+
+        # above the first task with only the next one given, then to the end of another column
+        response = await client.put(
+            f"/scrum/api/v1/tasks/public/{second.id}/move", json={"stage": "todo", "before_id": first.id}
+        )
+        assert await column(scrum_id, TaskStage.todo) == [second.task, first.task, third.task]
+        response = await client.put(f"/scrum/api/v1/tasks/public/{first.id}/move", json={"stage": "doing"})
+        assert (await column(scrum_id, TaskStage.doing))[-1] == first.task
+
+        # the neighbour is not in that column any more
+        response = await client.put(
+            f"/scrum/api/v1/tasks/public/{third.id}/move", json={"stage": "todo", "after_id": first.id}
+        )
+        assert response.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_rebalance_shortens_ranks_in_order(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=30)
+    user_id, (scrum_id,) = next(iter(boards.items()))
+    before = await column(scrum_id, TaskStage.doing)
+    # keep dropping the last task right after the first one
+    async with api_client(user_id) as client:
+        for _ in range(180):
+            page = await get_tasks_by_stage(scrum_id, TaskStage.doing, limit=100)
+            await client.put(
+                f"/scrum/api/v1/tasks/{page.data[-1].id}/move",
+                json={"stage": "doing", "after_id": page.data[0].id, "before_id": page.data[1].id},
+            )
+    moved = await column(scrum_id, TaskStage.doing)
+    assert sorted(moved) == sorted(before)
+    assert (
+        max(len(item.rank or "") for item in (await get_tasks_by_stage(scrum_id, TaskStage.doing, 100)).data)
+        > RANK_MAX_LENGTH
+    )
+
+    assert await rebalance_task_ranks() == 1
+    assert await column(scrum_id, TaskStage.doing) == moved
+    page = await get_tasks_by_stage(scrum_id, TaskStage.doing, limit=100)
+    assert max(len(item.rank or "") for item in page.data) <= 2
+    assert events.get_task_events(scrum_id, 0).events[-1].fields == {"rebalanced": "doing"}
+    assert await rebalance_task_ranks() == 0
@@ -0,0 +1,76 @@
+from http import HTTPStatus
+
+import pytest
+
+from .. import events, ratelimit
+from ..crud import create_scrum, create_tasks
+from ..models import CreateScrum, CreateTasks
+from .benchmarks.helpers import api_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits(monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(ratelimit, "_backend", ratelimit.MemoryRateLimitBackend())
+
+
+@pytest.mark.asyncio
+async def test_public_writes_limited(scrum_db):
+    data = CreateScrum(name="board", description="", public_assigning=True, wallet="wallet", public_rate_limit=12)
+    scrum = await create_scrum("user", data)
+    tasks = await create_tasks(CreateTasks(task="task", scrum_id=scrum.id, complete=False))
+    async with api_client() as client:
+        # a burst of ten seconds worth
+        for stage in ("doing", "done"):
+            response = await client.put(f"/scrum/api/v1/tasks/public/{tasks.id}", json={"stage": stage})
+            assert response.status_code == HTTPStatus.OK
+        response = await client.put(f"/scrum/api/v1/tasks/public/{tasks.id}", json={"stage": "todo"})
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert int(response.headers["retry-after"]) == 5
+
+        response = await client.put("/scrum/api/v1/tasks/public/missing", json={"stage": "todo"})
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_clients_behind_a_proxy_have_their_own_limit(scrum_db, monkeypatch):
+    monkeypatch.setattr(ratelimit, "CLIENT_IP_HEADER", "X-Forwarded-For")
+    data = CreateScrum(name="board", description="", public_assigning=True, wallet="wallet", public_rate_limit=6)
+    scrum = await create_scrum("user", data)
+    tasks = await create_tasks(CreateTasks(task="task", scrum_id=scrum.id, complete=False))
+    url = f"/scrum/api/v1/tasks/public/{tasks.id}"
+    async with api_client() as client:
+        # a spoofed first entry does not make a new client, the address the proxy appended does
+        alice = {"X-Forwarded-For": "10.0.0.1"}
+        assert (await client.put(url, json={"stage": "doing"}, headers=alice)).status_code == HTTPStatus.OK
+        alice = {"X-Forwarded-For": "1.2.3.4, 10.0.0.1"}
+        response = await client.put(url, json={"stage": "done"}, headers=alice)
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        bob = {"X-Forwarded-For": "10.0.0.2"}
+        assert (await client.put(url, json={"stage": "done"}, headers=bob)).status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_pending_public_writes_capped(scrum_db):
+    data = CreateScrum(name="board", description="", public_assigning=True, wallet="wallet", public_max_pending=1)
+    scrum = await create_scrum("user", data)
+    assert ratelimit.start_public_write(scrum)
+    async with api_client() as client:
+        task = {"task": "task", "scrum_id": scrum.id, "complete": False}
+        response = await client.post("/scrum/api/v1/tasks/public", json=task)
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        ratelimit.end_public_write(scrum)
+        response = await client.post("/scrum/api/v1/tasks/public", json=task)
+        assert response.status_code == HTTPStatus.CREATED
+    assert not ratelimit._pending
+
+
+def test_backend_must_implement_take():
+    class Backend(ratelimit.RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Backend()  # type: ignore[abstract]
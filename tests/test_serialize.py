@@ -0,0 +1,36 @@
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from lnbits.db import dict_to_model
+
+from .. import serialize
+from ..models import Tasks, TaskStage
+from .benchmarks.helpers import seed
+
+
+@pytest.mark.asyncio
+async def test_task_row_matches_the_model(scrum_db):
+    await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=50)
+    await scrum_db.execute("UPDATE scrum.tasks SET paid = NULL, payout_status = 'paid' WHERE reward = 100")
+    rows = await scrum_db.fetchall("SELECT * FROM scrum.tasks")
+
+    for row in rows:
+        expected = jsonable_encoder(dict_to_model(row, Tasks))
+        assert serialize.task_row(row) == expected
+        assert serialize.task_dict(dict_to_model(row, Tasks)) == expected
+    assert list(serialize.task_row(rows[0])) == list(Tasks.__fields__)
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_backends_agree(monkeypatch, backend):
+    if backend == "json":
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson is not installed")
+    value = {"task": "ünïcode </script>", "stage": TaskStage.done, "reward": None}
+
+    assert json.loads(serialize.dumps(value)) == {"task": "ünïcode </script>", "stage": "done", "reward": None}
+    html = serialize.dumps_html(value)
+    assert "</script>" not in html
+    assert json.loads(html)["task"] == "ünïcode </script>"
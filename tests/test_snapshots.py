@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from .. import events
+from ..crud import delete_scrum, record_snapshots
+from .benchmarks.helpers import api_client, seed
+
+# seeded tasks per stage
+TASKS = 10
+
+
+@pytest.mark.asyncio
+async def test_burndown_and_velocity_from_snapshots(scrum_db, monkeypatch):
+    async def websocket_updater(item_id, data):
+        pass
+
+    monkeypatch.setattr(events, "websocket_updater", websocket_updater)
+    monkeypatch.setattr(events, "BROADCAST_WINDOW", 0)
+    boards = await seed(scrum_db, users=1, boards_per_user=1, tasks_per_board=TASKS * 3)
+    user_id, (scrum_id,) = next(iter(boards.items()))
+    today = datetime.now(timezone.utc).date()
+    days = [today - timedelta(days=offset) for offset in range(4, -1, -1)]
+    # two days of history, the day after has no change
+    await scrum_db.execute(
+        """
+            INSERT INTO scrum.snapshots (scrum_id, day, stage, tasks, reward, entered, entered_reward)
+            VALUES
+                (:scrum_id, :day0, 'todo', 20, 2000, 0, 0),
+                (:scrum_id, :day0, 'doing', 5, 500, 0, 0),
+                (:scrum_id, :day1, 'todo', 15, 1500, 0, 0),
+                (:scrum_id, :day1, 'done', 5, 500, 5, 500)
+        """,
+        {"scrum_id": scrum_id, "day0": days[1].isoformat(), "day1": days[2].isoformat()},
+    )
+
+    async with api_client(user_id) as client:
+        todo = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/public/tasks", params={"stage": "todo"})
+        ids = [item["id"] for item in todo.json()["data"][:3]]
+        await client.put("/scrum/api/v1/tasks/bulk/move", json={"ids": ids, "stage": "done"})
+
+        params = {"start": days[0].isoformat(), "end": today.isoformat()}
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/series", params=params)
+        assert response.status_code == 200
+        points = response.json()["points"]
+        assert [point["day"] for point in points] == [day.isoformat() for day in days]
+        assert [point["tasks"] for point in points] == [0, 25, 20, 20, TASKS * 2 - 3]
+
+        velocity = {**params, "series": "velocity"}
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/series", params=velocity)
+        # the seeded done tasks entered today too
+        assert [point["tasks"] for point in response.json()["points"]] == [0, 0, 5, 0, TASKS + 3]
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/series", params={**velocity, "interval": 3})
+        assert [(point["day"], point["tasks"]) for point in response.json()["points"]] == [
+            (days[0].isoformat(), 5),
+            (days[3].isoformat(), TASKS + 3),
+        ]
+
+        bad = {"start": today.isoformat(), "end": days[0].isoformat()}
+        response = await client.get(f"/scrum/api/v1/scrum/{scrum_id}/series", params=bad)
+        assert response.status_code == 400
+
+    # the job opens the next day with every stage that has tasks
+    assert await record_snapshots(today + timedelta(days=1)) == 3
+    assert await record_snapshots(today + timedelta(days=1)) == 0
+
+    await delete_scrum(user_id, scrum_id)
+    row = await scrum_db.fetchone("SELECT COUNT(*) AS n FROM scrum.snapshots WHERE scrum_id = :id", {"id": scrum_id})
+    assert row["n"] == 0
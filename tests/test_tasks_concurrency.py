@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from .. import crud
+from ..models import CreateTasks, PayoutStatus, TaskStage
+from .benchmarks.helpers import api_client, seed
+
+EDITS = 20
+
+
+async def _create_tasks(scrum_db) -> tuple[str, str]:
+    # the second seeded board has `public_assigning` off
+    boards = await seed(scrum_db, users=1, boards_per_user=2, tasks_per_board=0)
+    user_id, (_, scrum_id) = next(iter(boards.items()))
+    scrum = await crud.get_scrum_by_id(scrum_id)
+    assert scrum
+    # the parallel edits come from one client
+    await crud.update_scrum(scrum.copy(update={"public_rate_limit": 0, "public_max_pending": 0}))
+    tasks = await crud.create_tasks(
+        CreateTasks(task="task", scrum_id=scrum_id, assignee=None, reward=None, complete=False, notes=None)
+    )
+    return user_id, tasks.id
+
+
+@pytest.mark.asyncio
+async def test_parallel_edits_of_one_version_conflict(scrum_db):
+    _, tasks_id = await _create_tasks(scrum_db)
+    async with api_client() as client:
+        responses = await asyncio.gather(
+            *(
+                client.put(f"/scrum/api/v1/tasks/public/{tasks_id}", json={"notes": f"edit {i}", "version": 0})
+                for i in range(EDITS)
+            )
+        )
+    codes = [response.status_code for response in responses]
+    assert codes.count(200) == 1
+    assert codes.count(409) == EDITS - 1
+
+    winner = next(response.json() for response in responses if response.status_code == 200)
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    assert tasks.version == 1
+    assert tasks.notes == winner["notes"]
+
+
+@pytest.mark.asyncio
+async def test_parallel_edits_of_different_fields_are_kept(scrum_db):
+    user_id, tasks_id = await _create_tasks(scrum_db)
+    async with api_client(user_id) as client:
+        responses = await asyncio.gather(
+            client.put(f"/scrum/api/v1/tasks/{tasks_id}", json={"reward": 100}),
+            client.put(f"/scrum/api/v1/tasks/public/{tasks_id}", json={"notes": "notes"}),
+            client.put(f"/scrum/api/v1/tasks/public/{tasks_id}", json={"stage": "doing"}),
+            client.put(f"/scrum/api/v1/tasks/{tasks_id}", json={"task": "renamed"}),
+        )
+    assert [response.status_code for response in responses] == [200] * 4
+
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    assert (tasks.reward, tasks.notes, tasks.stage, tasks.task) == (100, "notes", TaskStage.doing, "renamed")
+    assert tasks.version == 4
+
+
+@pytest.mark.asyncio
+async def test_edits_are_authorized_against_the_scrum(scrum_db):
+    _, tasks_id = await _create_tasks(scrum_db)
+    async with api_client("someone else") as client:
+        response = await client.put(f"/scrum/api/v1/tasks/{tasks_id}", json={"notes": "mine"})
+        assert response.status_code == 404
+        response = await client.put(f"/scrum/api/v1/tasks/public/{tasks_id}", json={"assignee": "me@example.com"})
+        assert response.status_code == 403
+
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    assert tasks.version == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_of_a_stale_version_conflicts(scrum_db):
+    user_id, tasks_id = await _create_tasks(scrum_db)
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    # the payout worker bumps the version, the edit read before it is stale
+    await crud.update_tasks_payout_status(tasks_id, PayoutStatus.paid)
+    item = {**tasks.dict(include=set(CreateTasks.__fields__)), "id": tasks_id, "notes": "stale"}
+    async with api_client(user_id) as client:
+        response = await client.put("/scrum/api/v1/tasks/bulk", json=[{**item, "version": tasks.version}])
+        assert response.status_code == 409
+        response = await client.put("/scrum/api/v1/tasks/bulk", json=[{**item, "paid": True}])
+        assert response.status_code == 200
+
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    assert (tasks.notes, tasks.paid, tasks.payout_status, tasks.version) == ("stale", True, PayoutStatus.paid, 2)
+
+
+@pytest.mark.asyncio
+async def test_edits_keep_the_text_as_typed(scrum_db):
+    user_id, tasks_id = await _create_tasks(scrum_db)
+    text = {"task": "a <b> c", "notes": "x &amp; y < z > w", "assignee": "<me>&amp;"}
+    async with api_client(user_id) as client:
+        response = await client.put(f"/scrum/api/v1/tasks/{tasks_id}", json=text)
+        assert response.status_code == 200
+
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    assert (tasks.task, tasks.notes, tasks.assignee) == (text["task"], text["notes"], text["assignee"])
+
+
+@pytest.mark.asyncio
+async def test_a_task_moved_to_another_scrum_is_limited_there(scrum_db):
+    user_id, tasks_id = await _create_tasks(scrum_db)
+    first, second = await crud.get_scrum_ids_by_user(user_id)
+    scrum_id = await crud.get_tasks_scrum_id(tasks_id)
+    other = first if scrum_id == second else second
+
+    assert await crud.update_tasks_fields(tasks_id, {"scrum_id": other}, user_id=user_id)
+    assert await crud.get_tasks_scrum_id(tasks_id) == other
+    tasks = await crud.get_tasks_by_id(tasks_id)
+    assert tasks
+    await crud.update_tasks_bulk(user_id, [(tasks_id, {"scrum_id": scrum_id}, tasks.version)])
+    assert await crud.get_tasks_scrum_id(tasks_id) == scrum_id
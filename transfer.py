@@ -0,0 +1,73 @@
+# Description: Streaming export and import of tasks as NDJSON or CSV.
+#
+# Rows are encoded a batch at a time as they come out of the database, and
+# read a row at a time from uploads, so memory use does not grow with the
+# number of tasks in a file.
+
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Iterator
+from typing import BinaryIO
+
+from .models import Tasks, TransferFormat
+from .serialize import dumps
+
+TASKS_COLUMNS = list(Tasks.__fields__)
+
+MEDIA_TYPES = {
+    TransferFormat.ndjson: "application/x-ndjson",
+    TransferFormat.csv: "text/csv",
+}
+
+
+# the batches are tasks in their JSON shape, see `crud.get_tasks_batches`
+
+
+async def encode_ndjson(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"\n".join(dumps(tasks) for tasks in batch) + b"\n"
+
+
+async def encode_csv(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=TASKS_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+
+
+def encode_tasks(batches: AsyncIterator[list[dict]], file_format: TransferFormat) -> AsyncIterator[bytes]:
+    if file_format == TransferFormat.csv:
+        return encode_csv(batches)
+    return encode_ndjson(batches)
+
+
+def read_rows(file: BinaryIO, file_format: TransferFormat) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+    Yield `(line, row, error)` for every row of the file, `row` is None when
+    the line could not be parsed. Empty CSV cells are left out of the row.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    if file_format == TransferFormat.csv:
+        reader = csv.DictReader(text)
+        for row in reader:
+            values = {key: value for key, value in row.items() if key and value not in ("", None)}
+            yield reader.line_num, values, None
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            yield line, None, "Invalid JSON."
+            continue
+        if not isinstance(value, dict):
+            yield line, None, "Expected a JSON object."
+            continue
+        yield line, value, None
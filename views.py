@@ -1,19 +1,31 @@
 # Description: Add your page endpoints here.
 
+import hashlib
 import json
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from lnbits.core.models import User
 from lnbits.decorators import check_user_exists
 from lnbits.helpers import template_renderer
 from lnbits.settings import settings
 
-from .crud import get_scrum_by_id, get_tasks_paginated
+from .cache import public_board_cache
+from .crud import get_scrum_by_id, get_tasks_json_by_stage
+from .events import board_position
+from .metrics import MetricsRoute
+from .models import PublicBoardSnapshot, Scrum, TaskStage
+from .serialize import dumps_html
 
-scrum_generic_router = APIRouter()
+scrum_generic_router = APIRouter(route_class=MetricsRoute)
+
+# tasks per column rendered with the public page, the rest is loaded on scroll
+PUBLIC_PAGE_SIZE = 20
+
+# browsers revalidate the page on every visit, an unchanged board costs a 304
+PUBLIC_PAGE_CACHE_CONTROL = "public, no-cache"
+MANIFEST_CACHE_CONTROL = "public, max-age=300"
 
 
 def scrum_renderer():
@@ -42,34 +54,94 @@ async def scrum_public_page(req: Request, scrum_id: str):
     if not scrum:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Scrum does not exist.")
 
-    public_page_name = getattr(scrum, "name", "")
-    public_page_description = getattr(scrum, "description", "")
-    page = await get_tasks_paginated(scrum_ids=[scrum_id])
-    payload = jsonable_encoder(page.data)
-    public_page_tasks_json = json.dumps(payload)
+    snapshot = await get_public_board(scrum)
+    headers = {"ETag": snapshot.etag, "Cache-Control": PUBLIC_PAGE_CACHE_CONTROL}
+    if _not_modified(req, snapshot.etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
 
     return scrum_renderer().TemplateResponse(
         "scrum/public_page.html",
         {
             "request": req,
             "scrum_id": scrum_id,
-            "public_page_name": public_page_name,
-            "public_page_description": public_page_description,
-            "public_page_tasks": public_page_tasks_json,
+            "public_page_name": scrum.name,
+            "public_page_description": scrum.description,
+            "public_page_tasks": snapshot.tasks_json,
+            "public_page_cursors": snapshot.cursors_json,
+            "public_page_events": snapshot.events_json,
             "public_page_assigning": scrum.public_assigning,
             "public_page_tasks_creation": scrum.public_tasks,
             "public_page_delete_tasks": scrum.public_delete_tasks,
             "web_manifest": f"/scrum/manifest/{scrum_id}.webmanifest",
         },
+        headers=headers,
+    )
+
+
+async def get_public_board(scrum: Scrum) -> PublicBoardSnapshot:
+    """
+    The first tasks of every column, encoded for the public page. Kept until
+    the board has new task events or the scrum is changed.
+    """
+    epoch, seq = board_position(scrum.id)
+    snapshot = public_board_cache.get(scrum.id)
+    if snapshot and (snapshot.epoch, snapshot.seq) == (epoch, seq) and snapshot.scrum == scrum:
+        return snapshot
+
+    generation = public_board_cache.generation
+    # taken before the tasks, events that race the page load are replayed
+    events = {"epoch": epoch, "seq": seq}
+    tasks: list[dict] = []
+    cursors = {}
+    for stage in TaskStage:
+        rows, cursors[stage.value] = await get_tasks_json_by_stage(scrum.id, stage, limit=PUBLIC_PAGE_SIZE)
+        tasks.extend(rows)
+    tasks_json = dumps_html(tasks)
+    cursors_json = dumps_html(cursors)
+    events_json = dumps_html(events)
+    content = "\n".join([scrum.json(), tasks_json, cursors_json, events_json, settings.version])
+    snapshot = PublicBoardSnapshot(
+        scrum=scrum,
+        epoch=epoch,
+        seq=seq,
+        tasks_json=tasks_json,
+        cursors_json=cursors_json,
+        events_json=events_json,
+        etag=_etag(content),
     )
+    public_board_cache.set(scrum.id, snapshot, generation)
+    return snapshot
+
+
+def _etag(content: str) -> str:
+    return '"' + hashlib.sha256(content.encode()).hexdigest()[:32] + '"'
+
+
+def _not_modified(req: Request, etag: str) -> bool:
+    if_none_match = req.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # weak comparison, a proxy may have added the W/ prefix
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
 
 
 @scrum_generic_router.get("/manifest/{scrum_id}.webmanifest")
-async def manifest(scrum_id: str):
+async def manifest(req: Request, scrum_id: str):
     scrum = await get_scrum_by_id(scrum_id)
     if not scrum:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Scrum does not exist.")
 
+    # built from the cached scrum, only the hash is worked out per request
+    content = json.dumps(_manifest(scrum_id, scrum))
+    etag = _etag(content)
+    headers = {"ETag": etag, "Cache-Control": MANIFEST_CACHE_CONTROL}
+    if _not_modified(req, etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content, media_type="application/manifest+json", headers=headers)
+
+
+def _manifest(scrum_id: str, scrum: Scrum) -> dict:
     return {
         "short_name": "Scrum " + scrum.name,
         "name": "Scrum " + scrum.name + " - " + scrum.description,
@@ -1,48 +1,123 @@
 # Description: This file contains the extensions API endpoints.
-import json
+import math
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
 from http import HTTPStatus
+from typing import NoReturn
 
-from fastapi import APIRouter, Depends
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, File, Query, Request, Response, UploadFile
 from fastapi.exceptions import HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from lnbits.core.models import SimpleStatus, User
-from lnbits.core.services import get_pr_from_lnurl, pay_invoice, websocket_updater
 from lnbits.db import Filters, Page
 from lnbits.decorators import (
+    check_admin,
     check_user_exists,
     parse_filters,
 )
 from lnbits.helpers import generate_filter_params_openapi
 
+from . import metrics
+from .cache import cache_stats
 from .crud import (
     create_scrum,
     create_tasks,
-    delete_all_tasks,
+    create_tasks_bulk,
     delete_scrum,
     delete_tasks,
+    delete_tasks_bulk,
     get_scrum,
     get_scrum_by_id,
+    get_scrum_cursor_page,
     get_scrum_ids_by_user,
     get_scrum_paginated,
+    get_scrum_stats,
+    get_tasks_batches,
     get_tasks_by_id,
+    get_tasks_by_ids,
+    get_tasks_cursor_page,
+    get_tasks_json_by_stage,
     get_tasks_paginated,
+    get_tasks_scrum_id,
+    move_task,
+    move_tasks,
+    queue_orphan_purges,
+    rebuild_scrum_stats,
+    rebuild_tasks_search,
+    search_tasks,
     update_scrum,
-    update_tasks,
+    update_tasks_bulk,
+    update_tasks_fields,
+    update_tasks_payout_status,
 )
+from .events import (
+    forget_board,
+    get_task_events,
+    publish_task_events,
+    stream_task_events,
+    task_changed,
+    task_created,
+    task_deleted,
+    task_updated,
+)
+from .metrics import MetricsRoute, prometheus_text
 from .models import (
+    BulkTasksIds,
+    BulkUpdateTasks,
+    CacheStats,
     CreateScrum,
     CreateTasks,
+    CursorPage,
+    MoveTask,
+    MoveTasks,
+    PayLink,
+    Payout,
+    PayoutStatus,
     Scrum,
     ScrumFilters,
+    ScrumSeries,
+    ScrumStats,
+    SnapshotSeries,
+    TaskEvents,
     Tasks,
+    TasksArchive,
+    TasksExportFilters,
     TasksFilters,
+    TasksImport,
     TasksPublic,
+    TasksSearchResult,
+    TaskStage,
+    TransferFormat,
+    UpdateTasks,
+)
+from .paylinks import get_pay_link
+from .ratelimit import client_address, end_public_write, public_write_wait, start_public_write
+from .serialize import dumps
+from .services import (
+    archive_scrum_tasks,
+    get_scrum_series,
+    import_tasks,
+    needs_payout,
+    prefetch_task_pay_links,
+    purges_queued,
+    queue_task_payout,
+    retry_task_payout,
 )
+from .transfer import MEDIA_TYPES, encode_tasks
+
+# opt-in cursor paging of the paginated lists
+KEYSET_DESCRIPTION = "Page by cursor instead of offset, the response has a `next_cursor`."
+CURSOR_DESCRIPTION = "The `next_cursor` of the previous page, implies `keyset`."
+TOTAL_DESCRIPTION = "Also count all matching rows, only used with `keyset`."
+ARCHIVED_DESCRIPTION = "List the archived tasks instead of the active ones."
+# longest range of a burndown or velocity series, in days
+SERIES_MAX_DAYS = 366
 
 scrum_filters = parse_filters(ScrumFilters)
 tasks_filters = parse_filters(TasksFilters)
 
-scrum_api_router = APIRouter()
+scrum_api_router = APIRouter(route_class=MetricsRoute)
 
 
 ############################# Scrum #############################
@@ -76,12 +151,20 @@ async def api_update_scrum(
     summary="get paginated list of scrum",
     response_description="list of scrum",
     openapi_extra=generate_filter_params_openapi(ScrumFilters),
-    response_model=Page[Scrum],
+    response_model=CursorPage[Scrum] | Page[Scrum],
 )
 async def api_get_scrum_paginated(
     user: User = Depends(check_user_exists),
     filters: Filters = Depends(scrum_filters),
-) -> Page[Scrum]:
+    keyset: bool = Query(False, description=KEYSET_DESCRIPTION),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: bool = Query(False, alias="total", description=TOTAL_DESCRIPTION),
+) -> CursorPage[Scrum] | Page[Scrum]:
+    if keyset or cursor:
+        try:
+            return await get_scrum_cursor_page(user.id, filters, cursor, with_total)
+        except ValueError as exc:
+            raise HTTPException(HTTPStatus.BAD_REQUEST, str(exc)) from exc
 
     return await get_scrum_paginated(
         user_id=user.id,
@@ -111,24 +194,302 @@ async def api_get_scrum(
 @scrum_api_router.delete(
     "/api/v1/scrum/{scrum_id}",
     name="Delete Scrum",
-    summary="Delete the scrum " "and optionally all its associated tasks.",
+    summary="Delete the scrum and all its tasks.",
     response_description="The status of the deletion.",
     response_model=SimpleStatus,
 )
 async def api_delete_scrum(
     scrum_id: str,
-    clear_tasks: bool | None = False,
+    clear_tasks: bool | None = Query(
+        None, deprecated=True, description="Ignored, the tasks are always deleted with the scrum."
+    ),
     user: User = Depends(check_user_exists),
 ) -> SimpleStatus:
     scrum = await get_scrum(user.id, scrum_id)
     if not scrum:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
-    await delete_scrum(user.id, scrum.id)
-    if clear_tasks is True:
-        await delete_all_tasks(scrum.id)
+    deleted = await delete_scrum(user.id, scrum.id)
+    forget_board(scrum.id)
+    if deleted:
+        purges_queued.set()
+        return SimpleStatus(success=True, message="Scrum Deleted, its tasks are removed in the background")
     return SimpleStatus(success=True, message="Scrum Deleted")
 
 
+@scrum_api_router.post(
+    "/api/v1/scrum/{scrum_id}/close-sprint",
+    name="Close Sprint",
+    summary="Move the done and paid tasks of the scrum to the archive.",
+    response_description="How many tasks were archived.",
+    response_model=TasksArchive,
+)
+async def api_close_sprint(
+    scrum_id: str,
+    older_than_days: int = Query(0, ge=0, description="Only archive tasks not updated for this many days."),
+    user: User = Depends(check_user_exists),
+) -> TasksArchive:
+    scrum = await get_scrum(user.id, scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    before = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    return await archive_scrum_tasks(scrum.id, before)
+
+
+############################ Stats ##############################
+
+
+@scrum_api_router.get(
+    "/api/v1/scrum/{scrum_id}/stats",
+    name="Get Scrum Stats",
+    summary="Task counts per stage and reward totals of the scrum.",
+    response_description="The stats of the scrum.",
+    response_model=ScrumStats,
+)
+async def api_get_scrum_stats(
+    scrum_id: str,
+    user: User = Depends(check_user_exists),
+) -> ScrumStats:
+    scrum = await get_scrum(user.id, scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    return await get_scrum_stats(scrum.id)
+
+
+@scrum_api_router.get(
+    "/api/v1/scrum/{scrum_id}/series",
+    name="Get Scrum Series",
+    summary="Burndown or velocity of the scrum per day, or per `interval` days, from its daily snapshots.",
+    response_description="One point per interval from `start` to `end`.",
+    response_model=ScrumSeries,
+)
+async def api_get_scrum_series(
+    scrum_id: str,
+    series: SnapshotSeries = SnapshotSeries.burndown,
+    start: date | None = Query(None, description="First day, two weeks before `end` by default."),
+    end: date | None = Query(None, description="Last day, today (UTC) by default."),
+    interval: int = Query(1, ge=1, le=90, description="Days per point, a sprint length for velocity."),
+    user: User = Depends(check_user_exists),
+) -> ScrumSeries:
+    scrum = await get_scrum(user.id, scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=13)
+    if start > end:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, "The start is after the end.")
+    if (end - start).days >= SERIES_MAX_DAYS:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f"A series covers at most {SERIES_MAX_DAYS} days.")
+    return await get_scrum_series(scrum.id, series, start, end, interval)
+
+
+@scrum_api_router.post(
+    "/api/v1/scrum/{scrum_id}/stats/rebuild",
+    name="Rebuild Scrum Stats",
+    summary="Recompute the stats of the scrum from its tasks.",
+    response_description="The rebuilt stats of the scrum.",
+    response_model=ScrumStats,
+)
+async def api_rebuild_scrum_stats(
+    scrum_id: str,
+    user: User = Depends(check_user_exists),
+) -> ScrumStats:
+    scrum = await get_scrum(user.id, scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    await rebuild_scrum_stats(scrum.id)
+    return await get_scrum_stats(scrum.id)
+
+
+@scrum_api_router.post(
+    "/api/v1/stats/rebuild",
+    name="Rebuild All Stats",
+    summary="Recompute the stats of every scrum from the tasks.",
+    response_description="The status of the rebuild.",
+    response_model=SimpleStatus,
+    dependencies=[Depends(check_admin)],
+)
+async def api_rebuild_all_stats() -> SimpleStatus:
+    await rebuild_scrum_stats()
+    return SimpleStatus(success=True, message="Stats rebuilt")
+
+
+@scrum_api_router.post(
+    "/api/v1/orphans/purge",
+    name="Purge Orphaned Tasks",
+    summary="Remove the tasks left behind by deleted scrums, in the background.",
+    response_description="The number of deleted scrums whose tasks are removed.",
+    response_model=SimpleStatus,
+    dependencies=[Depends(check_admin)],
+)
+async def api_purge_orphans() -> SimpleStatus:
+    queued = await queue_orphan_purges()
+    purges_queued.set()
+    return SimpleStatus(success=True, message=f"Removing the tasks of {queued} deleted scrums")
+
+
+######################### Bulk Tasks ###########################
+# declared before the `/api/v1/tasks/{tasks_id}` routes so `bulk` is not taken for an id
+
+# most tasks accepted in one bulk request
+BULK_MAX_TASKS = 1000
+
+
+def _check_bulk_size(count: int) -> None:
+    if count == 0:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, "No tasks given.")
+    if count > BULK_MAX_TASKS:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f"At most {BULK_MAX_TASKS} tasks per request.")
+
+
+def _by_scrum(tasks: list[Tasks]) -> dict[str, list[Tasks]]:
+    boards: dict[str, list[Tasks]] = {}
+    for item in tasks:
+        boards.setdefault(item.scrum_id, []).append(item)
+    return boards
+
+
+@scrum_api_router.post(
+    "/api/v1/tasks/bulk",
+    name="Create Tasks Bulk",
+    summary="Create many tasks in one request.",
+    response_description="The created tasks.",
+    response_model=list[Tasks],
+    status_code=HTTPStatus.CREATED,
+)
+async def api_create_tasks_bulk(
+    data: list[CreateTasks],
+    user: User = Depends(check_user_exists),
+) -> list[Tasks]:
+    _check_bulk_size(len(data))
+    for scrum_id in {item.scrum_id for item in data}:
+        if not await get_scrum(user.id, scrum_id):
+            raise HTTPException(HTTPStatus.NOT_FOUND, f"Scrum {scrum_id} not found.")
+
+    tasks = await create_tasks_bulk(data)
+    prefetch_task_pay_links(*tasks)
+    for scrum_id, created in _by_scrum(tasks).items():
+        await publish_task_events(scrum_id, *(task_created(item) for item in created))
+    return tasks
+
+
+@scrum_api_router.put(
+    "/api/v1/tasks/bulk",
+    name="Update Tasks Bulk",
+    summary="Update many tasks in one request.",
+    response_description="The updated tasks.",
+    response_model=list[Tasks],
+)
+async def api_update_tasks_bulk(
+    data: list[BulkUpdateTasks],
+    user: User = Depends(check_user_exists),
+) -> list[Tasks]:
+    _check_bulk_size(len(data))
+    # only returns tasks on scrums of this user, that is the ownership check
+    current = {item.id: item for item in await get_tasks_by_ids(user.id, [item.id for item in data])}
+    missing = [item.id for item in data if item.id not in current]
+    if missing:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"Tasks not found: {', '.join(missing)}.")
+    scrums: dict[str, Scrum] = {}
+    for scrum_id in {item.scrum_id for item in data}:
+        scrum = await get_scrum(user.id, scrum_id)
+        if not scrum:
+            raise HTTPException(HTTPStatus.NOT_FOUND, f"Scrum {scrum_id} not found.")
+        scrums[scrum_id] = scrum
+
+    changes: list[tuple[str, dict, int]] = []
+    for edit in data:
+        previous = current[edit.id]
+        fields = {
+            key: value for key, value in edit.dict(exclude={"id", "version"}).items() if value != getattr(previous, key)
+        }
+        if needs_payout(Tasks(**{**previous.dict(), **fields})):
+            fields["payout_status"] = PayoutStatus.pending
+        # without a version the edit is based on the task as read above
+        changes.append((edit.id, fields, previous.version if edit.version is None else edit.version))
+    try:
+        tasks = await update_tasks_bulk(user.id, changes)
+    except ValueError as exc:
+        raise HTTPException(HTTPStatus.CONFLICT, str(exc)) from exc
+    prefetch_task_pay_links(
+        *(
+            item
+            for item in tasks
+            if (item.assignee, item.reward) != (current[item.id].assignee, current[item.id].reward)
+        )
+    )
+
+    for item in tasks:
+        if item.payout_status == PayoutStatus.pending and not current[item.id].payout_status:
+            await queue_task_payout(scrums[item.scrum_id], item)
+    for scrum_id, updated in _by_scrum(tasks).items():
+        await publish_task_events(scrum_id, *(task_updated(item, current[item.id]) for item in updated))
+    return tasks
+
+
+@scrum_api_router.put(
+    "/api/v1/tasks/bulk/move",
+    name="Move Tasks Bulk",
+    summary="Move many tasks to another stage in one request.",
+    response_description="The ids of the moved tasks.",
+    response_model=BulkTasksIds,
+)
+async def api_move_tasks_bulk(
+    data: MoveTasks,
+    user: User = Depends(check_user_exists),
+) -> BulkTasksIds:
+    _check_bulk_size(len(data.ids))
+    tasks = await move_tasks(user.id, data.ids, data.stage)
+    for scrum_id, moved in _by_scrum(tasks).items():
+        await publish_task_events(
+            scrum_id,
+            *(task_changed(item.id, _changed_fields(item, {"stage": data.stage})) for item in moved),
+        )
+    return BulkTasksIds(ids=[item.id for item in tasks])
+
+
+@scrum_api_router.delete(
+    "/api/v1/tasks/bulk",
+    name="Delete Tasks Bulk",
+    summary="Delete many tasks in one request.",
+    response_description="The ids of the deleted tasks.",
+    response_model=BulkTasksIds,
+)
+async def api_delete_tasks_bulk(
+    data: BulkTasksIds,
+    user: User = Depends(check_user_exists),
+) -> BulkTasksIds:
+    _check_bulk_size(len(data.ids))
+    tasks = await delete_tasks_bulk(user.id, data.ids)
+    for scrum_id, deleted in _by_scrum(tasks).items():
+        await publish_task_events(scrum_id, *(task_deleted(item.id) for item in deleted))
+    return BulkTasksIds(ids=[item.id for item in tasks])
+
+
+import_file_param = File(...)
+
+
+@scrum_api_router.post(
+    "/api/v1/scrum/{scrum_id}/import",
+    name="Import Tasks",
+    summary="Create tasks on the scrum from an uploaded NDJSON or CSV file.",
+    response_description="How many tasks were created, the rows that failed and where to resume a stopped import.",
+    response_model=TasksImport,
+)
+async def api_import_tasks(
+    scrum_id: str,
+    file: UploadFile = import_file_param,
+    file_format: TransferFormat | None = Query(None, alias="format"),
+    user: User = Depends(check_user_exists),
+) -> TasksImport:
+    scrum = await get_scrum(user.id, scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    if not file_format:
+        is_csv = (file.filename or "").lower().endswith(".csv")
+        file_format = TransferFormat.csv if is_csv else TransferFormat.ndjson
+    return await import_tasks(scrum, file.file, file_format)
+
+
 ############################# Tasks #############################
 
 
@@ -149,7 +510,8 @@ async def api_create_tasks(
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
 
     tasks = await create_tasks(data)
-    await websocket_updater(scrum.id, str(json.dumps(jsonable_encoder(tasks))))
+    prefetch_task_pay_links(tasks)
+    await publish_task_events(scrum.id, task_created(tasks))
     return tasks
 
 
@@ -162,44 +524,91 @@ async def api_create_tasks(
 )
 async def api_update_tasks(
     tasks_id: str,
-    data: CreateTasks,
+    data: UpdateTasks,
     user: User = Depends(check_user_exists),
 ) -> Tasks:
-    tasks = await get_tasks_by_id(tasks_id)
+    changes = data.changes()
+    tasks = await update_tasks_fields(tasks_id, changes, data.version, user_id=user.id)
     if not tasks:
+        await _raise_update_failed(tasks_id, data.version, user_id=user.id, scrum_id=changes.get("scrum_id"))
+    scrum = await get_scrum_by_id(tasks.scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    # the reward is paid by the payout worker, completing only queues it
+    if needs_payout(tasks):
+        tasks = await update_tasks_payout_status(tasks.id, PayoutStatus.pending) or tasks
+        await queue_task_payout(scrum, tasks)
+        changes["payout_status"] = tasks.payout_status
+    elif "assignee" in changes or "reward" in changes:
+        prefetch_task_pay_links(tasks)
+    await publish_task_events(scrum.id, task_changed(tasks.id, _changed_fields(tasks, changes)))
+    return tasks
+
+
+@scrum_api_router.put(
+    "/api/v1/tasks/{tasks_id}/move",
+    name="Move Tasks",
+    summary="Move the tasks between two tasks of a stage column, or to its end.",
+    response_description="The moved tasks.",
+    response_model=Tasks,
+)
+async def api_move_tasks(
+    tasks_id: str,
+    data: MoveTask,
+    user: User = Depends(check_user_exists),
+) -> Tasks:
+    scrum_id = await get_tasks_scrum_id(tasks_id)
+    if not scrum_id:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
+    if not await get_scrum(user.id, scrum_id):
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    tasks = await _move_task(tasks_id, data, user_id=user.id)
+    await publish_task_events(tasks.scrum_id, task_changed(tasks.id, _changed_fields(tasks, {"stage": tasks.stage})))
+    return tasks
 
+
+@scrum_api_router.post(
+    "/api/v1/tasks/{tasks_id}/payout",
+    name="Retry Tasks Payout",
+    summary="Queue the failed reward payout of the tasks again.",
+    response_description="The queued payout.",
+    response_model=Payout,
+)
+async def api_retry_tasks_payout(
+    tasks_id: str,
+    user: User = Depends(check_user_exists),
+) -> Payout:
+    tasks = await get_tasks_by_id(tasks_id)
+    if not tasks:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
     scrum = await get_scrum(user.id, tasks.scrum_id)
     if not scrum:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
-    # If task is completed and has a reward, pay the reward
-    if data.complete and not tasks.paid and tasks.reward is not None and tasks.reward > 0 and tasks.assignee:
-        try:
-            pr = await get_pr_from_lnurl(tasks.assignee, tasks.reward * 1000)
-        except Exception as exc:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail=f"Error generating payment request from assignee LNURL. {exc!s}",
-            ) from exc
-        if not pr:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail="Error generating payment request.",
-            )
-        try:
-            await pay_invoice(
-                wallet_id=scrum.wallet,
-                payment_request=pr,
-                max_sat=int(tasks.reward),
-                description=f"Scrum task reward: {tasks.assignee} - {tasks.task}",
-                extra={"tag": "scrum", "task_id": tasks_id, "scrum_id": scrum.id},
-            )
-            data.paid = True
-        except Exception as exc:
-            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Scrum payment failed. {exc!s}") from exc
-    tasks = await update_tasks(Tasks(**{**tasks.dict(), **data.dict()}))
-    await websocket_updater(scrum.id, str(json.dumps(jsonable_encoder(tasks))))
-    return tasks
+    payout = await retry_task_payout(tasks.id)
+    if not payout:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, "No failed payout for this task.")
+    return payout
+
+
+@scrum_api_router.get(
+    "/api/v1/tasks/{tasks_id}/paylink",
+    name="Tasks Pay Link",
+    summary="Check the LNURL-pay link the reward of the tasks will be paid to.",
+    response_description="The resolved pay link of the assignee, or the error resolving it.",
+    response_model=PayLink,
+)
+async def api_get_tasks_pay_link(
+    tasks_id: str,
+    user: User = Depends(check_user_exists),
+) -> PayLink:
+    tasks = await get_tasks_by_id(tasks_id)
+    if not tasks:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
+    if not await get_scrum(user.id, tasks.scrum_id):
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    if not tasks.assignee:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, "The tasks has no assignee.")
+    return await get_pay_link(tasks.assignee)
 
 
 @scrum_api_router.get(
@@ -208,27 +617,97 @@ async def api_update_tasks(
     summary="get paginated list of tasks",
     response_description="list of tasks",
     openapi_extra=generate_filter_params_openapi(TasksFilters),
-    response_model=Page[Tasks],
+    response_model=CursorPage[Tasks] | Page[Tasks],
 )
 async def api_get_tasks_paginated(
     user: User = Depends(check_user_exists),
     scrum_id: str | None = None,
     filters: Filters = Depends(tasks_filters),
-) -> Page[Tasks]:
+    keyset: bool = Query(False, description=KEYSET_DESCRIPTION),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: bool = Query(False, alias="total", description=TOTAL_DESCRIPTION),
+    archived: bool = Query(False, description=ARCHIVED_DESCRIPTION),
+) -> CursorPage[Tasks] | Page[Tasks]:
 
-    scrum_ids = await get_scrum_ids_by_user(user.id)
+    # a scrum_id must be one of the user's, without one ownership is part of the query
+    if scrum_id and not await get_scrum(user.id, scrum_id):
+        raise HTTPException(HTTPStatus.FORBIDDEN, "Not your scrum.")
+    if keyset or cursor:
+        try:
+            return await get_tasks_cursor_page(
+                user_id=user.id,
+                scrum_ids=[scrum_id] if scrum_id else None,
+                filters=filters,
+                cursor=cursor,
+                with_total=with_total,
+                archived=archived,
+            )
+        except ValueError as exc:
+            raise HTTPException(HTTPStatus.BAD_REQUEST, str(exc)) from exc
 
+    return await get_tasks_paginated(
+        user_id=user.id,
+        scrum_ids=[scrum_id] if scrum_id else None,
+        filters=filters,
+        archived=archived,
+    )
+
+
+@scrum_api_router.get(
+    "/api/v1/tasks/export",
+    name="Export Tasks",
+    summary="Stream the tasks of your scrums as NDJSON or CSV.",
+    response_description="One task per line, or per CSV row after a header.",
+    response_class=StreamingResponse,
+)
+async def api_export_tasks(
+    user: User = Depends(check_user_exists),
+    file_format: TransferFormat = Query(TransferFormat.ndjson, alias="format"),
+    scrum_id: str | None = None,
+    filters: TasksExportFilters = Depends(),
+) -> StreamingResponse:
+    scrum_ids = await get_scrum_ids_by_user(user.id)
     if scrum_id:
         if scrum_id not in scrum_ids:
-            raise HTTPException(HTTPStatus.FORBIDDEN, "Not your scrum.")
+            raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
         scrum_ids = [scrum_id]
-
-    return await get_tasks_paginated(
-        scrum_ids=scrum_ids,
-        filters=filters,
+    filename = f"scrum_tasks_{datetime.now(timezone.utc):%Y-%m-%d}.{file_format.value}"
+    return StreamingResponse(
+        encode_tasks(get_tasks_batches(scrum_ids, filters), file_format),
+        media_type=MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+@scrum_api_router.get(
+    "/api/v1/tasks/search",
+    name="Search Tasks",
+    summary="Full-text search over the task text, notes and assignee of your scrums.",
+    response_description="The best matches first, with the matched words highlighted.",
+    response_model=list[TasksSearchResult],
+)
+async def api_search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    scrum_id: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(check_user_exists),
+) -> list[TasksSearchResult]:
+    return await search_tasks(user.id, q, scrum_id=scrum_id, limit=limit)
+
+
+@scrum_api_router.post(
+    "/api/v1/search/rebuild",
+    name="Rebuild Search Index",
+    summary="Rebuild the full-text search index of the tasks.",
+    response_description="The status of the rebuild.",
+    response_model=SimpleStatus,
+    dependencies=[Depends(check_admin)],
+)
+async def api_rebuild_tasks_search() -> SimpleStatus:
+    await rebuild_tasks_search()
+    return SimpleStatus(success=True, message="Search index rebuilt")
+
+
 @scrum_api_router.get(
     "/api/v1/tasks/{tasks_id}",
     name="Get Tasks",
@@ -271,6 +750,7 @@ async def api_delete_tasks(
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum deleted for this Tasks.")
 
     await delete_tasks(scrum.id, tasks_id)
+    await publish_task_events(scrum.id, task_deleted(tasks_id))
     return SimpleStatus(success=True, message="Tasks Deleted")
 
 
@@ -286,6 +766,7 @@ async def api_delete_tasks(
     status_code=HTTPStatus.CREATED,
 )
 async def api_create_public_tasks(
+    request: Request,
     data: CreateTasks,
 ) -> Tasks:
     data.reward = 0
@@ -294,11 +775,80 @@ async def api_create_public_tasks(
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
     if not scrum.public_assigning:
         raise HTTPException(HTTPStatus.FORBIDDEN, "You cant edit the assignee.")
-    tasks = await create_tasks(data)
-    await websocket_updater(scrum.id, str(json.dumps(jsonable_encoder(tasks))))
+    async with _public_write(request, scrum):
+        tasks = await create_tasks(data)
+        await publish_task_events(scrum.id, task_created(tasks))
     return tasks
 
 
+@scrum_api_router.get(
+    "/api/v1/scrum/{scrum_id}/public/tasks",
+    name="Public Tasks List",
+    summary="Get the next tasks of one column of a public scrum board.",
+    response_description="A slice of tasks and the cursor for the next one.",
+    response_model=CursorPage[Tasks],
+)
+async def api_get_public_tasks(
+    scrum_id: str,
+    stage: TaskStage,
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+) -> Response:
+    scrum = await get_scrum_by_id(scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    try:
+        tasks, next_cursor = await get_tasks_json_by_stage(scrum.id, stage, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(exc)) from exc
+    # encoded straight from the rows, `response_model` only documents the shape
+    return Response(dumps({"data": tasks, "next_cursor": next_cursor}), media_type="application/json")
+
+
+@scrum_api_router.get(
+    "/api/v1/scrum/{scrum_id}/changes",
+    name="Task Changes",
+    summary="Get the task events of a scrum board after a sequence number.",
+    response_description="The missed events, or `resync` if the board must be reloaded.",
+    response_model=TaskEvents,
+)
+async def api_get_task_changes(
+    scrum_id: str,
+    since: int = Query(0, ge=0),
+    epoch: str | None = None,
+) -> TaskEvents:
+    scrum = await get_scrum_by_id(scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    return get_task_events(scrum.id, since, epoch)
+
+
+@scrum_api_router.get(
+    "/api/v1/scrum/{scrum_id}/events",
+    name="Task Events Stream",
+    summary="Stream the task events of a scrum board as Server-Sent Events.",
+    response_description="A `text/event-stream` of task event messages, resumable with `Last-Event-ID`.",
+    response_class=StreamingResponse,
+)
+async def api_stream_task_events(
+    scrum_id: str,
+    request: Request,
+    last_event_id: str | None = Query(
+        None, description="Resume after this event id, for clients that cannot send the `Last-Event-ID` header."
+    ),
+) -> StreamingResponse:
+    scrum = await get_scrum_by_id(scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    # browsers send the header when they reconnect, it is newer than the query
+    resume = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        stream_task_events(scrum.id, resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @scrum_api_router.put(
     "/api/v1/tasks/public/{tasks_id}",
     name="Update Tasks",
@@ -307,20 +857,51 @@ async def api_create_public_tasks(
     response_model=Tasks,
 )
 async def api_update_tasks_public(
+    request: Request,
     tasks_id: str,
     data: TasksPublic,
 ) -> Tasks:
-    tasks = await get_tasks_by_id(tasks_id)
-    if not tasks:
-        raise HTTPException(HTTPStatus.NOT_FOUND, "Task not found.")
+    scrum_id = await get_tasks_scrum_id(tasks_id)
+    if not scrum_id:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
+    scrum = await get_scrum_by_id(scrum_id)
+    if not scrum:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    changes = data.changes()
+    async with _public_write(request, scrum):
+        tasks = await update_tasks_fields(tasks_id, changes, data.version)
+        if not tasks:
+            await _raise_update_failed(tasks_id, data.version, assignee=changes.get("assignee"))
+        await publish_task_events(tasks.scrum_id, task_changed(tasks.id, _changed_fields(tasks, changes)))
+    if "assignee" in changes:
+        prefetch_task_pay_links(tasks)
+    return tasks
 
-    scrum = await get_scrum_by_id(tasks.scrum_id)
+
+@scrum_api_router.put(
+    "/api/v1/tasks/public/{tasks_id}/move",
+    name="Move Tasks",
+    summary="Move the tasks between two tasks of a stage column, or to its end.",
+    response_description="The moved tasks.",
+    response_model=Tasks,
+)
+async def api_move_tasks_public(
+    request: Request,
+    tasks_id: str,
+    data: MoveTask,
+) -> Tasks:
+    scrum_id = await get_tasks_scrum_id(tasks_id)
+    if not scrum_id:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
+    scrum = await get_scrum_by_id(scrum_id)
     if not scrum:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
-    if not scrum.public_assigning and data.assignee is not None and data.assignee != tasks.assignee:
-        raise HTTPException(HTTPStatus.FORBIDDEN, "You cant edit the assignee.")
-    tasks = await update_tasks(Tasks(**{**tasks.dict(), **data.dict()}))
-    await websocket_updater(scrum.id, str(json.dumps(jsonable_encoder(tasks))))
+    async with _public_write(request, scrum):
+        tasks = await _move_task(tasks_id, data)
+        # one small event, the other tasks of the column keep their rank
+        await publish_task_events(
+            tasks.scrum_id, task_changed(tasks.id, _changed_fields(tasks, {"stage": tasks.stage}))
+        )
     return tasks
 
 
@@ -332,6 +913,7 @@ async def api_update_tasks_public(
     response_model=SimpleStatus,
 )
 async def api_delete_public_tasks(
+    request: Request,
     tasks_id: str,
 ) -> SimpleStatus:
     tasks = await get_tasks_by_id(tasks_id)
@@ -342,5 +924,116 @@ async def api_delete_public_tasks(
         raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
     if not scrum.public_delete_tasks:
         raise HTTPException(HTTPStatus.FORBIDDEN, "You cant delete tasks.")
-    await delete_tasks(scrum.id, tasks_id)
+    async with _public_write(request, scrum):
+        await delete_tasks(scrum.id, tasks_id)
+        await publish_task_events(scrum.id, task_deleted(tasks_id))
     return SimpleStatus(success=True, message="Tasks Deleted")
+
+
+############################ Cache ##############################
+
+
+@scrum_api_router.get(
+    "/api/v1/cache",
+    name="Cache Stats",
+    summary="Hit and miss counters of the in-process scrum caches.",
+    response_description="The stats of every cache.",
+    response_model=list[CacheStats],
+    dependencies=[Depends(check_admin)],
+)
+async def api_get_cache_stats() -> list[CacheStats]:
+    return cache_stats()
+
+
+############################ Metrics ############################
+
+
+@scrum_api_router.get(
+    "/api/v1/metrics",
+    name="Metrics",
+    summary="Latency, query and payment metrics of the scrum routes in the Prometheus text format.",
+    response_description="The metrics, recorded since the start of the process.",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(check_admin)],
+)
+async def api_get_metrics() -> PlainTextResponse:
+    if not metrics.enabled:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Metrics are disabled, set SCRUM_METRICS=1 to record them.")
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+############################ Helpers ############################
+
+
+@asynccontextmanager
+async def _public_write(request: Request, scrum: Scrum) -> AsyncIterator[None]:
+    """
+    Admit an unauthenticated write to the board, or fail with 429 when the
+    client or the board is over its limits.
+    """
+    wait = await public_write_wait(scrum, client_address(request))
+    if wait:
+        raise HTTPException(
+            HTTPStatus.TOO_MANY_REQUESTS,
+            "Too many changes to this board, try again later.",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+    if not start_public_write(scrum):
+        raise HTTPException(
+            HTTPStatus.TOO_MANY_REQUESTS, "This board is busy, try again later.", headers={"Retry-After": "1"}
+        )
+    try:
+        yield
+    finally:
+        end_public_write(scrum)
+
+
+async def _move_task(tasks_id: str, data: MoveTask, user_id: str | None = None) -> Tasks:
+    try:
+        tasks = await move_task(tasks_id, data.stage, data.after_id, data.before_id, data.version, user_id=user_id)
+    except ValueError as exc:
+        # a neighbour was moved away by someone else
+        raise HTTPException(HTTPStatus.CONFLICT, str(exc)) from exc
+    if not tasks:
+        await _raise_update_failed(tasks_id, data.version, user_id=user_id)
+    return tasks
+
+
+def _changed_fields(tasks: Tasks, changes: dict) -> dict:
+    fields = {**changes, "version": tasks.version, "updated_at": tasks.updated_at}
+    if "stage" in changes or "scrum_id" in changes:
+        fields["rank"] = tasks.rank
+    return fields
+
+
+async def _raise_update_failed(
+    tasks_id: str,
+    version: int | None,
+    user_id: str | None = None,
+    scrum_id: str | None = None,
+    assignee: str | None = None,
+) -> NoReturn:
+    """
+    Find out why `update_tasks_fields` did not update the task.
+    Only called on the failure path, the update itself needs no extra reads.
+    """
+    tasks = await get_tasks_by_id(tasks_id)
+    if not tasks:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Tasks not found.")
+    if user_id:
+        if not await get_scrum(user_id, tasks.scrum_id):
+            raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+        if scrum_id and not await get_scrum(user_id, scrum_id):
+            raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+    else:
+        scrum = await get_scrum_by_id(tasks.scrum_id)
+        if not scrum:
+            raise HTTPException(HTTPStatus.NOT_FOUND, "Scrum not found.")
+        if assignee is not None and assignee != tasks.assignee and not scrum.public_assigning:
+            raise HTTPException(HTTPStatus.FORBIDDEN, "You cant edit the assignee.")
+    # nothing else can stop the update, the task was changed concurrently
+    raise HTTPException(
+        HTTPStatus.CONFLICT,
+        f"Tasks was changed by someone else, it is at version {tasks.version}"
+        + (f", not {version}." if version is not None else "."),
+    )